@@ -0,0 +1,233 @@
+# admission control: bounded per-endpoint queues, per-client token buckets and provider quotas, 429 + Retry-After
+
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from fastapi import HTTPException, Request, status
+
+import metrics
+
+CLIENT_HEADER = "X-Client-Id"
+MAX_TRACKED_CLIENTS = 10000
+
+# Concurrency and queue bounds for the expensive endpoints (LLM calls are bounded per model instead)
+SCRAPE_MAX_CONCURRENCY = int(os.getenv("SCRAPE_MAX_CONCURRENCY", str(max(2, int(os.getenv("SCRAPE_WORKERS", "0"))))))
+SCRAPE_MAX_QUEUE = int(os.getenv("SCRAPE_MAX_QUEUE", "8"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "16"))
+QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_S", "60"))
+
+# Per-client allowance: requests per minute and burst, per endpoint
+CLIENT_LIMITS = {
+    "scrape": (float(os.getenv("CLIENT_SCRAPE_PER_MIN", "10")), int(os.getenv("CLIENT_SCRAPE_BURST", "5"))),
+    "generate": (float(os.getenv("CLIENT_GENERATE_PER_MIN", "6")), int(os.getenv("CLIENT_GENERATE_BURST", "3"))),
+    "edit": (float(os.getenv("CLIENT_EDIT_PER_MIN", "20")), int(os.getenv("CLIENT_EDIT_BURST", "5"))),
+}
+
+rejected_total = metrics.counter("admission_rejected_total", "Requests turned away with 429, by gate and reason")
+admitted_total = metrics.counter("admission_admitted_total", "Requests admitted, by gate")
+queue_depth = metrics.gauge("admission_queue_depth", "Requests waiting for a slot, by gate")
+active_requests = metrics.gauge("admission_active", "Requests holding a slot, by gate")
+queue_wait_seconds = metrics.histogram("admission_queue_wait_seconds", "Time spent queued before admission, by gate")
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `burst` stored."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, max_wait: float = 0.0) -> float:
+        """
+        Reserve one token. Returns 0 when one was available. Otherwise returns the seconds until
+        one will be; the token is reserved (the caller sleeps that long) only if that is within
+        `max_wait`, else nothing is taken and the caller should turn the request away.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            wait = (1 - self.tokens) / self.rate if self.rate > 0 else math.inf
+            if wait <= max_wait:
+                self.tokens -= 1
+            return wait
+
+    def available(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self.tokens
+
+
+class AdmissionGate:
+    """
+    At most `max_concurrent` requests run; up to `max_queue` more wait in line. Anything beyond
+    that is rejected straight away with an estimated Retry-After, based on the recent average
+    service time, instead of piling up until the box runs out of memory or the provider quota.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, rpm: Optional[float] = None, queue_timeout: float = QUEUE_TIMEOUT):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.rate_limit = TokenBucket(rpm / 60, max(1, min(max_concurrent, rpm))) if rpm else None
+        self.active = 0
+        self.queued = 0
+        self.avg_service_s = 10.0
+        self._slots = asyncio.Semaphore(max_concurrent)
+
+    def retry_after(self) -> int:
+        """Seconds until a newly arriving request would likely get a slot."""
+        waves = (self.queued + 1) / max(1, self.max_concurrent)
+        return max(1, math.ceil(waves * self.avg_service_s))
+
+    def _reject(self, reason: str, retry_after: float) -> HTTPException:
+        rejected_total.inc(gate=self.name, reason=reason)
+        seconds = max(1, math.ceil(retry_after))
+        return HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"{self.name} is at capacity ({reason}); retry in {seconds}s",
+            headers={"Retry-After": str(seconds)},
+        )
+
+    @asynccontextmanager
+    async def admit(self):
+        if self.active >= self.max_concurrent and self.queued >= self.max_queue:
+            raise self._reject("queue_full", self.retry_after())
+
+        queued_at = time.perf_counter()
+        self.queued += 1
+        queue_depth.set(self.queued, gate=self.name)
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise self._reject("queue_timeout", self.retry_after())
+        finally:
+            self.queued -= 1
+            queue_depth.set(self.queued, gate=self.name)
+
+        try:
+            if self.rate_limit is not None:
+                # Provider quota: wait for a token if one is due soon, otherwise give up early
+                budget = self.queue_timeout - (time.perf_counter() - queued_at)
+                wait = self.rate_limit.take(max_wait=budget)
+                if wait > budget:
+                    raise self._reject("provider_rate_limit", wait)
+                if wait:
+                    await asyncio.sleep(wait)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        queue_wait_seconds.observe(time.perf_counter() - queued_at, gate=self.name)
+        admitted_total.inc(gate=self.name)
+        self.active += 1
+        active_requests.set(self.active, gate=self.name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            active_requests.set(self.active, gate=self.name)
+            self._slots.release()
+            self.avg_service_s = 0.8 * self.avg_service_s + 0.2 * (time.perf_counter() - started)
+
+    def status(self) -> dict:
+        return {
+            "active": self.active,
+            "max_concurrent": self.max_concurrent,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "avg_service_s": round(self.avg_service_s, 2),
+            "estimated_wait_s": self.retry_after() if self.active >= self.max_concurrent else 0,
+            "rate_tokens_available": round(self.rate_limit.available(), 2) if self.rate_limit else None,
+        }
+
+
+class ClientLimiter:
+    """Per-client token buckets for one endpoint, keeping only the most recently seen clients."""
+
+    def __init__(self, name: str, per_minute: float, burst: int, max_clients: int = MAX_TRACKED_CLIENTS):
+        self.name = name
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def check(self, client_id: str) -> None:
+        bucket = self._buckets.get(client_id)
+        if bucket is None:
+            bucket = self._buckets[client_id] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client_id)
+        wait = bucket.take()
+        if wait:
+            rejected_total.inc(gate=self.name, reason="client_rate_limit")
+            seconds = max(1, math.ceil(wait))
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Too many {self.name} requests from this client; retry in {seconds}s",
+                headers={"Retry-After": str(seconds)},
+            )
+
+
+_gates: Dict[str, AdmissionGate] = {}
+_clients: Dict[str, ClientLimiter] = {
+    name: ClientLimiter(name, per_minute, burst) for name, (per_minute, burst) in CLIENT_LIMITS.items()
+}
+
+
+def client_id(request: Request) -> str:
+    """Explicit X-Client-Id when the frontend sends one, else the peer address."""
+    return request.headers.get(CLIENT_HEADER) or (request.client.host if request.client else "unknown")
+
+
+def scrape_gate() -> AdmissionGate:
+    if "scrape" not in _gates:
+        _gates["scrape"] = AdmissionGate("scrape", SCRAPE_MAX_CONCURRENCY, SCRAPE_MAX_QUEUE)
+    return _gates["scrape"]
+
+
+def model_gate(model_id: str) -> AdmissionGate:
+    """One gate per model, sized from the provider limits next to the model map in llm_client."""
+    name = f"llm:{model_id}"
+    if name not in _gates:
+        from llm_client import get_model_limits
+
+        limits = get_model_limits(model_id)
+        _gates[name] = AdmissionGate(name, limits["concurrency"], LLM_MAX_QUEUE, rpm=limits.get("rpm"))
+    return _gates[name]
+
+
+@asynccontextmanager
+async def admit(endpoint: str, request: Request, gate: Optional[AdmissionGate]):
+    """
+    Per-client rate check, then a slot in `gate`; raises 429 with Retry-After when either is
+    exhausted. Without a gate only the client check applies (the work already holds a slot).
+    """
+    _clients[endpoint].check(client_id(request))
+    if gate is None:
+        yield
+        return
+    async with gate.admit():
+        yield
+
+
+def status_report() -> dict:
+    return {name: gate.status() for name, gate in sorted(_gates.items())}
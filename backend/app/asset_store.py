@@ -0,0 +1,273 @@
+# content-addressed asset store: images, fonts and stylesheets of clones stored once and served from /assets/{hash}
+
+import base64
+import hashlib
+import ipaddress
+import logging
+import mimetypes
+import os
+import re
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote_to_bytes, urljoin, urlsplit
+
+import httpx
+
+import metrics
+from image_optimizer import optimize_image
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+ASSET_DIR = Path(os.getenv("ASSET_STORE_DIR", "cloned_sites/assets"))
+ASSET_ROUTE = "/assets"
+FETCH_CONCURRENCY = int(os.getenv("ASSET_FETCH_CONCURRENCY", "8"))
+MAX_ASSET_BYTES = int(os.getenv("ASSET_MAX_BYTES", str(20 * 1024 * 1024)))
+# URLs come from generated HTML: hosts resolving to private, loopback or link-local addresses are
+# refused unless this is set (e.g. to externalize a clone of a page on a local fixture server)
+ALLOW_PRIVATE_HOSTS = os.getenv("ASSET_ALLOW_PRIVATE_HOSTS", "0") == "1"
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36"
+
+ASSET_NAME = re.compile(r"^([0-9a-f]{64})(\.[a-z0-9]{1,8})?$")
+CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""", re.IGNORECASE)
+CSS_IMPORT = re.compile(r"""@import\s+(['"])([^'"]+)\1""", re.IGNORECASE)
+DATA_URI = re.compile(r"^data:([\w.+-]+/[\w.+-]+)?((?:;[\w-]+=[^;,]*)*)(;base64)?,(.*)$", re.DOTALL)
+# Extensions mimetypes does not know everywhere
+EXTENSIONS = {
+    "image/webp": ".webp", "image/avif": ".avif", "image/svg+xml": ".svg", "image/jpeg": ".jpg",
+    "font/woff2": ".woff2", "font/woff": ".woff", "font/ttf": ".ttf", "font/otf": ".otf",
+    "application/font-woff2": ".woff2", "application/font-woff": ".woff", "text/css": ".css",
+}
+CONTENT_TYPES = {ext: mime for mime, ext in EXTENSIONS.items() if not mime.startswith("application/")}
+
+asset_puts_total = metrics.counter("asset_store_puts_total", "Assets written to the store, by outcome (new or deduplicated)")
+asset_bytes_total = metrics.counter("asset_store_bytes_total", "Bytes of assets stored, by outcome")
+
+
+def check_fetchable(url: str) -> None:
+    """Raises ValueError unless url is http(s) on a host that resolves only to public addresses."""
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"not an http(s) URL: {url[:120]}")
+    if ALLOW_PRIVATE_HOSTS:
+        return
+    try:
+        infos = socket.getaddrinfo(parts.hostname, parts.port or 443, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise ValueError(f"cannot resolve {parts.hostname}: {e}")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise ValueError(f"{parts.hostname} resolves to non-public address {address}")
+
+
+def _check_request(request: httpx.Request) -> None:
+    # Runs for every hop, so a public URL cannot redirect to an internal one
+    check_fetchable(str(request.url))
+
+
+def extension_for(mime: str) -> str:
+    mime = mime.split(";")[0].strip().lower()
+    return EXTENSIONS.get(mime) or mimetypes.guess_extension(mime) or ""
+
+
+def content_type_for(name: str) -> str:
+    ext = os.path.splitext(name)[1]
+    return CONTENT_TYPES.get(ext) or mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+
+class AssetStore:
+    """
+    Files named by the SHA-256 of their bytes (plus an extension for the content type), fanned
+    out over 256 subdirectories. Storing identical bytes twice is a no-op, so a logo shared by a
+    hundred clones exists once, and an asset's URL never changes meaning: it can be cached forever.
+    """
+
+    def __init__(self, directory: Path = ASSET_DIR):
+        self.directory = Path(directory)
+
+    def path_for(self, name: str) -> Optional[Path]:
+        match = ASSET_NAME.match(name)
+        if not match:
+            return None
+        return self.directory / match.group(1)[:2] / name
+
+    def put(self, data: bytes, mime: str) -> str:
+        """Store `data` and return its asset name, e.g. '9f86d0…0a08.webp'."""
+        name = hashlib.sha256(data).hexdigest() + extension_for(mime)
+        path = self.path_for(name)
+        if path.exists():
+            asset_puts_total.inc(outcome="dedup")
+            asset_bytes_total.inc(len(data), outcome="dedup")
+            return name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = Path(f"{path}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        asset_puts_total.inc(outcome="new")
+        asset_bytes_total.inc(len(data), outcome="new")
+        return name
+
+    def stats(self) -> dict:
+        files = [p for p in self.directory.glob("*/*") if not p.name.endswith(".tmp")]
+        return {"assets": len(files), "bytes": sum(p.stat().st_size for p in files)}
+
+
+def decode_data_uri(uri: str) -> Optional[Tuple[str, bytes]]:
+    match = DATA_URI.match(uri.strip())
+    if not match:
+        return None
+    mime = match.group(1) or "text/plain"
+    payload = match.group(4)
+    try:
+        data = base64.b64decode(payload) if match.group(3) else unquote_to_bytes(payload)
+    except ValueError:
+        return None
+    return mime, data
+
+
+class AssetExternalizer:
+    """
+    Rewrites a cloned document so its images, stylesheets and the fonts/images those stylesheets
+    reference point at the asset store instead of the original site or inline data URIs.
+    Remote assets are fetched in parallel; images go through the image optimizer first. URLs that
+    cannot be fetched are left as they were.
+    """
+
+    def __init__(self, store: AssetStore, asset_route: str = ASSET_ROUTE, rendered_sizes: Optional[Dict[str, List[int]]] = None,
+                 optimize_images: bool = True):
+        self.store = store
+        self.asset_route = asset_route.rstrip("/")
+        self.rendered_sizes = rendered_sizes or {}
+        self.optimize_images = optimize_images
+        self._names: Dict[str, Optional[str]] = {}
+        self.report = {"assets": 0, "remote_fetched": 0, "data_uris": 0, "failed": 0, "bytes_before": 0, "bytes_after": 0}
+
+    def _url_for(self, name: str) -> str:
+        return f"{self.asset_route}/{name}"
+
+    def _store(self, data: bytes, mime: str, source: str) -> str:
+        mime = mime.split(";")[0].strip().lower()
+        self.report["bytes_before"] += len(data)
+        if self.optimize_images and mime.startswith("image/"):
+            rendered = self.rendered_sizes.get(source)
+            mime, data, _ = optimize_image(data, mime, tuple(rendered) if rendered else None)
+        self.report["bytes_after"] += len(data)
+        self.report["assets"] += 1
+        return self.store.put(data, mime)
+
+    def _fetch(self, client: httpx.Client, url: str) -> Optional[Tuple[str, bytes]]:
+        try:
+            with span("asset.fetch", url=url[:200]), client.stream("GET", url) as response:
+                response.raise_for_status()
+                declared = response.headers.get("Content-Length", "")
+                if declared.isdigit() and int(declared) > MAX_ASSET_BYTES:
+                    raise ValueError(f"{declared} bytes exceeds ASSET_MAX_BYTES")
+                # Read as it arrives and given up past the limit, so a huge body is never buffered
+                chunks, size = [], 0
+                for chunk in response.iter_bytes():
+                    size += len(chunk)
+                    if size > MAX_ASSET_BYTES:
+                        raise ValueError(f"body exceeds ASSET_MAX_BYTES ({MAX_ASSET_BYTES})")
+                    chunks.append(chunk)
+                return response.headers.get("Content-Type", "application/octet-stream"), b"".join(chunks)
+        except Exception as e:
+            logger.warning(f"📦 Could not externalize {url[:120]}: {e}")
+            return None
+
+    def _prefetch(self, client: httpx.Client, urls: List[str]) -> Dict[str, Optional[Tuple[str, bytes]]]:
+        urls = [u for u in dict.fromkeys(urls) if u not in self._names and u.startswith(("http://", "https://"))]
+        if not urls:
+            return {}
+        with ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY) as pool:
+            fetched = dict(zip(urls, pool.map(lambda u: self._fetch(client, u), urls)))
+        self.report["remote_fetched"] += sum(1 for v in fetched.values() if v)
+        self.report["failed"] += sum(1 for v in fetched.values() if v is None)
+        return fetched
+
+    def _resolve(self, client: httpx.Client, url: str, base_url: str, fetched: Dict, is_css: bool = False) -> Optional[str]:
+        """Asset URL for `url` (absolute, relative or data:), or None to leave the reference alone."""
+        url = url.strip()
+        if url.startswith(self.asset_route + "/") or url.startswith("#") or not url:
+            return None
+        if url.startswith("data:"):
+            decoded = decode_data_uri(url)
+            if decoded is None or len(decoded[1]) < 256:
+                return None  # tiny inline icons are cheaper as they are
+            self.report["data_uris"] += 1
+            return self._url_for(self._store(decoded[1], decoded[0], url[:64]))
+
+        absolute = urljoin(base_url, url)
+        if not absolute.startswith(("http://", "https://")):
+            return None
+        if absolute not in self._names:
+            # Marked before rewriting so stylesheets that @import each other do not recurse forever
+            self._names[absolute] = None
+            result = fetched[absolute] if absolute in fetched else self._fetch(client, absolute)
+            if result is not None:
+                mime, data = result
+                if is_css or mime.startswith("text/css"):
+                    data = self._rewrite_css(client, data.decode("utf-8", errors="replace"), absolute).encode("utf-8")
+                    mime = "text/css"
+                self._names[absolute] = self._store(data, mime, absolute)
+        name = self._names[absolute]
+        return self._url_for(name) if name else None
+
+    def _rewrite_css(self, client: httpx.Client, css: str, base_url: str) -> str:
+        refs = [m.group(2) for m in CSS_URL.finditer(css)] + [m.group(2) for m in CSS_IMPORT.finditer(css)]
+        fetched = self._prefetch(client, [urljoin(base_url, r) for r in refs if not r.startswith("data:")])
+
+        def replace_url(match):
+            new = self._resolve(client, match.group(2), base_url, fetched)
+            return f'url("{new}")' if new else match.group(0)
+
+        def replace_import(match):
+            new = self._resolve(client, match.group(2), base_url, fetched, is_css=True)
+            return f'@import "{new}"' if new else match.group(0)
+
+        return CSS_IMPORT.sub(replace_import, CSS_URL.sub(replace_url, css))
+
+    def externalize(self, html: str, base_url: str) -> str:
+        from bs4 import BeautifulSoup  # deferred: not needed to start the API
+        soup = BeautifulSoup(html, "html.parser")
+        with httpx.Client(timeout=15.0, follow_redirects=True, headers={"User-Agent": USER_AGENT},
+                          event_hooks={"request": [_check_request]}) as client:
+            images = soup.find_all("img", src=True)
+            stylesheets = [link for link in soup.find_all("link", href=True) if "stylesheet" in (link.get("rel") or [])]
+            fetched = self._prefetch(client, [urljoin(base_url, t["src"]) for t in images] + [urljoin(base_url, l["href"]) for l in stylesheets])
+
+            for tag in images:
+                new = self._resolve(client, tag["src"], base_url, fetched)
+                if new:
+                    tag["src"] = new
+                    tag.attrs.pop("srcset", None)
+            for link in stylesheets:
+                new = self._resolve(client, link["href"], base_url, fetched, is_css=True)
+                if new:
+                    link["href"] = new
+                    link.attrs.pop("integrity", None)
+            for style in soup.find_all("style"):
+                if style.string and ("url(" in style.string or "@import" in style.string):
+                    style.string = self._rewrite_css(client, style.string, base_url)
+            for tag in soup.find_all(style=True):
+                if "url(" in tag["style"]:
+                    tag["style"] = self._rewrite_css(client, tag["style"], base_url)
+
+        saved = self.report["bytes_before"] - self.report["bytes_after"]
+        logger.info(f"📦 Externalized {self.report['assets']} assets ({self.report['data_uris']} data URIs, {self.report['failed']} failed, {saved // 1024} KB saved by optimization)")
+        return str(soup)
+
+
+_store: Optional[AssetStore] = None
+
+
+def get_asset_store() -> AssetStore:
+    global _store
+    if _store is None:
+        _store = AssetStore()
+    return _store
@@ -0,0 +1,203 @@
+# batch scraping: many URLs over one shared browser, one context per site, N parallel tabs
+
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Dict, List, Optional
+from urllib.parse import urlsplit
+
+
+from tracing import span
+from image_optimizer import RENDERED_SIZES_JS
+from style_snapshot import STYLE_MODE, snapshot_async
+from request_blocking import BlockingStats, get_request_blocker
+from subresource_cache import CACHEABLE_TYPES, CacheStats, get_subresource_cache
+from scraper_async import PLAYWRIGHT_USER_AGENT
+from scraper_sync import is_valid_url, resolve_urls_in_html
+
+logger = logging.getLogger(__name__)
+
+SETTLE_MS = 8000
+
+STYLESHEET_SOURCES_JS = """
+(elements) => elements.map(el => el.tagName === 'STYLE' ? {inline: el.innerHTML} : {href: el.href || null})
+"""
+
+
+def site_key(url: str) -> str:
+    """Pages of one site share a browser context (cookies, HTTP cache) and a stylesheet cache."""
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    return f"{parts.scheme}://{host[4:] if host.startswith('www.') else host}"
+
+
+class SiteSession:
+    """A browser context plus the stylesheets already fetched for one site."""
+
+    def __init__(self, context):
+        self.context = context
+        self._stylesheets: Dict[str, asyncio.Task] = {}
+        self.stylesheet_hits = 0
+        self.stylesheet_fetches = 0
+
+    async def _fetch_stylesheet(self, href: str) -> str:
+        # context.request shares the context's cookies, so logged-in or geo-specific CSS matches the pages
+        response = await self.context.request.get(href)
+        return await response.text() if response.ok else ""
+
+    async def stylesheet(self, href: str) -> str:
+        task = self._stylesheets.get(href)
+        if task is None:
+            # Concurrent tabs asking for the same href wait on one fetch
+            task = self._stylesheets[href] = asyncio.ensure_future(self._fetch_stylesheet(href))
+            self.stylesheet_fetches += 1
+        else:
+            self.stylesheet_hits += 1
+        try:
+            return await task
+        except Exception:
+            return ""
+
+
+class BatchScraper:
+    """
+    Renders a batch of URLs over one Chromium instance with at most `concurrency` tabs open.
+    The request blocker and subresource cache apply to every tab as in the single-page scrapers.
+    """
+
+    def __init__(self, concurrency: int = 4, timeout: float = 30000, settle_ms: int = SETTLE_MS):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.settle_ms = settle_ms
+        self._browser = None
+        self._sessions: Dict[str, SiteSession] = {}
+        self._sessions_lock = asyncio.Lock()
+        self._tabs = asyncio.Semaphore(concurrency)
+
+    async def _session(self, url: str) -> SiteSession:
+        key = site_key(url)
+        async with self._sessions_lock:
+            session = self._sessions.get(key)
+            if session is None:
+                context = await self._browser.new_context(
+                    user_agent=PLAYWRIGHT_USER_AGENT,
+                    viewport={'width': 1920, 'height': 1080}
+                )
+                session = self._sessions[key] = SiteSession(context)
+            return session
+
+    async def _scrape_page(self, url: str) -> dict:
+        session = await self._session(url)
+        page = await session.context.new_page()
+        try:
+            blocker = get_request_blocker()
+            blocking_stats = BlockingStats()
+            cache = get_subresource_cache()
+            cache_stats = CacheStats()
+            if cache:
+                serve_cached = lambda route, request: cache.handle_async(route, request, cache_stats)
+                await page.route(blocker.route_pattern(also_types=CACHEABLE_TYPES), blocker.async_handler(blocking_stats, on_allowed=serve_cached))
+            else:
+                await page.route(blocker.route_pattern(), blocker.async_handler(blocking_stats))
+
+            with span("playwright.goto", url=url):
+                await page.goto(url, wait_until="networkidle", timeout=self.timeout)
+            with span("playwright.settle"):
+                await page.wait_for_timeout(self.settle_ms)
+            snapshot = None
+            if STYLE_MODE != "stylesheets":
+                with span("css.snapshot") as snapshot_span:
+                    snapshot = await snapshot_async(page)
+                    snapshot_span.set_attribute("classes", snapshot["stats"]["classes"])
+            with span("playwright.content"):
+                full_html = await page.content()
+
+            with span("css.extract") as css_span:
+                sources = await page.eval_on_selector_all("style, link[rel='stylesheet']", STYLESHEET_SOURCES_JS) if STYLE_MODE != "computed" else []
+                hits_before = session.stylesheet_hits
+                texts = await asyncio.gather(*(
+                    session.stylesheet(s["href"]) if s.get("href") else asyncio.sleep(0, s.get("inline") or "")
+                    for s in sources
+                ))
+                critical_css = "\n".join(([snapshot["css"]] if snapshot else []) + [t for t in texts if t])
+                css_span.set_attribute("css_length", len(critical_css))
+                css_span.set_attribute("stylesheet_cache_hits", session.stylesheet_hits - hits_before)
+            with span("images.layout"):
+                image_sizes = await page.evaluate(RENDERED_SIZES_JS)
+        finally:
+            await page.close()
+
+        # Parsing multi-MB documents would stall every other tab's event handling
+        with span("html.parse", html_length=len(full_html)):
+            head_html, body_html = await asyncio.to_thread(_split_and_resolve, full_html, url)
+
+        return {
+            "head": head_html,
+            "body": body_html,
+            "css": critical_css,
+            "image_sizes": image_sizes,
+            "url": url,
+            "debug_info": {
+                "full_html_length": len(full_html),
+                "head_length": len(head_html),
+                "body_length": len(body_html),
+                "css_length": len(critical_css),
+                "style_snapshot": snapshot["stats"] if snapshot else None,
+                "request_blocking": blocking_stats.summary(),
+                "subresource_cache": cache_stats.summary(),
+            },
+        }
+
+    async def _run_one(self, url: str) -> dict:
+        started = time.perf_counter()
+        async with self._tabs:
+            try:
+                if not is_valid_url(url):
+                    raise ValueError(f"Invalid URL: {url}")
+                with span("playwright.scrape", url=url, batch=True):
+                    design_context = await self._scrape_page(url)
+                return {"url": url, "ok": True, "design_context": design_context, "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)}
+            except Exception as e:
+                # One broken page must not take the rest of the batch down with it
+                logger.warning(f"❌ Batch scrape failed for {url}: {e}")
+                return {"url": url, "ok": False, "error": str(e), "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+    async def scrape(self, urls: List[str]) -> AsyncIterator[dict]:
+        """Yield one result per URL, in completion order."""
+        from playwright.async_api import async_playwright  # deferred: Playwright is the slowest import of the app
+        async with async_playwright() as p:
+            with span("playwright.launch"):
+                self._browser = await p.chromium.launch(headless=True, args=[
+                    '--no-sandbox',
+                    '--disable-setuid-sandbox',
+                    '--disable-dev-shm-usage',
+                    '--disable-web-security',
+                    '--disable-features=VizDisplayCompositor'
+                ])
+            tasks = [asyncio.ensure_future(self._run_one(url)) for url in urls]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    yield await next_done
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                for session in self._sessions.values():
+                    await session.context.close()
+                await self._browser.close()
+
+    def stylesheet_stats(self) -> dict:
+        return {
+            "sites": len(self._sessions),
+            "stylesheet_fetches": sum(s.stylesheet_fetches for s in self._sessions.values()),
+            "stylesheet_hits": sum(s.stylesheet_hits for s in self._sessions.values()),
+        }
+
+
+def _split_and_resolve(full_html: str, url: str):
+    from bs4 import BeautifulSoup  # deferred: not needed to start the API
+    soup = BeautifulSoup(full_html, 'html.parser')
+    head_html = str(soup.find('head')) or ""
+    body_element = soup.find('body')
+    body_html = str(body_element) if body_element else ""
+    return resolve_urls_in_html(head_html, url), resolve_urls_in_html(body_html, url)
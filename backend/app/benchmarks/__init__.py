@@ -0,0 +1 @@
+# offline benchmark harnesses; run from backend/app, e.g. `python -m benchmarks.scrape_bench`
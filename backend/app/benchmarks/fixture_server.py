@@ -0,0 +1,147 @@
+# local HTTP server serving the cloned_sites samples and synthetic heavy pages for offline benchmarks
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.samples import SAMPLES_DIR
+from benchmarks.synthetic import synthetic_css, synthetic_js, synthetic_page, tiny_png
+
+
+def _int(query: Dict[str, list], key: str, default: int) -> int:
+    try:
+        return int(query.get(key, [default])[0])
+    except (TypeError, ValueError):
+        return default
+
+
+class FixtureServer:
+    """
+    Serves, on 127.0.0.1:<port>:
+      /sites/<name>.html          the bundled cloned_sites samples
+      /synthetic?sections=&cards=&stylesheets=&scripts=&images=&kb=
+                                  a generated catalogue page with that many external assets
+      /asset/{css,js,img}/<i>     the generated assets themselves
+
+    Every response is delayed by `latency_ms` (plus `?latency=` on the request), which is
+    how slow origins and CDNs are simulated.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0, samples_dir: Path = SAMPLES_DIR):
+        self.latency_ms = latency_ms
+        self.samples_dir = Path(samples_dir)
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def sample_names(self) -> list:
+        return sorted(p.stem for p in self.samples_dir.glob("*.html") if p.stat().st_size > 0)
+
+    def sample_url(self, name: str) -> str:
+        return f"{self.base_url}/sites/{name}.html"
+
+    def synthetic_url(self, sections: int = 20, cards: int = 24, stylesheets: int = 8, scripts: int = 8, images: int = 24, kb: int = 32, latency_ms: int = 0) -> str:
+        return (
+            f"{self.base_url}/synthetic?sections={sections}&cards={cards}&stylesheets={stylesheets}"
+            f"&scripts={scripts}&images={images}&kb={kb}&latency={latency_ms}"
+        )
+
+    def start(self) -> "FixtureServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fixture-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FixtureServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                with server._lock:
+                    server.request_count += 1
+                parsed = urlparse(self.path)
+                query = parse_qs(parsed.query)
+
+                delay = server.latency_ms + _int(query, "latency", 0)
+                if delay > 0:
+                    time.sleep(delay / 1000)
+
+                parts = [p for p in parsed.path.split("/") if p]
+                if len(parts) == 2 and parts[0] == "sites":
+                    path = server.samples_dir / parts[1]
+                    if path.suffix == ".html" and path.is_file():
+                        return self._send(200, "text/html; charset=utf-8", path.read_bytes())
+                elif parts == ["synthetic"]:
+                    html = synthetic_page(
+                        sections=_int(query, "sections", 20),
+                        cards_per_section=_int(query, "cards", 24),
+                        stylesheets=_int(query, "stylesheets", 8),
+                        scripts=_int(query, "scripts", 8),
+                        images=_int(query, "images", 24),
+                        asset_kb=_int(query, "kb", 32),
+                    )
+                    return self._send(200, "text/html; charset=utf-8", html.encode("utf-8"))
+                elif len(parts) == 3 and parts[0] == "asset":
+                    kind, index = parts[1], parts[2].split(".")[0]
+                    seed = int(index) if index.isdigit() else 0
+                    kb = _int(query, "kb", 32)
+                    if kind == "css":
+                        return self._send(200, "text/css", synthetic_css(kb, seed).encode("utf-8"))
+                    if kind == "js":
+                        return self._send(200, "application/javascript", synthetic_js(kb, seed).encode("utf-8"))
+                    if kind == "img":
+                        return self._send(200, "image/png", tiny_png(64, 64, seed))
+
+                self._send(404, "text/plain", b"not found")
+
+            def _send(self, code: int, content_type: str, body: bytes):
+                self.send_response(code)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Cache-Control", "public, max-age=3600")
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve benchmark fixtures locally")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    fixture = FixtureServer(port=args.port, latency_ms=args.latency_ms).start()
+    print(f"🧪 Serving fixtures at {fixture.base_url}")
+    for name in fixture.sample_names():
+        print(f"   {fixture.sample_url(name)}")
+    print(f"   {fixture.synthetic_url()}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fixture.stop()
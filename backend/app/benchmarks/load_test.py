@@ -0,0 +1,332 @@
+# load generator for the FastAPI app with stubbed Playwright and LLM providers (injectable latency)
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import types
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from benchmarks.samples import read_sample, split_document
+from benchmarks.report import describe, percentile, run_metadata, write_results
+
+SAMPLE_PAGE = "cloned_orchids_landing_page.html"
+
+
+# --- Limits ---
+
+def configure_limits(provider_rpm: float, client_per_min: float) -> None:
+    """
+    Provider quotas and per-client allowances, set before llm_client/admission are imported (they
+    read them at import). Every request here comes from one client against a stub provider, so the
+    production defaults (GEMINI_PRO_RPM=5) would measure token-bucket waits, not the server.
+    """
+    for name in ("GOOGLE_RPM", "GROQ_RPM", "GEMINI_PRO_RPM"):
+        os.environ[name] = str(int(provider_rpm))
+    for endpoint in ("SCRAPE", "GENERATE", "EDIT"):
+        os.environ[f"CLIENT_{endpoint}_PER_MIN"] = str(client_per_min)
+        os.environ[f"CLIENT_{endpoint}_BURST"] = str(int(max(1, client_per_min)))
+
+
+def admission_report() -> Dict[str, Dict[str, Any]]:
+    """Per gate: admitted requests, mean queue wait and 429s by reason, from the server's own metrics."""
+    import metrics
+
+    snapshot = metrics.snapshot()
+    gates: Dict[str, Dict[str, Any]] = defaultdict(lambda: {"admitted": 0, "queue_wait_mean_ms": None, "rejected": {}})
+
+    def labels(key: str) -> Dict[str, str]:
+        return dict(re.findall(r'(\w+)="([^"]*)"', key))
+
+    for key, value in snapshot["admission_admitted_total"]["values"].items():
+        gates[labels(key)["gate"]]["admitted"] = int(value)
+    for key, value in snapshot["admission_queue_wait_seconds"]["values"].items():
+        gates[labels(key)["gate"]]["queue_wait_mean_ms"] = round(value["sum"] / value["count"] * 1000, 1) if value["count"] else None
+    for key, value in snapshot["admission_rejected_total"]["values"].items():
+        found = labels(key)
+        gates[found.get("gate", "client")]["rejected"][found.get("reason", "?")] = int(value)
+    return dict(gates)
+
+
+# --- Provider stubs ---
+
+def _stub_document(prompt_chars: int) -> str:
+    body = "<section><h1>Stub clone</h1><p>generated</p></section>" * max(1, min(200, prompt_chars // 2000))
+    return f"```html\n<!DOCTYPE html><html><head><title>Stub</title></head><body>{body}</body></html>\n```"
+
+
+def install_stubs(scrape_latency: float, llm_latency: float, jitter: float = 0.2) -> None:
+    """
+    Replace the browser and the LLM SDK clients with stand-ins that only sleep.
+    The stubs sit at the same layer as the real dependencies, so the app keeps its real
+    threading/blocking behaviour: the Playwright stub blocks its worker thread, the Gemini
+    stub blocks whatever thread calls it (like the real synchronous SDK), and the Groq stub awaits.
+    """
+    import llm_client
+    import scraper_sync
+
+    html = read_sample(SAMPLE_PAGE)
+    head, body = split_document(html)
+
+    def delay(base: float) -> float:
+        return max(0.0, random.uniform(base * (1 - jitter), base * (1 + jitter)))
+
+    def fake_playwright(url: str, timeout: float = 30000, **kwargs) -> dict:
+        time.sleep(delay(scrape_latency))
+        return {
+            "head": head,
+            "body": body,
+            "critical_css": "",
+            "debug_info": {"full_html_length": len(html), "head_length": len(head), "body_length": len(body), "css_length": 0},
+        }
+
+    class StubStream:
+        """Async iterator over chunks, like the SDKs' streaming responses."""
+
+        def __init__(self, chunks: List[Any]):
+            self._chunks = iter(chunks)
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            try:
+                return next(self._chunks)
+            except StopIteration:
+                raise StopAsyncIteration
+
+        async def close(self):
+            pass
+
+    def chunked(text: str, size: int = 2048) -> List[str]:
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    class StubGeminiModel:
+        def __init__(self, model_name: str):
+            self.model_name = model_name
+
+        async def generate_content_async(self, contents, stream: bool = False, **kwargs):
+            await asyncio.sleep(delay(llm_latency))
+            document = _stub_document(sum(len(part) for content in contents for part in content["parts"]))
+            return StubStream([types.SimpleNamespace(text=text, candidates=[types.SimpleNamespace(finish_reason=None)])
+                               for text in chunked(document)])
+
+    class StubGroqCompletions:
+        async def create(self, model: str, messages: List[dict], **kwargs):
+            await asyncio.sleep(delay(llm_latency))
+            content = _stub_document(sum(len(m["content"]) for m in messages))
+            return StubStream([types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=text), finish_reason=None)])
+                               for text in chunked(content)])
+
+    scraper_sync.fetch_with_playwright_sync = fake_playwright
+    # Installed as the lazily built clients, so the real SDKs are never imported
+    llm_client._genai = types.SimpleNamespace(GenerativeModel=StubGeminiModel, configure=lambda **kwargs: None)
+    llm_client._groq_client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=StubGroqCompletions()))
+
+
+# --- Server under test ---
+
+class ServerThread:
+    """Runs uvicorn on its own thread and event loop, with a LoopMonitor on that same loop."""
+
+    def __init__(self, app, host: str = "127.0.0.1", port: int = 0):
+        import uvicorn
+        from loop_monitor import LoopMonitor
+
+        self.server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+        self.monitor = LoopMonitor()
+        self._thread = threading.Thread(target=self._run, name="uvicorn-under-test", daemon=True)
+
+    async def _serve(self) -> None:
+        self.monitor.start()
+        try:
+            await self.server.serve()
+        finally:
+            await self.monitor.stop()
+
+    def _run(self) -> None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self._serve())
+        finally:
+            loop.close()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.servers[0].sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "ServerThread":
+        self._thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self._thread.join(timeout=10)
+
+
+# --- Load generator ---
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.sent: Dict[str, int] = defaultdict(int)
+        self.errors: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        # 429s are admission control doing its job, kept apart from failures
+        self.rejected: Dict[str, int] = defaultdict(int)
+
+    def record(self, endpoint: str, latency_ms: float, error: Optional[str]) -> None:
+        if error == "HTTP 429":
+            self.rejected[endpoint] += 1
+        elif error:
+            self.errors[endpoint][error] += 1
+        else:
+            self.latencies[endpoint].append(latency_ms)
+
+
+async def fire(client, recorder: Recorder, endpoint: str, payload: Dict[str, Any]) -> None:
+    recorder.sent[endpoint] += 1
+    start = time.perf_counter()
+    error = None
+    try:
+        response = await client.post(endpoint, json=payload)
+        if response.status_code >= 400:
+            error = f"HTTP {response.status_code}"
+    except Exception as e:
+        error = type(e).__name__
+    recorder.record(endpoint, (time.perf_counter() - start) * 1000, error)
+
+
+async def open_loop(client, recorder: Recorder, endpoint: str, payload: Dict[str, Any], rate: float, duration: float) -> List[asyncio.Task]:
+    """Poisson arrivals at `rate` req/s for `duration` seconds, independent of response times."""
+    tasks = []
+    if rate <= 0:
+        return tasks
+    deadline = time.perf_counter() + duration
+    while True:
+        await asyncio.sleep(random.expovariate(rate))
+        if time.perf_counter() >= deadline:
+            break
+        tasks.append(asyncio.create_task(fire(client, recorder, endpoint, payload)))
+    return tasks
+
+
+async def run_load(base_url: str, rates: Dict[str, float], duration: float, timeout: float) -> Dict[str, Any]:
+    import httpx
+
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        # One scrape up front so /api/generate has a real artifact to read
+        seed = await client.post("/api/scrape", json={"url": "https://example.com/"})
+        seed.raise_for_status()
+        raw_html_path = seed.json()["raw_html_path"]
+        edit_html = read_sample(SAMPLE_PAGE)
+
+        payloads = {
+            "/api/scrape": {"url": "https://example.com/"},
+            "/api/generate": {"raw_html_path": raw_html_path},
+            "/api/edit": {"html_content": edit_html, "instruction": "Make the hero heading blue"},
+        }
+        started = time.perf_counter()
+        generators = [open_loop(client, recorder, ep, payloads[ep], rate, duration) for ep, rate in rates.items()]
+        tasks = [t for batch in await asyncio.gather(*generators) for t in batch]
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    endpoints = {}
+    for ep in rates:
+        ok = recorder.latencies[ep]
+        errors = sum(recorder.errors[ep].values())
+        sent = recorder.sent[ep]
+        endpoints[ep] = {
+            "offered_rate": rates[ep],
+            "sent": sent,
+            "completed": len(ok),
+            "throughput_rps": round(len(ok) / elapsed, 3) if elapsed else None,
+            "error_rate": round(errors / sent, 4) if sent else 0.0,
+            "rejected_429": recorder.rejected[ep],
+            "rejection_rate": round(recorder.rejected[ep] / sent, 4) if sent else 0.0,
+            "errors": dict(recorder.errors[ep]),
+            "latency_ms": {
+                "p50": percentile(ok, 50),
+                "p95": percentile(ok, 95),
+                "p99": percentile(ok, 99),
+                **describe(ok),
+            },
+        }
+    return {"elapsed_s": round(elapsed, 3), "endpoints": endpoints}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the API with stubbed browser and LLM providers")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of offered load")
+    parser.add_argument("--scrape-rate", type=float, default=1.0, help="/api/scrape arrivals per second")
+    parser.add_argument("--generate-rate", type=float, default=1.0, help="/api/generate arrivals per second")
+    parser.add_argument("--edit-rate", type=float, default=1.0, help="/api/edit arrivals per second")
+    parser.add_argument("--scrape-latency", type=float, default=2.0, help="seconds the stub browser takes per page")
+    parser.add_argument("--llm-latency", type=float, default=5.0, help="seconds the stub LLM takes per call")
+    parser.add_argument("--jitter", type=float, default=0.2, help="relative +/- jitter on stub latencies")
+    parser.add_argument("--timeout", type=float, default=120.0, help="client timeout per request")
+    parser.add_argument("--provider-rpm", type=float, default=100000, help="per-model provider quota (production: GEMINI_PRO_RPM=5)")
+    parser.add_argument("--client-per-min", type=float, default=100000, help="per-client allowance on each endpoint (production: CLIENT_*_PER_MIN)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="results path (default: benchmarks/results/load_<timestamp>.json)")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    logging.disable(logging.WARNING)
+    configure_limits(args.provider_rpm, args.client_per_min)
+
+    import tracing
+
+    tracing.set_exporter(tracing.NoopExporter())
+    install_stubs(args.scrape_latency, args.llm_latency, args.jitter)
+
+    import main as app_main
+
+    app_main.CLONED_SITES_DIR = Path(tempfile.mkdtemp(prefix="loadtest_"))
+
+    rates = {"/api/scrape": args.scrape_rate, "/api/generate": args.generate_rate, "/api/edit": args.edit_rate}
+    server = ServerThread(app_main.app).start()
+    print(f"🧪 Load testing {server.base_url} for {args.duration}s at {rates}")
+    try:
+        report = asyncio.run(run_load(server.base_url, rates, args.duration, args.timeout))
+    finally:
+        server.stop()
+
+    lag = list(server.monitor.lag_samples)
+    report["event_loop_lag_ms"] = {"p50": percentile(lag, 50), "p99": percentile(lag, 99), "max": max(lag) if lag else None, "samples": len(lag)}
+    report["blocking_calls"] = server.monitor.report()["blocking_by_location"]
+    report["admission"] = admission_report()
+
+    for ep, r in report["endpoints"].items():
+        lat = r["latency_ms"]
+        print(
+            f"   {ep:<14} sent={r['sent']:<5} ok={r['completed']:<5} {r['throughput_rps']}rps "
+            f"err={r['error_rate'] * 100:.1f}% 429={r['rejected_429']} p50={lat['p50'] and round(lat['p50'])}ms "
+            f"p95={lat['p95'] and round(lat['p95'])}ms p99={lat['p99'] and round(lat['p99'])}ms"
+        )
+    for gate, stats in sorted(report["admission"].items()):
+        print(f"   🚦 {gate:<40} admitted={stats['admitted']:<5} queue wait mean={stats['queue_wait_mean_ms']}ms rejected={stats['rejected'] or 0}")
+    lag_report = report["event_loop_lag_ms"]
+    print(f"   event loop lag p50={lag_report['p50'] and round(lag_report['p50'], 1)}ms p99={lag_report['p99'] and round(lag_report['p99'], 1)}ms max={lag_report['max'] and round(lag_report['max'], 1)}ms")
+    for location, stats in report["blocking_calls"].items():
+        print(f"   🐢 blocked {stats['count']}x for {stats['blocked_ms']}ms total in {location}")
+
+    path = write_results("load", {"kind": "load", "meta": run_metadata(vars(args)), **report}, args.output)
+    print(f"📁 Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
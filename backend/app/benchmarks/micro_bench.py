@@ -0,0 +1,173 @@
+# micro-benchmarks for the per-request HTML/CSS helpers, with a regression gate against a saved baseline
+
+import argparse
+import contextlib
+import io
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from benchmarks.report import compare, load_results, print_comparison, run_metadata, write_results
+from benchmarks.samples import read_sample, split_document
+from benchmarks.synthetic import page_of_size, synthetic_css, tiny_png
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baselines" / "micro.json"
+SAMPLES = {
+    "amazon": "cloned_amazon_shopping_page.html",
+    "apple": "cloned_apple_ke_page.html",
+    "orchids": "cloned_orchids_landing_page.html",
+}
+
+
+def load_inputs(synthetic_mb: List[float]) -> Dict[str, Dict[str, Any]]:
+    inputs = {}
+    for name, filename in SAMPLES.items():
+        html = read_sample(filename)
+        head, body = split_document(html)
+        inputs[name] = {"html": html, "head": head, "body": body, "css": synthetic_css(64, seed=1)}
+    for mb in synthetic_mb:
+        html = page_of_size(int(mb * 1024 * 1024))
+        head, body = split_document(html)
+        inputs[f"synthetic_{mb:g}mb"] = {"html": html, "head": head, "body": body, "css": synthetic_css(int(mb * 1024), seed=2)}
+    return inputs
+
+
+def build_cases(inputs: Dict[str, Dict[str, Any]]) -> List[Tuple[str, str, Callable[[], Any], int]]:
+    """(function name, input name, thunk, input size in bytes)."""
+    from bs4 import BeautifulSoup
+    from compact_dom import CompactDOM
+    from llm_client import create_prompt_clone, extract_essential_meta, truncate_css
+    from scraper_sync import extract_dom_structure, resolve_urls_in_html
+    from utils import to_data_uri
+
+    cases = []
+    for name, data in inputs.items():
+        html, head, body, css = data["html"], data["head"], data["body"], data["css"]
+        soup = BeautifulSoup(body, "html.parser")
+        dom = CompactDOM.from_soup(soup)
+        context = {"head": head, "body": body, "css": css}
+        cases += [
+            ("resolve_urls_in_html", name, lambda b=body: resolve_urls_in_html(b, "https://example.com/a/b/"), len(body)),
+            ("extract_dom_structure", name, lambda s=soup: extract_dom_structure(s), len(body)),
+            ("compact_dom_to_bytes", name, lambda d=dom: d.to_bytes(), len(body)),
+            ("extract_essential_meta", name, lambda h=head: extract_essential_meta(h), len(head)),
+            ("truncate_css", name, lambda c=css: truncate_css(c), len(css)),
+            ("create_prompt_clone", name, lambda c=context: create_prompt_clone(c), len(html)),
+        ]
+
+    for label, size in (("image_64kb", 64 * 1024), ("image_1mb", 1024 * 1024), ("image_8mb", 8 * 1024 * 1024)):
+        png = tiny_png(16, 16)
+        data = (png * (size // len(png) + 1))[:size]
+        cases.append(("to_data_uri", label, lambda d=data: to_data_uri("image/png", d), size))
+    return cases
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    """Wall time over `repeat` calls, then one tracemalloc-instrumented call for allocations and peak."""
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn()  # warm-up: imports, regex compilation, soupsieve caches
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - start) * 1000)
+
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        base_current, _ = tracemalloc.get_traced_memory()
+        result = fn()
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+    del result
+
+    allocations = sum(max(0, s.count_diff) for s in after.compare_to(before, "lineno"))
+    return {
+        "median_ms": round(statistics.median(timings), 3),
+        "min_ms": round(min(timings), 3),
+        "peak_kb": round((peak - base_current) / 1024, 1),
+        "allocated_blocks": allocations,
+    }
+
+
+def check_regressions(changes: Dict[str, Dict[str, Any]], threshold: float, min_delta_ms: float, min_delta_kb: float) -> List[str]:
+    """Metrics that grew by more than `threshold` and by more than the absolute noise floor."""
+    regressions = []
+    for key, c in sorted(changes.items()):
+        if c["change"] is None or c["change"] <= threshold:
+            continue
+        floor = min_delta_ms if key.endswith("_ms") else min_delta_kb
+        if c["current"] - c["baseline"] < floor:
+            continue
+        regressions.append(f"{key}: {c['baseline']} -> {c['current']} ({c['change'] * 100:+.1f}%)")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline micro-benchmarks for the HTML/CSS helpers")
+    parser.add_argument("--repeat", type=int, default=5, help="timed calls per case (after one warm-up)")
+    parser.add_argument("--synthetic-mb", default="2,8", help="comma separated sizes of synthetic inputs in MB")
+    parser.add_argument("--only", default="", help="comma separated function names to run")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="baseline results to gate against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative regression before failing")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore time regressions smaller than this")
+    parser.add_argument("--min-delta-kb", type=float, default=64.0, help="ignore memory regressions smaller than this")
+    parser.add_argument("--save-baseline", action="store_true", help="write this run as the new baseline")
+    parser.add_argument("--output", help="results path (default: benchmarks/results/micro_<timestamp>.json)")
+    args = parser.parse_args()
+
+    sizes = [float(s) for s in args.synthetic_mb.split(",") if s.strip()]
+    only = {s.strip() for s in args.only.split(",") if s.strip()}
+
+    print("🧪 Preparing inputs...")
+    cases = build_cases(load_inputs(sizes))
+    results, metrics = [], {}
+    for func, input_name, fn, size in cases:
+        if only and func not in only:
+            continue
+        try:
+            m = measure(fn, args.repeat)
+            error = None
+        except RecursionError as e:
+            m, error = {}, f"RecursionError: {e}"
+        results.append({"function": func, "input": input_name, "input_bytes": size, **m, "error": error})
+        if error:
+            print(f"   {func:<24} {input_name:<18} ❌ {error}")
+            continue
+        mb_per_s = (size / 1024 / 1024) / (m["median_ms"] / 1000) if m["median_ms"] else float("inf")
+        print(f"   {func:<24} {input_name:<18} {m['median_ms']:>10.3f}ms {mb_per_s:>8.1f}MB/s peak={m['peak_kb']:>10.1f}KB allocs={m['allocated_blocks']}")
+        metrics[f"{func}/{input_name}/median_ms"] = m["median_ms"]
+        metrics[f"{func}/{input_name}/peak_kb"] = m["peak_kb"]
+
+    payload = {"kind": "micro", "meta": run_metadata(vars(args)), "results": results, "metrics": metrics}
+    path = write_results("micro", payload, args.output)
+    print(f"📁 Results written to {path}")
+
+    if args.save_baseline:
+        write_results("micro", payload, args.baseline)
+        print(f"📌 Baseline saved to {args.baseline}")
+        return 0
+
+    if not Path(args.baseline).exists():
+        print(f"ℹ️  No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+
+    changes = compare(load_results(args.baseline)["metrics"], metrics)
+    print(f"🔍 Compared with {args.baseline}:")
+    print_comparison(changes)
+    regressions = check_regressions(changes, args.threshold, args.min_delta_ms, args.min_delta_kb)
+    if regressions:
+        print(f"❌ {len(regressions)} metrics regressed more than {args.threshold * 100:.0f}%:")
+        for line in regressions:
+            print(f"   {line}")
+        return 1
+    print("✅ No regressions beyond threshold")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+# shared helpers for benchmark results: percentiles, RSS, JSON output and run-to-run comparison
+
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def percentile(values: Iterable[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile; None for an empty sample."""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def describe(values: Iterable[float]) -> Dict[str, Optional[float]]:
+    values = list(values)
+    if not values:
+        return {"runs": 0, "median": None, "min": None, "max": None}
+    return {
+        "runs": len(values),
+        "median": round(statistics.median(values), 3),
+        "min": round(min(values), 3),
+        "max": round(max(values), 3),
+    }
+
+
+def peak_rss_kb() -> Dict[str, Optional[int]]:
+    """
+    Peak resident set size of this process and of reaped child processes (Chromium), in KB.
+    Uses `resource` where available and falls back to psutil (current RSS only) elsewhere.
+    """
+    try:
+        import resource
+
+        scale = 1 if sys.platform != "darwin" else 1 / 1024  # macOS reports bytes
+        return {
+            "self": int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale),
+            "children": int(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale),
+        }
+    except ImportError:
+        pass
+    try:
+        import psutil
+
+        return {"self": psutil.Process().memory_info().rss // 1024, "children": None}
+    except ImportError:
+        return {"self": None, "children": None}
+
+
+def run_metadata(config: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": config,
+    }
+
+
+def write_results(kind: str, payload: Dict[str, Any], output: Optional[str] = None) -> Path:
+    """Write a results document to `output` or benchmarks/results/<kind>_<timestamp>.json."""
+    if output:
+        path = Path(output)
+    else:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        path = RESULTS_DIR / f"{kind}_{time.strftime('%Y%m%d_%H%M%S', time.gmtime())}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, sort_keys=True)
+    return path
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(baseline: Dict[str, float], current: Dict[str, float]) -> Dict[str, Dict[str, Optional[float]]]:
+    """Per-key relative change of `current` against `baseline` (+0.25 == 25% slower/larger)."""
+    changes = {}
+    for key, new in current.items():
+        old = baseline.get(key)
+        if old is None or new is None:
+            continue
+        changes[key] = {
+            "baseline": old,
+            "current": new,
+            "change": round((new - old) / old, 4) if old else None,
+        }
+    return changes
+
+
+def print_comparison(changes: Dict[str, Dict[str, Optional[float]]]) -> None:
+    for key, c in sorted(changes.items()):
+        pct = f"{c['change'] * 100:+.1f}%" if c["change"] is not None else "n/a"
+        print(f"   {key:<60} {c['baseline']:>12} -> {c['current']:>12}  {pct}")
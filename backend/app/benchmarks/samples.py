@@ -0,0 +1,20 @@
+# access to the bundled cloned_sites samples used as benchmark inputs
+
+from pathlib import Path
+from typing import Tuple
+
+SAMPLES_DIR = Path(__file__).resolve().parent.parent / "cloned_sites"
+
+
+def read_sample(filename: str) -> str:
+    return (SAMPLES_DIR / filename).read_text(encoding="utf-8")
+
+
+def split_document(html: str) -> Tuple[str, str]:
+    """Cheap head/body split without BeautifulSoup so input prep does not skew the numbers."""
+    lower = html.lower()
+    head_start, head_end = lower.find("<head"), lower.find("</head>")
+    body_start = lower.find("<body")
+    head = html[head_start:head_end + 7] if head_start != -1 and head_end != -1 else ""
+    body = html[body_start:] if body_start != -1 else html
+    return head, body
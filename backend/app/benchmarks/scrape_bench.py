@@ -0,0 +1,169 @@
+# offline scrape benchmark: runs the sync and async scrapers against the local fixture server
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List
+
+import tracing
+from benchmarks.fixture_server import FixtureServer
+from benchmarks.report import compare, describe, load_results, peak_rss_kb, print_comparison, run_metadata, write_results
+
+# Spans that describe a scrape stage; everything else (per-image spans etc.) is summed separately
+STAGES = [
+    "playwright.launch",
+    "playwright.goto",
+    "playwright.settle",
+    "playwright.content",
+    "html.parse",
+    "css.extract",
+    "html.resolve_urls",
+]
+
+
+def _scrape_once(mode: str, url: str, har_mode: str = "off") -> None:
+    if mode == "sync":
+        from scraper_sync import fetch_design_context_sync
+
+        fetch_design_context_sync(url, har_mode=har_mode)
+    else:
+        from scraper_async import fetch_design_context_async
+
+        asyncio.run(fetch_design_context_async(url, har_mode=har_mode))
+
+
+def bench_page(mode: str, name: str, url: str, runs: int, exporter: tracing.InMemoryExporter, har_mode: str = "off") -> Dict[str, Any]:
+    """One cold run followed by `runs` warm runs of the same URL."""
+    timings: List[float] = []
+    stages: Dict[str, List[float]] = defaultdict(list)
+    errors: List[str] = []
+
+    for i in range(runs + 1):
+        exporter.clear()
+        start = time.perf_counter()
+        try:
+            with tracing.trace():
+                _scrape_once(mode, url, har_mode)
+        except Exception as e:
+            errors.append(f"run {i}: {e}")
+            continue
+        timings.append((time.perf_counter() - start) * 1000)
+
+        per_run: Dict[str, float] = defaultdict(float)
+        for s in exporter.spans:
+            per_run[s["name"]] += s["duration_ms"]
+        for stage, ms in per_run.items():
+            stages[stage].append(ms)
+
+    cold, warm = (timings[0], timings[1:]) if timings else (None, [])
+    print(f"   {mode:<5} {name:<40} cold={cold and round(cold)}ms warm={describe(warm)['median']}ms errors={len(errors)}")
+    return {
+        "page": name,
+        "mode": mode,
+        "url": url,
+        "cold_ms": round(cold, 3) if cold is not None else None,
+        "warm_ms": describe(warm),
+        "stages_ms": {stage: round(statistics.median(v), 3) for stage, v in sorted(stages.items())},
+        "errors": errors,
+    }
+
+
+def flatten(results: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Comparable scalar metrics keyed by mode/page/metric."""
+    flat = {}
+    for r in results:
+        prefix = f"{r['mode']}/{r['page']}"
+        if r["cold_ms"] is not None:
+            flat[f"{prefix}/cold_ms"] = r["cold_ms"]
+        if r["warm_ms"]["median"] is not None:
+            flat[f"{prefix}/warm_ms"] = r["warm_ms"]["median"]
+        for stage in STAGES:
+            if stage in r["stages_ms"]:
+                flat[f"{prefix}/{stage}"] = r["stages_ms"][stage]
+    return flat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline scrape benchmark against a local fixture server")
+    parser.add_argument("--modes", default="sync,async", help="comma separated: sync,async")
+    parser.add_argument("--pages", default="", help="comma separated sample names (default: all non-empty samples)")
+    parser.add_argument("--runs", type=int, default=3, help="warm runs per page after the cold run")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay added to every fixture response")
+    parser.add_argument("--synthetic", type=int, default=1, help="number of synthetic heavy pages to include")
+    parser.add_argument("--assets", type=int, default=8, help="stylesheets and scripts per synthetic page")
+    parser.add_argument("--images", type=int, default=24, help="images per synthetic page")
+    parser.add_argument("--sections", type=int, default=20, help="product sections per synthetic page")
+    parser.add_argument("--asset-kb", type=int, default=32, help="size of each synthetic stylesheet/script")
+    parser.add_argument(
+        "--har", choices=["off", "record", "replay"], default="off",
+        help="record: save each page's traffic to har/; replay: serve pages from those archives (see SCRAPE_HAR_TIMING)",
+    )
+    parser.add_argument("--port", type=int, default=0, help="fixture server port; use a fixed one with --har so replayed URLs match")
+    parser.add_argument(
+        "--subresource-cache", choices=["fresh", "off", "shared"], default="fresh",
+        help="fresh: empty cache dir per benchmark (cold run fills it, warm runs hit it); off: disabled; shared: the app's cache",
+    )
+    parser.add_argument("--output", help="results path (default: benchmarks/results/scrape_<timestamp>.json)")
+    parser.add_argument("--compare", help="previous results file to diff against")
+    args = parser.parse_args()
+
+    if args.subresource_cache == "off":
+        os.environ["SUBRESOURCE_CACHE"] = "0"
+    elif args.subresource_cache == "fresh":
+        import subresource_cache
+
+        subresource_cache._cache = subresource_cache.SubresourceCache(tempfile.mkdtemp(prefix="subresource_cache_"))
+
+    exporter = tracing.InMemoryExporter()
+    previous_exporter = tracing.set_exporter(exporter)
+
+    results = []
+    started = time.perf_counter()
+    try:
+        with FixtureServer(port=args.port, latency_ms=args.latency_ms) as fixture:
+            pages = [("sample/" + n, fixture.sample_url(n)) for n in (args.pages.split(",") if args.pages else fixture.sample_names())]
+            for i in range(args.synthetic):
+                url = fixture.synthetic_url(
+                    sections=args.sections + i * 10, stylesheets=args.assets, scripts=args.assets,
+                    images=args.images, kb=args.asset_kb,
+                )
+                pages.append((f"synthetic/{i}", url))
+
+            print(f"🧪 Benchmarking {len(pages)} pages at {fixture.base_url} (latency {args.latency_ms}ms)")
+            for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+                for name, url in pages:
+                    results.append(bench_page(mode, name, url, args.runs, exporter, args.har))
+            fixture_requests = fixture.request_count
+    finally:
+        tracing.set_exporter(previous_exporter)
+
+    elapsed = time.perf_counter() - started
+    scraped = sum(r["warm_ms"]["runs"] + (1 if r["cold_ms"] is not None else 0) for r in results)
+    payload = {
+        "kind": "scrape",
+        "meta": run_metadata(vars(args)),
+        "results": results,
+        "summary": {
+            "pages_scraped": scraped,
+            "elapsed_s": round(elapsed, 3),
+            "pages_per_minute": round(scraped / elapsed * 60, 3) if elapsed else None,
+            "peak_rss_kb": peak_rss_kb(),
+            "fixture_requests": fixture_requests,
+        },
+        "metrics": flatten(results),
+    }
+    path = write_results("scrape", payload, args.output)
+    print(f"📊 {payload['summary']['pages_per_minute']} pages/min, peak RSS {payload['summary']['peak_rss_kb']}")
+    print(f"📁 Results written to {path}")
+
+    if args.compare:
+        print(f"🔍 Compared with {args.compare}:")
+        print_comparison(compare(load_results(args.compare)["metrics"], payload["metrics"]))
+
+
+if __name__ == "__main__":
+    main()
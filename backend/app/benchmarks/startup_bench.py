@@ -0,0 +1,108 @@
+# startup benchmark: cold import time of the API, its slowest imports, and time until it answers a first request
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.report import compare, describe, load_results, print_comparison, run_metadata, write_results
+
+APP_DIR = Path(__file__).resolve().parent.parent
+# Modules that should only load on first use (or in the STARTUP_PREWARM background task)
+DEFERRED_MODULES = ("playwright", "groq", "google.generativeai", "bs4")
+
+# Runs in a fresh interpreter per sample, so nothing is imported or cached in-process yet
+PROBE = r"""
+import json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+client_imported = time.perf_counter()
+with TestClient(main.app) as client:
+    ready = time.perf_counter()
+    client.get("/")
+    answered = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "lifespan_ms": (ready - client_imported) * 1000,
+    "first_request_ms": (answered - ready) * 1000,
+    "total_ms": (answered - started) * 1000 - (client_imported - imported) * 1000,
+    "deferred_loaded": [m for m in %r if m in sys.modules],
+}))
+""" % (DEFERRED_MODULES,)
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def run_probe(env: Dict[str, str]) -> dict:
+    proc = subprocess.run([sys.executable, "-c", PROBE], cwd=APP_DIR, env=env, capture_output=True, text=True, timeout=300)
+    if proc.returncode != 0:
+        raise RuntimeError(f"startup probe failed:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(env: Dict[str, str], top: int) -> List[dict]:
+    """Direct imports of main by cumulative import time, from `python -X importtime`."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=APP_DIR, env=env,
+                          capture_output=True, text=True, timeout=300)
+    direct = []
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        # Depth 0 is main itself; each nesting level adds two spaces
+        if match and len(match.group(3)) == 3:
+            direct.append({"module": match.group(4), "cumulative_ms": round(int(match.group(2)) / 1000, 2)})
+    return sorted(direct, key=lambda m: m["cumulative_ms"], reverse=True)[:top]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Cold-start benchmark for the API process")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to sample")
+    parser.add_argument("--top", type=int, default=15, help="slowest direct imports of main to list")
+    parser.add_argument("--prewarm", action="store_true", help="start with STARTUP_PREWARM=1")
+    parser.add_argument("--compare", help="previous startup results to compare with")
+    parser.add_argument("--output", help="results path (default: benchmarks/results/startup_<timestamp>.json)")
+    args = parser.parse_args()
+
+    env = {**os.environ, "STARTUP_PREWARM": "1" if args.prewarm else "0"}
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    print(f"🧪 Sampling {args.runs} cold starts...")
+    run_probe(env)  # first run writes the bytecode caches, like any deployment that has started once
+    samples = [run_probe(env) for _ in range(args.runs)]
+    summary = {key: describe(s[key] for s in samples) for key in ("import_ms", "lifespan_ms", "first_request_ms", "total_ms")}
+    for key, stats in summary.items():
+        print(f"   {key:<18} median {stats['median']:>9.1f}ms  min {stats['min']:>9.1f}ms  max {stats['max']:>9.1f}ms")
+    deferred_loaded = samples[-1]["deferred_loaded"]
+    if deferred_loaded:
+        print(f"⚠️  Loaded at startup although deferred: {', '.join(deferred_loaded)}")
+
+    imports = slowest_imports(env, args.top)
+    print("🐢 Slowest direct imports of main:")
+    for entry in imports:
+        print(f"   {entry['module']:<32} {entry['cumulative_ms']:>9.1f}ms")
+
+    metrics = {f"{key}/median": stats["median"] for key, stats in summary.items()}
+    payload = {
+        "kind": "startup",
+        "meta": run_metadata(vars(args)),
+        "summary": summary,
+        "samples": samples,
+        "slowest_imports": imports,
+        "deferred_loaded": deferred_loaded,
+        "metrics": metrics,
+    }
+    path = write_results("startup", payload, args.output)
+    print(f"📁 Results written to {path}")
+
+    if args.compare:
+        print(f"🔍 Compared with {args.compare}:")
+        print_comparison(compare(load_results(args.compare)["metrics"], metrics))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+# deterministic synthetic pages and assets for benchmarks (no network, no randomness between runs)
+
+import random
+import struct
+import zlib
+from typing import Optional
+
+_WORDS = (
+    "orchid clone design layout section header footer product price rating review "
+    "shipping delivery account search cart offer deal brand colour size detail"
+).split()
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words))
+
+
+def synthetic_css(kb: int, seed: int = 0) -> str:
+    """Roughly `kb` kilobytes of plausible CSS rules, including @media blocks and layout keywords."""
+    rng = random.Random(seed)
+    rules = []
+    size = 0
+    i = 0
+    while size < kb * 1024:
+        selector = f".c{seed}-{i} .{rng.choice(_WORDS)}"
+        body = (
+            f"margin:{rng.randint(0, 32)}px;padding:{rng.randint(0, 32)}px;"
+            f"color:#{rng.randint(0, 0xFFFFFF):06x};display:{rng.choice(['flex', 'grid', 'block'])}"
+        )
+        rule = f"{selector}{{{body}}}"
+        if i % 25 == 0:
+            rule = f"@media (max-width:{rng.choice([480, 768, 1024])}px){{{rule}}}"
+        rules.append(rule)
+        size += len(rule) + 1
+        i += 1
+    return "\n".join(rules)
+
+
+def synthetic_js(kb: int, seed: int = 0) -> str:
+    filler = "var x%d=%d;" % (seed, seed)
+    return "/* synthetic bundle */\n" + filler * max(1, (kb * 1024) // len(filler))
+
+
+def tiny_png(width: int = 8, height: int = 8, seed: int = 0) -> bytes:
+    """A valid RGB PNG built with zlib only."""
+    rng = random.Random(seed)
+    raw = b"".join(
+        b"\x00" + bytes(rng.randrange(256) for _ in range(width * 3))
+        for _ in range(height)
+    )
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b"")
+
+
+def product_card(rng: random.Random, i: int, img_src: str) -> str:
+    return (
+        f'<div class="s-result-item s-asin" data-asin="B{i:09d}" data-index="{i}">'
+        f'<div class="s-card-container"><a class="a-link-normal" href="/dp/B{i:09d}?ref=sr_1_{i}">'
+        f'<img class="s-image" src="{img_src}" alt="{_text(rng, 4)}" width="218" height="218"></a>'
+        f'<h2 class="a-size-mini"><span class="a-text-normal">{_text(rng, 12)}</span></h2>'
+        f'<div class="a-row"><span class="a-icon-alt">{rng.randint(1, 5)}.{rng.randint(0, 9)} out of 5 stars</span>'
+        f'<span class="a-size-base">{rng.randint(10, 9999)}</span></div>'
+        f'<span class="a-price"><span class="a-offscreen">${rng.randint(1, 999)}.{rng.randint(0, 99):02d}</span></span>'
+        f'</div></div>'
+    )
+
+
+def synthetic_page(
+    sections: int = 20,
+    cards_per_section: int = 24,
+    stylesheets: int = 0,
+    scripts: int = 0,
+    images: int = 0,
+    asset_kb: int = 32,
+    asset_prefix: str = "/asset",
+    inline_css_kb: int = 0,
+    seed: int = 0,
+    title: Optional[str] = None,
+) -> str:
+    """
+    A catalogue-style page: `sections` blocks of repeated product cards, plus optional
+    external stylesheets/scripts/images served by the fixture server under `asset_prefix`.
+    """
+    rng = random.Random(seed)
+    head = [f"<title>{title or f'Synthetic page {seed}'}</title>", '<meta charset="utf-8">',
+            '<meta name="viewport" content="width=device-width, initial-scale=1">']
+    for i in range(stylesheets):
+        head.append(f'<link rel="stylesheet" href="{asset_prefix}/css/{i}.css?kb={asset_kb}">')
+    if inline_css_kb:
+        head.append(f"<style>{synthetic_css(inline_css_kb, seed)}</style>")
+    for i in range(scripts):
+        head.append(f'<script src="{asset_prefix}/js/{i}.js?kb={asset_kb}" defer></script>')
+
+    body = ['<header id="nav"><nav><a href="/">Home</a><a href="/deals">Deals</a></nav></header>', "<main>"]
+    card = 0
+    for s in range(sections):
+        body.append(f'<section class="results" id="section-{s}"><h2>{_text(rng, 3)}</h2><div class="s-main-slot">')
+        for _ in range(cards_per_section):
+            img_src = f"{asset_prefix}/img/{card % images}.png" if images else f"/static/p{card}.jpg"
+            body.append(product_card(rng, card, img_src))
+            card += 1
+        body.append("</div></section>")
+    body.append("</main><footer><p>" + _text(rng, 40) + "</p></footer>")
+
+    return (
+        "<!DOCTYPE html><html><head>" + "".join(head) + "</head><body>" + "".join(body) + "</body></html>"
+    )
+
+
+def page_of_size(target_bytes: int, seed: int = 0) -> str:
+    """A synthetic catalogue page grown until it is at least `target_bytes` long."""
+    one = len(synthetic_page(sections=1, seed=seed))
+    per_section = len(synthetic_page(sections=2, seed=seed)) - one
+    sections = max(1, (target_bytes - one) // per_section + 1)
+    html = synthetic_page(sections=sections, seed=seed)
+    while len(html) < target_bytes:
+        sections += 1
+        html = synthetic_page(sections=sections, seed=seed)
+    return html
@@ -0,0 +1,326 @@
+# compact DOM: a parsed page as flat parallel arrays over interned strings, built and walked without recursion
+
+import json
+import re
+import struct
+import sys
+from array import array
+from html import escape
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from bs4 import BeautifulSoup, Tag
+from bs4.element import Comment, Declaration, Doctype, ProcessingInstruction
+
+DOCUMENT = "#document"
+TEXT = "#text"
+DOCUMENT_ID, TEXT_ID = 0, 1
+SKIPPED_STRINGS = (Comment, Declaration, Doctype, ProcessingInstruction)
+RAW_TEXT = {"script", "style"}
+VOID = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"}
+
+MAGIC = b"CDOM"
+VERSION = 1
+HEADER = struct.Struct("<4sHII")
+
+COMBINATOR = re.compile(r"\s*>\s*|\s+")
+SIMPLE = re.compile(
+    r"(?P<tag>[a-zA-Z][\w-]*|\*)|#(?P<id>[\w-]+)|\.(?P<cls>[\w-]+)"
+    r"|\[\s*(?P<attr>[\w:-]+)\s*(?:(?P<op>[~^$*]?=)\s*(?:\"(?P<dq>[^\"]*)\"|'(?P<sq>[^']*)'|(?P<bare>[^\]\s]+))\s*)?\]"
+)
+
+
+def _attribute_value(value) -> str:
+    # bs4 splits multi-valued attributes (class, rel, ...) into lists
+    return " ".join(value) if isinstance(value, list) else str(value)
+
+
+class CompactDOM:
+    """
+    Nodes in document order, node 0 being the document. For node i: tags[i] is the string id of
+    its tag name (TEXT_ID for text), parents[i] its parent (-1 for the document), ends[i] one past
+    its last descendant so its subtree is range(i, ends[i]), texts[i] the string id of its text
+    (-1 for elements), and attr_names/attr_values[attr_offsets[i]:attr_offsets[i + 1]] its
+    attributes. Tag names, attribute names and values and texts are each stored once in `strings`.
+    Comments and doctypes are dropped; whitespace-only text is kept as a single space.
+    """
+
+    def __init__(self):
+        self.strings: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self.tags = array("i")
+        self.parents = array("i")
+        self.ends = array("i")
+        self.texts = array("i")
+        self.attr_offsets = array("i", [0])
+        self.attr_names = array("i")
+        self.attr_values = array("i")
+        self.intern(DOCUMENT)
+        self.intern(TEXT)
+
+    def intern(self, value: str) -> int:
+        string_id = self._ids.get(value)
+        if string_id is None:
+            string_id = self._ids[value] = len(self.strings)
+            self.strings.append(value)
+        return string_id
+
+    def _add(self, tag_id: int, parent: int, text_id: int = -1, attrs: Optional[dict] = None) -> int:
+        index = len(self.tags)
+        self.tags.append(tag_id)
+        self.parents.append(parent)
+        self.ends.append(index + 1)
+        self.texts.append(text_id)
+        if attrs:
+            for name, value in attrs.items():
+                self.attr_names.append(self.intern(name))
+                self.attr_values.append(self.intern(_attribute_value(value)))
+        self.attr_offsets.append(len(self.attr_names))
+        return index
+
+    @classmethod
+    def from_soup(cls, soup) -> "CompactDOM":
+        """Snapshot a BeautifulSoup document (or a single tag, which becomes node 0's only child)."""
+        dom = cls()
+        dom._add(DOCUMENT_ID, -1)
+        if not isinstance(soup, BeautifulSoup):
+            dom._add(dom.intern(soup.name), 0, attrs=soup.attrs)
+        # The hot loop of a scrape: attribute lookups hoisted into locals
+        add, intern, ends, tags = dom._add, dom.intern, dom.ends, dom.tags
+        stack = [(iter(soup.children), len(tags) - 1)]
+        pop, push = stack.pop, stack.append
+        while stack:
+            children, index = stack[-1]
+            for child in children:
+                if isinstance(child, Tag):
+                    push((iter(child.children), add(intern(child.name), index, -1, child.attrs)))
+                    break
+                if child and not isinstance(child, SKIPPED_STRINGS):
+                    add(TEXT_ID, index, intern(child if child.strip() else " "))
+            else:
+                pop()
+                ends[index] = len(tags)
+        ends[0] = len(tags)
+        return dom
+
+    @classmethod
+    def from_html(cls, html: str) -> "CompactDOM":
+        return cls.from_soup(BeautifulSoup(html, "html.parser"))
+
+    # --- node access -------------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.tags)
+
+    def is_element(self, index: int) -> bool:
+        return self.tags[index] > TEXT_ID
+
+    def tag_name(self, index: int) -> str:
+        return self.strings[self.tags[index]]
+
+    def text(self, index: int) -> Optional[str]:
+        text_id = self.texts[index]
+        return self.strings[text_id] if text_id >= 0 else None
+
+    def attribute_pairs(self, index: int) -> Iterator[Tuple[int, int]]:
+        return zip(self.attr_names[self.attr_offsets[index]:self.attr_offsets[index + 1]],
+                   self.attr_values[self.attr_offsets[index]:self.attr_offsets[index + 1]])
+
+    def attributes(self, index: int) -> Dict[str, str]:
+        return {self.strings[n]: self.strings[v] for n, v in self.attribute_pairs(index)}
+
+    def get(self, index: int, name: str, default: Optional[str] = None) -> Optional[str]:
+        name_id = self._ids.get(name)
+        for n, v in self.attribute_pairs(index):
+            if n == name_id:
+                return self.strings[v]
+        return default
+
+    def children(self, index: int) -> Iterator[int]:
+        child = index + 1
+        while child < self.ends[index]:
+            yield child
+            child = self.ends[child]
+
+    def text_content(self, index: int = 0) -> str:
+        return "".join(self.strings[self.texts[i]] for i in range(index, self.ends[index]) if self.tags[i] == TEXT_ID)
+
+    def nbytes(self) -> int:
+        """Approximate size of the snapshot: the arrays plus the UTF-8 of every distinct string."""
+        arrays = (self.tags, self.parents, self.ends, self.texts, self.attr_offsets, self.attr_names, self.attr_values)
+        return sum(a.itemsize * len(a) for a in arrays) + sum(len(s.encode("utf-8")) for s in self.strings)
+
+    # --- output ------------------------------------------------------------------------------
+
+    def to_html(self, index: int = 0) -> str:
+        out: List[str] = []
+        open_elements: List[int] = []
+        strings = self.strings
+        for i in range(index, self.ends[index]):
+            while open_elements and self.ends[open_elements[-1]] <= i:
+                out.append(f"</{strings[self.tags[open_elements.pop()]]}>")
+            tag_id = self.tags[i]
+            if tag_id == TEXT_ID:
+                text = strings[self.texts[i]]
+                out.append(text if strings[self.tags[self.parents[i]]] in RAW_TEXT else escape(text, quote=False))
+            elif tag_id != DOCUMENT_ID:
+                name = strings[tag_id]
+                attrs = "".join(f' {strings[n]}="{escape(strings[v])}"' for n, v in self.attribute_pairs(i))
+                out.append(f"<{name}{attrs}>")
+                if name not in VOID:
+                    open_elements.append(i)
+        while open_elements:
+            out.append(f"</{strings[self.tags[open_elements.pop()]]}>")
+        return "".join(out)
+
+    def to_dict(self, index: int = 0) -> Optional[dict]:
+        """The nested {"type", "tag", "attributes", "children"} form extract_dom_structure used to return."""
+        nodes: Dict[int, dict] = {}
+        root = None
+        for i in range(index, self.ends[index]):
+            if self.tags[i] == TEXT_ID:
+                content = self.strings[self.texts[i]].strip()
+                node = {"type": "text", "content": content} if content else None
+            else:
+                tag = "[document]" if self.tags[i] == DOCUMENT_ID else self.strings[self.tags[i]]
+                node = nodes[i] = {"type": "element", "tag": tag, "attributes": self.attributes(i), "children": []}
+            if i == index:
+                root = node
+            elif node is not None:
+                nodes[self.parents[i]]["children"].append(node)
+        return root
+
+    def to_bytes(self) -> bytes:
+        """Binary snapshot: a header, the arrays as little-endian int32 and the string table as JSON."""
+        arrays = [self.tags, self.parents, self.ends, self.texts, self.attr_offsets, self.attr_names, self.attr_values]
+        if sys.byteorder != "little":
+            arrays = [array("i", a) for a in arrays]
+            for a in arrays:
+                a.byteswap()
+        strings = json.dumps(self.strings, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return HEADER.pack(MAGIC, VERSION, len(self.tags), len(self.attr_names)) + b"".join(a.tobytes() for a in arrays) + strings
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CompactDOM":
+        magic, version, nodes, attrs = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a compact DOM snapshot (magic {magic!r}, version {version})")
+        dom = cls.__new__(cls)
+        offset = HEADER.size
+        for name, count in (("tags", nodes), ("parents", nodes), ("ends", nodes), ("texts", nodes),
+                            ("attr_offsets", nodes + 1), ("attr_names", attrs), ("attr_values", attrs)):
+            values = array("i")
+            values.frombytes(data[offset:offset + 4 * count])
+            if sys.byteorder != "little":
+                values.byteswap()
+            setattr(dom, name, values)
+            offset += 4 * count
+        dom.strings = json.loads(data[offset:].decode("utf-8"))
+        dom._ids = {s: i for i, s in enumerate(dom.strings)}
+        return dom
+
+    # --- selectors ---------------------------------------------------------------------------
+
+    def select(self, selector: str, index: int = 0) -> List[int]:
+        """
+        Elements under `index` matching a CSS selector, in document order. Supports type, universal,
+        #id, .class and [attr], [attr=v], [attr~=v], [attr^=v], [attr$=v], [attr*=v] selectors,
+        descendant and child (>) combinators, and comma-separated groups.
+        """
+        groups = [self._compile(group) for group in _split_groups(selector)]
+        return [i for i in range(index + 1, self.ends[index])
+                if self.tags[i] > TEXT_ID and any(self._matches_chain(parts, len(parts) - 1, i) for parts in groups)]
+
+    def select_one(self, selector: str, index: int = 0) -> Optional[int]:
+        matches = self.select(selector, index)
+        return matches[0] if matches else None
+
+    def _compile(self, selector: str) -> List[Tuple[Optional[str], dict]]:
+        """[(combinator, compound)] with names resolved to string ids; -2 marks a name absent from the page."""
+        parts = []
+        for combinator, compound in _parse_selector(selector):
+            resolve = lambda s: self._ids.get(s, -2)
+            parts.append((combinator, {
+                "tag": None if compound["tag"] in (None, "*") else resolve(compound["tag"].lower()),
+                "attrs": [(resolve(name), op, value) for name, op, value in compound["attrs"]],
+            }))
+        return parts
+
+    def _matches(self, compound: dict, index: int) -> bool:
+        if self.tags[index] <= TEXT_ID or (compound["tag"] is not None and self.tags[index] != compound["tag"]):
+            return False
+        if not compound["attrs"]:
+            return True
+        attrs = dict(self.attribute_pairs(index))
+        for name_id, op, expected in compound["attrs"]:
+            if name_id not in attrs:
+                return False
+            value = self.strings[attrs[name_id]]
+            if op is None:
+                continue
+            if not ((op == "=" and value == expected) or (op == "~=" and expected in value.split())
+                    or (op == "^=" and expected and value.startswith(expected))
+                    or (op == "$=" and expected and value.endswith(expected))
+                    or (op == "*=" and expected and expected in value)):
+                return False
+        return True
+
+    def _matches_chain(self, parts, k: int, index: int) -> bool:
+        if not self._matches(parts[k][1], index):
+            return False
+        if k == 0:
+            return True
+        parent = self.parents[index]
+        if parts[k][0] == ">":
+            return parent >= 0 and self._matches_chain(parts, k - 1, parent)
+        while parent >= 0:
+            if self._matches_chain(parts, k - 1, parent):
+                return True
+            parent = self.parents[parent]
+        return False
+
+
+def _split_groups(selector: str) -> List[str]:
+    groups, depth, current = [], 0, []
+    for char in selector:
+        depth += char == "["
+        depth -= char == "]"
+        if char == "," and depth == 0:
+            groups.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    groups.append("".join(current))
+    return [g.strip() for g in groups if g.strip()]
+
+
+def _parse_selector(selector: str) -> List[Tuple[Optional[str], dict]]:
+    parts: List[Tuple[Optional[str], dict]] = []
+    combinator: Optional[str] = None
+    compound: Optional[dict] = None
+    pos = 0
+    while pos < len(selector):
+        match = COMBINATOR.match(selector, pos)
+        if match:
+            if compound is None:
+                raise ValueError(f"Unsupported selector: {selector!r}")
+            parts.append((combinator, compound))
+            combinator, compound, pos = (">" if ">" in match.group() else " "), None, match.end()
+            continue
+        match = SIMPLE.match(selector, pos)
+        if not match:
+            raise ValueError(f"Unsupported selector: {selector!r}")
+        compound = compound or {"tag": None, "attrs": []}
+        if match.group("tag"):
+            compound["tag"] = match.group("tag")
+        elif match.group("id"):
+            compound["attrs"].append(("id", "=", match.group("id")))
+        elif match.group("cls"):
+            compound["attrs"].append(("class", "~=", match.group("cls")))
+        else:
+            value = next((v for v in match.group("dq", "sq", "bare") if v is not None), None)
+            compound["attrs"].append((match.group("attr").lower(), match.group("op"), value))
+        pos = match.end()
+    if compound is None:
+        raise ValueError(f"Unsupported selector: {selector!r}")
+    parts.append((combinator, compound))
+    return parts
@@ -0,0 +1,237 @@
+# edit planner: simple chat edits (colours, text, hiding, font sizes) applied locally instead of an LLM round trip
+
+import logging
+import os
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+EDIT_FAST_PATH = os.getenv("EDIT_FAST_PATH", "1") == "1"
+# Starting guess for an LLM edit's latency, replaced by a moving average of observed ones
+LLM_LATENCY_ESTIMATE_S = float(os.getenv("EDIT_LLM_LATENCY_ESTIMATE_S", "20"))
+EDIT_STYLE_ATTR = "data-clone-edit"
+
+BUTTONS = "button, [role=button], input[type=submit], input[type=button]"
+# Never hidden or removed locally: "delete the page" or "hide the text" is not a one-rule edit
+DOCUMENT_ELEMENTS = ("html", "head", "body")
+# Phrase -> (selector, plural). A singular target must match exactly one element to be edited locally.
+TARGETS: Dict[str, Tuple[str, bool]] = {
+    "page": ("body", False), "body": ("body", False), "website": ("body", False), "site": ("body", False), "text": ("body", False),
+    "heading": ("h1", False), "main heading": ("h1", False), "headline": ("h1", False), "title": ("h1", False),
+    "headings": ("h1, h2, h3, h4, h5, h6", True), "titles": ("h1, h2, h3, h4, h5, h6", True),
+    "subheadings": ("h2, h3", True), "subtitles": ("h2, h3", True),
+    **{f"h{n}": (f"h{n}", True) for n in range(1, 7)},
+    **{f"h{n}s": (f"h{n}", True) for n in range(1, 7)},
+    "paragraphs": ("p", True), "paragraph text": ("p", True),
+    "link": ("a", False), "links": ("a", True),
+    "button": (BUTTONS, False), "buttons": (BUTTONS, True),
+    "nav": ("nav", False), "navbar": ("nav", False), "nav bar": ("nav", False), "navigation": ("nav", False),
+    "navigation bar": ("nav", False), "menu": ("nav", False),
+    "header": ("header", False), "footer": ("footer", False),
+    "image": ("img", False), "images": ("img", True), "picture": ("img", False), "pictures": ("img", True),
+    "photo": ("img", False), "photos": ("img", True),
+}
+COLOR_NAMES = (
+    "black", "white", "red", "green", "blue", "yellow", "orange", "purple", "pink", "brown", "gray", "grey",
+    "navy", "teal", "maroon", "olive", "lime", "aqua", "cyan", "magenta", "fuchsia", "silver", "gold", "indigo",
+    "violet", "coral", "salmon", "crimson", "beige", "ivory", "khaki", "lavender", "turquoise", "tomato",
+    "darkblue", "darkgreen", "darkred", "lightblue", "lightgreen", "lightgray", "lightgrey", "darkgray", "darkgrey",
+    "skyblue", "royalblue", "steelblue", "slategray", "whitesmoke", "transparent",
+)
+
+_target_words = "|".join(re.escape(t).replace(r"\ ", r"\s+") for t in sorted(TARGETS, key=len, reverse=True))
+T = (rf"(?:(?P<all>all|every|each)\s+(?:of\s+)?)?(?:the\s+)?"
+     rf"(?P<target>`[^`{{}}<>;]+`|[.#][A-Za-z_][\w-]*|(?:{_target_words}))(?:\s+(?:section|sections|element|elements|area|bar))?")
+C = (r"(?P<value>#[0-9a-fA-F]{3,8}|rgba?\(\s*[\d.,%\s/]+\)|hsla?\(\s*[\d.,%deg\s/]+\)|"
+     rf"(?:{'|'.join(COLOR_NAMES)}))")
+PROP = r"(?P<prop>background(?:\s+colou?r)?|(?:text\s+|font\s+)?colou?r)"
+Q1 = r"(?:\"(?P<old>[^\"]+)\"|“(?P<old2>[^”]+)”|'(?P<old3>[^']+)')"
+Q2 = r"(?:\"(?P<new>[^\"]*)\"|“(?P<new2>[^”]*)”|'(?P<new3>[^']*)')"
+VERB = r"(?:change|make|set|turn|update)"
+
+PATTERNS: List[Tuple[str, "re.Pattern"]] = [(kind, re.compile(rf"^{pattern}$", re.IGNORECASE)) for kind, pattern in (
+    ("page_title", rf"(?:change|set|update|rename)\s+(?:the\s+)?(?:page|tab|browser|document|site|website)\s+title\s+to\s+{Q2}"),
+    ("heading_text", rf"(?:change|set|update|rename)\s+(?:the\s+)?(?:main\s+)?(?:heading|headline|title)(?:\s+text)?\s+to\s+{Q2}"),
+    ("replace_text", rf"(?:change|replace|update|rename)\s+(?:the\s+)?(?:text\s+|word\s+|words\s+|label\s+)?{Q1}\s+(?:with|to|into|by)\s+{Q2}"),
+    ("color", rf"{VERB}\s+(?:the\s+)?{T}(?:'s|s')?\s+{PROP}\s+(?:to|into)\s+{C}"),
+    ("color", rf"{VERB}\s+(?:the\s+)?{PROP}\s+(?:of|for)\s+{T}\s+(?:to|into)\s+{C}"),
+    ("color", rf"{VERB}\s+(?:the\s+)?{PROP}\s+(?:to|into)\s+{C}"),
+    ("color", rf"(?:make|turn)\s+{T}\s+{C}"),
+    ("font_size", rf"{VERB}\s+(?:the\s+)?(?:{T}(?:'s)?\s+)?font[\s-]?size(?:\s+(?:of|for)\s+{T.replace('?P<all>', '?P<all2>').replace('?P<target>', '?P<target2>')})?"
+                  r"\s+(?:to\s+)?(?P<size>\d+(?:\.\d+)?)\s*(?P<unit>px|rem|em|pt|%)?"),
+    ("font_family", rf"(?:change|set|update)\s+(?:the\s+)?(?:{T}\s+)?font(?:[\s-]family)?\s+to\s+[\"“']?(?P<family>[A-Za-z][\w \-]{{0,40}}?)[\"”']?"),
+    ("hide", rf"(?P<op>hide|remove|delete|get\s+rid\s+of)\s+{T}"),
+)]
+
+edits_total = metrics.counter("edit_planner_total", "Edit instructions by outcome (local, no_pattern, no_target) and pattern kind")
+local_edit_seconds = metrics.histogram("edit_local_seconds", "Time to apply an edit locally", buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5))
+saved_seconds_total = metrics.counter("edit_planner_saved_seconds_total", "Estimated LLM time saved by local edits")
+
+_llm_latency_s = LLM_LATENCY_ESTIMATE_S
+
+
+def record_llm_edit(seconds: float) -> None:
+    """Feed the latency of an LLM edit into the estimate used for saved-time accounting."""
+    global _llm_latency_s
+    _llm_latency_s = 0.8 * _llm_latency_s + 0.2 * seconds
+
+
+def _normalize(instruction: str) -> str:
+    text = re.sub(r"\s+", " ", instruction).strip()
+    text = re.sub(r"^(?:please|can you|could you|kindly)\s+", "", text, flags=re.IGNORECASE)
+    return re.sub(r"(?:,?\s*please)?\s*[.!]*$", "", text, flags=re.IGNORECASE)
+
+
+def _target(match: "re.Match", suffix: str = "") -> Tuple[str, bool]:
+    phrase = match.group("target" + suffix) if "target" + suffix in match.re.groupindex else None
+    if phrase is None:
+        return "body", False
+    if phrase.startswith("`"):
+        return phrase.strip("`").strip(), True
+    if phrase[0] in ".#":
+        return phrase, True
+    selector, plural = TARGETS[re.sub(r"\s+", " ", phrase.lower())]
+    return selector, plural or bool(match.group("all" + suffix))
+
+
+def _quoted(match: "re.Match", name: str) -> Optional[str]:
+    return next((v for v in (match.group(name), match.group(name + "2"), match.group(name + "3")) if v is not None), None)
+
+
+def plan_edit(instruction: str) -> Optional[dict]:
+    """The operation an instruction maps to, or None when it is not in the catalogue. Pure and cheap."""
+    text = _normalize(instruction)
+    for kind, pattern in PATTERNS:
+        match = pattern.match(text)
+        if not match:
+            continue
+        if kind in ("page_title", "heading_text"):
+            return {"kind": kind, "value": _quoted(match, "new")}
+        if kind == "replace_text":
+            return {"kind": kind, "old": _quoted(match, "old"), "new": _quoted(match, "new")}
+        if kind == "hide":
+            selector, plural = _target(match)
+            if selector.strip().lower() in DOCUMENT_ELEMENTS:
+                return None
+            op = "hide" if match.group("op").lower() == "hide" else "remove"
+            return {"kind": op, "selector": selector, "plural": plural}
+        if kind == "color":
+            selector, plural = _target(match)
+            prop = "background-color" if (match.groupdict().get("prop") or "").lower().startswith("background") else "color"
+            return {"kind": "css", "selector": selector, "plural": plural, "property": prop, "value": match.group("value")}
+        if kind == "font_size":
+            selector, plural = _target(match, "2") if match.group("target2") else _target(match)
+            value = match.group("size") + (match.group("unit") or "px")
+            return {"kind": "css", "selector": selector, "plural": plural, "property": "font-size", "value": value}
+        if kind == "font_family":
+            selector, plural = _target(match)
+            return {"kind": "css", "selector": selector, "plural": plural, "property": "font-family", "value": f"\"{match.group('family').strip()}\""}
+    return None
+
+
+def _matches(soup: "BeautifulSoup", selector: str, plural: bool) -> Optional[list]:
+    try:
+        elements = soup.select(selector)
+    except Exception:
+        return None  # not a selector soupsieve understands
+    if not elements or (not plural and len(elements) != 1):
+        return None
+    return elements
+
+
+def _insert_css(html: str, rule: str) -> str:
+    """Add a rule to the document's edit stylesheet, creating it at the end of <head> on first use."""
+    existing = re.search(rf"<style[^>]*\b{EDIT_STYLE_ATTR}\b[^>]*>(.*?)</style\s*>", html, re.IGNORECASE | re.DOTALL)
+    if existing:
+        return html[:existing.end(1)] + rule + "\n" + html[existing.end(1):]
+    block = f"<style {EDIT_STYLE_ATTR}>\n{rule}\n</style>"
+    anchor = re.search(r"</head\s*>", html, re.IGNORECASE)
+    if anchor:
+        return html[:anchor.start()] + block + html[anchor.start():]
+    anchor = re.search(r"<body[^>]*>", html, re.IGNORECASE)
+    if anchor:
+        return html[:anchor.end()] + block + html[anchor.end():]
+    return block + html
+
+
+def _replace_text(soup: "BeautifulSoup", old: str, new: str) -> int:
+    from bs4 import Comment
+
+    count = 0
+    for node in soup.find_all(string=lambda s: old in s):
+        if isinstance(node, Comment) or node.parent.name in ("script", "style"):
+            continue
+        node.replace_with(node.replace(old, new))
+        count += 1
+    for tag in soup.find_all(lambda t: any(old in (t.get(a) or "") for a in ("value", "placeholder", "alt", "title", "aria-label"))):
+        for attr in ("value", "placeholder", "alt", "title", "aria-label"):
+            if isinstance(tag.get(attr), str) and old in tag[attr]:
+                tag[attr] = tag[attr].replace(old, new)
+                count += 1
+    return count
+
+
+def apply_plan(html: str, plan: dict) -> Optional[str]:
+    """The edited document, or None when the plan does not apply cleanly to this document."""
+    from bs4 import BeautifulSoup  # deferred: not needed to start the API
+
+    soup = BeautifulSoup(html, "html.parser")
+    kind = plan["kind"]
+    if kind in ("css", "hide"):
+        elements = _matches(soup, plan["selector"], plan["plural"])
+        if elements is None or (kind == "hide" and any(e.name in DOCUMENT_ELEMENTS for e in elements)):
+            return None
+        prop, value = ("display", "none") if kind == "hide" else (plan["property"], plan["value"])
+        # Added as a rule rather than per-element styles: a one-line diff, and it covers later-added matches
+        return _insert_css(html, f"{plan['selector']} {{ {prop}: {value} !important; }}")
+    if kind == "remove":
+        elements = _matches(soup, plan["selector"], plan["plural"])
+        if elements is None or any(e.name in DOCUMENT_ELEMENTS for e in elements):
+            return None
+        for element in elements:
+            element.decompose()
+    elif kind == "replace_text":
+        if _replace_text(soup, plan["old"], plan["new"]) == 0:
+            return None
+    elif kind == "page_title":
+        if soup.title is None:
+            if soup.head is None:
+                return None
+            soup.head.append(soup.new_tag("title"))
+        soup.title.string = plan["value"]
+    elif kind == "heading_text":
+        headings = _matches(soup, "h1", False)
+        if headings is None or headings[0].find(True) is not None:
+            return None  # no single plain-text h1
+        headings[0].string = plan["value"]
+    else:
+        return None
+    return str(soup)
+
+
+def try_local_edit(html: str, instruction: str) -> Optional[Dict[str, object]]:
+    """
+    Apply `instruction` without the LLM when it is in the catalogue and unambiguous for this
+    document: {"html", "plan", "elapsed_ms"}. None means the caller should use the LLM.
+    """
+    started = time.perf_counter()
+    plan = plan_edit(instruction)
+    if plan is None:
+        edits_total.inc(outcome="no_pattern")
+        logger.info(f"🧭 No local edit pattern for: {instruction[:120]!r}")
+        return None
+    edited = apply_plan(html, plan)
+    if edited is None:
+        edits_total.inc(outcome="no_target", kind=plan["kind"])
+        logger.info(f"🧭 Local {plan['kind']} edit does not apply cleanly, using the LLM: {instruction[:120]!r}")
+        return None
+    elapsed = time.perf_counter() - started
+    edits_total.inc(outcome="local", kind=plan["kind"])
+    local_edit_seconds.observe(elapsed)
+    saved_seconds_total.inc(max(0.0, _llm_latency_s - elapsed))
+    logger.info(f"🧭 Applied {plan['kind']} edit locally in {elapsed * 1000:.1f}ms")
+    return {"html": edited, "plan": plan, "elapsed_ms": round(elapsed * 1000, 2)}
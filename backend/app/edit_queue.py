@@ -0,0 +1,175 @@
+# per-document edit queue: edits to one document run one at a time, and instructions that pile up meanwhile share one call
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Instructions folded into one call at most; 1 still serializes edits per document but never combines them
+BATCH_MAX = int(os.getenv("EDIT_BATCH_MAX", "8"))
+# Documents with no edits for this long are forgotten
+DOCUMENT_TTL_S = float(os.getenv("EDIT_DOCUMENT_TTL_S", "3600"))
+# Earlier versions remembered per document, so an edit sent with its document_id against a stale copy applies to the latest
+LINEAGE_SIZE = 32
+
+batch_size = metrics.histogram("edit_batch_size", "Instructions applied per edit call", buckets=(1, 2, 3, 4, 6, 8, 16))
+coalesced_total = metrics.counter("edit_coalesced_instructions_total", "Instructions that shared an edit call with an earlier one")
+rebased_total = metrics.counter("edit_rebased_total", "Edits sent against an older version and applied to the latest")
+queue_wait_seconds = metrics.histogram("edit_queue_wait_seconds", "Time an edit waited behind earlier edits of the same document",
+                                       buckets=(0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 120))
+
+# (base html, instructions in order) -> {"html": ..., **anything the caller wants back}
+ApplyEdits = Callable[[str, List[str]], Awaitable[dict]]
+
+
+def html_digest(html: str) -> str:
+    return hashlib.sha256(html.encode("utf-8")).hexdigest()
+
+
+def combine_instructions(instructions: List[str]) -> str:
+    """One instruction for a batch; a single instruction is passed through unchanged."""
+    if len(instructions) == 1:
+        return instructions[0]
+    steps = "\n".join(f"{i}. {text.strip()}" for i, text in enumerate(instructions, 1))
+    return f"Apply all of the following changes, in this order (later ones win where they conflict):\n{steps}"
+
+
+class PendingEdit:
+    def __init__(self, base_digest: str, base_html: str, instruction: str):
+        self.base_digest = base_digest
+        self.base_html = base_html
+        self.instruction = instruction
+        self.queued_at = time.monotonic()
+        self.future: "asyncio.Future[dict]" = asyncio.get_running_loop().create_future()
+
+
+class Document:
+    def __init__(self, document_id: Optional[str]):
+        self.document_id = document_id
+        self.html: Optional[str] = None
+        self.version = 0
+        self.lineage: Deque[str] = deque(maxlen=LINEAGE_SIZE)
+        self.pending: List[PendingEdit] = []
+        self.worker: Optional["asyncio.Task[None]"] = None
+        self.touched = time.monotonic()
+
+    def reset(self, html: str, digest: str) -> None:
+        """The client sent a document this queue has not produced: it becomes the new base."""
+        self.html = html
+        self.lineage.clear()
+        self.lineage.append(digest)
+
+
+class EditQueue:
+    """
+    Edits are keyed by the client's document_id; only edits sharing one are queued and coalesced.
+    An edit without one runs on its own and is not kept (identical HTML from two clients is not
+    evidence they are editing the same thing). While one
+    call for a document is in flight, later edits wait; when it finishes they are applied
+    together, in arrival order, to the version it produced. Every caller in a batch gets the
+    same resulting html and version number.
+    """
+
+    def __init__(self, batch_max: int = BATCH_MAX, ttl_s: float = DOCUMENT_TTL_S):
+        self.batch_max = max(1, batch_max)
+        self.ttl_s = ttl_s
+        self._documents: Dict[str, Document] = {}
+
+    def _document_for(self, document_id: Optional[str]) -> Document:
+        if document_id is None:
+            # Nothing can ever join it, so it is dropped with its batch rather than held until the TTL
+            return Document(None)
+        document = self._documents.get(document_id)
+        if document is None:
+            document = self._documents[document_id] = Document(document_id)
+        document.touched = time.monotonic()
+        return document
+
+    async def submit(self, html: str, instruction: str, apply: ApplyEdits, document_id: Optional[str] = None) -> dict:
+        """
+        Queue an edit and wait for the batch it lands in. Returns apply's result plus document_id
+        (None without one), version, instructions (the whole batch) and rebased (whether html was
+        older than the document's latest version). A failed batch raises its error to every caller in it.
+        """
+        self._evict_idle()
+        digest = html_digest(html)
+        document = self._document_for(document_id)
+        edit = PendingEdit(digest, html, instruction)
+        document.pending.append(edit)
+        if document.worker is None or document.worker.done():
+            document.worker = asyncio.create_task(self._drain(document, apply))
+        # Shielded: a caller that goes away does not cancel the edit for the rest of its batch
+        return await asyncio.shield(edit.future)
+
+    def _next_batch(self, document: Document) -> List[PendingEdit]:
+        first = document.pending[0]
+        if document.html is None or first.base_digest not in document.lineage:
+            document.reset(first.base_html, first.base_digest)
+        batch = []
+        # Only edits based on this document's lineage join; one carrying other HTML starts the next batch
+        while document.pending and len(batch) < self.batch_max and document.pending[0].base_digest in document.lineage:
+            batch.append(document.pending.pop(0))
+        return batch
+
+    async def _drain(self, document: Document, apply: ApplyEdits) -> None:
+        while document.pending:
+            batch = self._next_batch(document)
+            current = document.lineage[-1]
+            started = time.monotonic()
+            for edit in batch:
+                queue_wait_seconds.observe(started - edit.queued_at)
+            batch_size.observe(len(batch))
+            coalesced_total.inc(len(batch) - 1)
+            instructions = [edit.instruction for edit in batch]
+            if len(batch) > 1:
+                logger.info(f"🧵 Coalescing {len(batch)} edits of document {document.document_id[:12]}")
+            try:
+                result = await apply(document.html, instructions)
+            except Exception as e:
+                for edit in batch:
+                    if not edit.future.done():
+                        edit.future.set_exception(e)
+                continue
+
+            document.html = result["html"]
+            document.version += 1
+            document.lineage.append(html_digest(document.html))
+            for edit in batch:
+                rebased = edit.base_digest != current
+                if rebased:
+                    rebased_total.inc()
+                if not edit.future.done():
+                    edit.future.set_result({**result, "document_id": document.document_id, "version": document.version,
+                                            "instructions": instructions, "rebased": rebased})
+
+    def _evict_idle(self) -> None:
+        now = time.monotonic()
+        for key, document in list(self._documents.items()):
+            idle = document.worker is None or document.worker.done()
+            if idle and not document.pending and now - document.touched > self.ttl_s:
+                del self._documents[key]
+
+    def status(self) -> dict:
+        return {
+            "documents": len(self._documents),
+            "pending": sum(len(d.pending) for d in self._documents.values()),
+            "active": sum(1 for d in self._documents.values() if d.worker is not None and not d.worker.done()),
+            "batch_max": self.batch_max,
+        }
+
+
+_queue: Optional[EditQueue] = None
+
+
+def get_edit_queue() -> EditQueue:
+    global _queue
+    if _queue is None:
+        _queue = EditQueue()
+    return _queue
@@ -0,0 +1,114 @@
+# HAR record/replay for scrapes: record every response of a live scrape, replay it offline with original or no timing
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import re
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Deque, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+HAR_DIR = Path(os.getenv("SCRAPE_HAR_DIR", str(Path(__file__).resolve().parent / "har")))
+# off | record | replay
+HAR_MODE = os.getenv("SCRAPE_HAR_MODE", "off")
+# original: each response waits as long as it took when recorded; fast: served immediately
+HAR_TIMING = os.getenv("SCRAPE_HAR_TIMING", "original")
+# Settle after navigation in a fast replay: the network is already idle, only the page's own timers are left to run
+FAST_REPLAY_SETTLE_MS = int(os.getenv("SCRAPE_HAR_FAST_SETTLE_MS", "500"))
+
+# Bodies in the archive are decoded, so encoding/length headers from the wire no longer apply
+DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive"}
+
+
+def har_path_for(url: str, directory: Path = HAR_DIR) -> Path:
+    """Stable archive path per URL, e.g. har/www.apple.com_3f2a9c1b04.har"""
+    host = re.sub(r"[^\w.-]", "_", urlsplit(url).hostname or "page")
+    return Path(directory) / f"{host}_{hashlib.sha1(url.encode('utf-8')).hexdigest()[:10]}.har"
+
+
+def record_options(path: Path) -> dict:
+    """browser.new_context() kwargs that make Playwright write a self-contained HAR when the context closes."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    return {"record_har_path": str(path), "record_har_content": "embed", "record_har_mode": "full"}
+
+
+class HarReplayer:
+    """
+    Serves a page entirely from a recorded HAR. Requests are matched on method and URL; a URL
+    fetched several times during recording is replayed in the same order, and the last recorded
+    response is reused once they run out. Anything not in the archive is aborted, so a replay
+    never touches the network.
+    """
+
+    def __init__(self, path: Path, timing: str = HAR_TIMING):
+        self.path = Path(path)
+        self.timing = timing
+        with open(self.path, encoding="utf-8") as f:
+            entries = json.load(f)["log"]["entries"]
+        self._entries: Dict[Tuple[str, str], Deque[dict]] = defaultdict(deque)
+        for entry in entries:
+            self._entries[(entry["request"]["method"], entry["request"]["url"])].append(entry)
+        self.served = 0
+        self.missing = 0
+        self.delayed_ms = 0.0
+        logger.info(f"📼 Replaying {len(entries)} recorded responses from {self.path.name} ({timing} timing)")
+
+    def _next_entry(self, method: str, url: str) -> Optional[dict]:
+        queue = self._entries.get((method, url))
+        if not queue:
+            return None
+        return queue.popleft() if len(queue) > 1 else queue[0]
+
+    @staticmethod
+    def _response(entry: dict) -> Tuple[int, Dict[str, str], bytes]:
+        response = entry["response"]
+        headers = {h["name"]: h["value"] for h in response.get("headers", []) if h["name"].lower() not in DROP_HEADERS and not h["name"].startswith(":")}
+        content = response.get("content", {})
+        text = content.get("text") or ""
+        body = base64.b64decode(text) if content.get("encoding") == "base64" else text.encode("utf-8")
+        return response["status"], headers, body
+
+    def _plan(self, request) -> Tuple[Optional[Tuple[int, Dict[str, str], bytes]], float]:
+        entry = self._next_entry(request.method, request.url)
+        if entry is None or entry["response"].get("status", 0) <= 0:
+            self.missing += 1
+            return None, 0.0
+        self.served += 1
+        delay = max(0.0, entry.get("time", 0.0)) if self.timing == "original" else 0.0
+        self.delayed_ms += delay
+        return self._response(entry), delay
+
+    def sync_handler(self, page):
+        def route_handler(route, request):
+            response, delay = self._plan(request)
+            if response is None:
+                route.abort()
+                return
+            if delay:
+                # page.wait_for_timeout yields to Playwright's dispatcher, so other requests keep flowing
+                page.wait_for_timeout(delay)
+            status, headers, body = response
+            route.fulfill(status=status, headers=headers, body=body)
+        return route_handler
+
+    def async_handler(self):
+        import asyncio
+
+        async def route_handler(route, request):
+            response, delay = self._plan(request)
+            if response is None:
+                await route.abort()
+                return
+            if delay:
+                await asyncio.sleep(delay / 1000)
+            status, headers, body = response
+            await route.fulfill(status=status, headers=headers, body=body)
+        return route_handler
+
+    def summary(self) -> dict:
+        return {"served": self.served, "missing": self.missing, "delayed_ms": round(self.delayed_ms, 1), "timing": self.timing}
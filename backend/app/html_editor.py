@@ -4,16 +4,13 @@ import os
 import asyncio
 from typing import Dict
 from dotenv import load_dotenv
-import google.generativeai as genai
 from datetime import datetime
 
+from llm_client import get_genai
+
 load_dotenv()
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
-    raise RuntimeError("Missing Google API Key")
-
-genai.configure(api_key=GOOGLE_API_KEY)
 
 SYSTEM_PROMPT = """
 You are an expert HTML editor. Your task is to modify the provided HTML/CSS based on the user's instructions.
@@ -32,7 +29,10 @@ async def edit_html(instruction: str, current_html: str) -> Dict[str, str]:
     """
     Edit HTML using Gemini 2.5 Pro model
     """
-    model = genai.GenerativeModel("gemini-2.5-pro-preview-05-06")
+    # Checked per call rather than at import, so the app starts without credentials
+    if not GOOGLE_API_KEY:
+        raise RuntimeError("Missing Google API Key")
+    model = get_genai().GenerativeModel("gemini-2.5-pro-preview-05-06")
     
     user_message = f"""
     CURRENT HTML:
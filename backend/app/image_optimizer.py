@@ -0,0 +1,204 @@
+# image optimization for the inliner: downscale to the rendered box, re-encode, minify SVG, placeholder for oversized images
+
+import io
+import logging
+import os
+import re
+from typing import Dict, Optional, Tuple
+
+import metrics
+
+try:
+    from PIL import Image, features  # optional: without Pillow raster images are inlined as fetched
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Pixels per CSS pixel kept when downscaling, so clones stay sharp on high-density screens
+TARGET_DPR = float(os.getenv("IMAGE_TARGET_DPR", "2"))
+QUALITY = int(os.getenv("IMAGE_QUALITY", "75"))
+# Candidate encodings, best first; the smallest result that beats the original wins
+FORMATS = [f.strip() for f in os.getenv("IMAGE_FORMATS", "avif,webp,jpeg").split(",") if f.strip()]
+# An image still larger than this after optimization is replaced by a placeholder of the same shape
+PLACEHOLDER_BYTES = int(os.getenv("IMAGE_PLACEHOLDER_BYTES", str(400 * 1024)))
+
+MIME_TYPES = {"avif": "image/avif", "webp": "image/webp", "jpeg": "image/jpeg", "png": "image/png"}
+
+# Rendered box of every <img>, keyed by the URL the browser chose (currentSrc for srcset). Image requests
+# are aborted while scraping (rules/default_blocklist.txt), so an unloaded <img> has its broken-image or
+# alt-text box; its size is only recorded when attributes or CSS set both dimensions, else it is not downscaled.
+RENDERED_SIZES_JS = """
+() => {
+    const sized = (value) => Boolean(value) && !/auto|content/.test(value);
+    const rules = [];
+    const collect = (list) => {
+        for (const rule of list) {
+            if (rule.cssRules) collect(rule.cssRules);
+            if (rule.selectorText && rule.style && (sized(rule.style.width) || sized(rule.style.height))) rules.push(rule);
+        }
+    };
+    for (const sheet of document.styleSheets) {
+        try { collect(sheet.cssRules); } catch (e) {}  // cross-origin sheets cannot be read
+    }
+    const explicitlySized = (img) => {
+        let width = sized(img.getAttribute('width')) || sized(img.style.width);
+        let height = sized(img.getAttribute('height')) || sized(img.style.height);
+        for (const rule of rules) {
+            if (width && height) break;
+            try {
+                if (!img.matches(rule.selectorText)) continue;
+            } catch (e) { continue; }
+            width = width || sized(rule.style.width);
+            height = height || sized(rule.style.height);
+        }
+        return width && height;
+    };
+    const sizes = {};
+    for (const img of document.images) {
+        const rect = img.getBoundingClientRect();
+        const url = img.currentSrc || img.src;
+        if (!url || url.startsWith('data:') || !rect.width || !rect.height) continue;
+        if (!(img.complete && img.naturalWidth > 0) && !explicitlySized(img)) continue;
+        const [w, h] = sizes[url] || [0, 0];
+        sizes[url] = [Math.max(w, Math.ceil(rect.width)), Math.max(h, Math.ceil(rect.height))];
+    }
+    return sizes;
+}
+"""
+
+image_bytes_in_total = metrics.counter("image_bytes_in_total", "Bytes of images fetched for inlining")
+image_bytes_out_total = metrics.counter("image_bytes_out_total", "Bytes of images after optimization, by action")
+
+SVG_COMMENTS = re.compile(r"<!--.*?-->", re.DOTALL)
+SVG_METADATA = re.compile(r"<(metadata|title|desc|sodipodi:namedview)\b.*?</\1>|<(?:sodipodi|inkscape):[^>]*/>", re.DOTALL | re.IGNORECASE)
+SVG_EDITOR_ATTRS = re.compile(r"\s(?:inkscape|sodipodi):[\w-]+=\"[^\"]*\"|\sxmlns:(?:inkscape|sodipodi|dc|cc|rdf)=\"[^\"]*\"")
+BETWEEN_TAGS = re.compile(r">\s+<")
+WHITESPACE = re.compile(r"\s{2,}")
+
+
+def minify_svg(data: bytes) -> bytes:
+    """Comments, editor metadata and whitespace between tags removed; geometry and styles untouched."""
+    text = data.decode("utf-8", errors="replace")
+    text = re.sub(r"^\s*<\?xml[^>]*\?>", "", text)
+    text = re.sub(r"<!DOCTYPE[^>]*>", "", text, flags=re.IGNORECASE)
+    text = SVG_COMMENTS.sub("", text)
+    text = SVG_METADATA.sub("", text)
+    text = SVG_EDITOR_ATTRS.sub("", text)
+    text = BETWEEN_TAGS.sub("><", text)
+    text = WHITESPACE.sub(" ", text)
+    return text.strip().encode("utf-8")
+
+
+def placeholder_svg(width: int, height: int, color: Tuple[int, int, int] = (204, 204, 204)) -> bytes:
+    """A flat box with the image's aspect ratio and average colour, a few hundred bytes."""
+    fill = "#%02x%02x%02x" % color
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+            f'viewBox="0 0 {width} {height}"><rect width="100%" height="100%" fill="{fill}"/></svg>').encode("utf-8")
+
+
+def _supported(fmt: str) -> bool:
+    if fmt == "avif":
+        return bool(features.check("avif")) if hasattr(features, "check") else False
+    if fmt == "webp":
+        return bool(features.check("webp"))
+    return fmt in ("jpeg", "png")
+
+
+def _encode(img, fmt: str, quality: int) -> bytes:
+    out = io.BytesIO()
+    if fmt == "jpeg":
+        img.convert("RGB").save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+    elif fmt == "png":
+        img.save(out, "PNG", optimize=True)
+    elif fmt == "webp":
+        img.save(out, "WEBP", quality=quality, method=4)
+    else:
+        img.save(out, fmt.upper(), quality=quality)
+    return out.getvalue()
+
+
+def _average_color(img) -> Tuple[int, int, int]:
+    pixel = img.convert("RGB").resize((1, 1)).getpixel((0, 0))
+    return tuple(pixel[:3])
+
+
+def optimize_image(data: bytes, content_type: str, rendered: Optional[Tuple[int, int]] = None,
+                   quality: int = QUALITY, formats=None, placeholder_bytes: int = PLACEHOLDER_BYTES,
+                   target_dpr: float = TARGET_DPR) -> Tuple[str, bytes, Dict]:
+    """
+    Returns (mime type, bytes, report). Rasters are downscaled to `rendered` (CSS pixels) times
+    `target_dpr` and re-encoded with every available candidate format; the smallest result is
+    kept only if it beats the original. Animated images are left alone, SVGs are minified.
+    """
+    formats = formats or FORMATS
+    mime = content_type.split(";")[0].strip().lower() or "application/octet-stream"
+    report = {"original_bytes": len(data), "original_type": mime, "action": "unchanged"}
+    image_bytes_in_total.inc(len(data))
+
+    if mime == "image/svg+xml" or data.lstrip()[:5] in (b"<svg ", b"<?xml"):
+        minified = minify_svg(data)
+        if len(minified) < len(data):
+            mime, data, report["action"] = "image/svg+xml", minified, "minified"
+    elif Image is None:
+        report["action"] = "unchanged"
+        report["reason"] = "pillow_missing"
+    else:
+        data, mime = _optimize_raster(data, mime, rendered, quality, formats, target_dpr, report)
+
+    if len(data) > placeholder_bytes:
+        size = rendered or report.get("size") or report.get("original_size") or (16, 9)
+        data, mime = placeholder_svg(*size, report.pop("average_color", (204, 204, 204))), "image/svg+xml"
+        report["action"] = "placeholder"
+    report.pop("average_color", None)
+
+    report.update(bytes=len(data), type=mime, saved_bytes=report["original_bytes"] - len(data))
+    image_bytes_out_total.inc(len(data), action=report["action"])
+    return mime, data, report
+
+
+def _optimize_raster(data: bytes, mime: str, rendered, quality: int, formats, target_dpr: float, report: Dict):
+    try:
+        img = Image.open(io.BytesIO(data))
+        img.load()
+    except Exception as e:
+        report["reason"] = f"undecodable: {type(e).__name__}"
+        return data, mime
+    report["original_size"] = img.size
+    if getattr(img, "n_frames", 1) > 1:
+        report["reason"] = "animated"
+        return data, mime
+
+    if img.mode not in ("RGB", "RGBA", "L", "LA"):
+        img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("P", "PA") else "RGB")
+    has_alpha = img.mode in ("RGBA", "LA") and img.getextrema()[-1][0] < 255
+    report["average_color"] = _average_color(img)
+
+    if rendered:
+        target = (max(1, round(rendered[0] * target_dpr)), max(1, round(rendered[1] * target_dpr)))
+        if target[0] < img.width and target[1] < img.height:
+            img = img.copy()
+            img.thumbnail(target, Image.LANCZOS)
+    report["size"] = img.size
+
+    best: Optional[Tuple[str, bytes]] = None
+    for fmt in formats:
+        if (fmt == "jpeg" and has_alpha) or not _supported(fmt):
+            continue
+        try:
+            encoded = _encode(img, fmt, quality)
+        except Exception as e:
+            logger.debug(f"🖼️ {fmt} encoding failed: {e}")
+            continue
+        if best is None or len(encoded) < len(best[1]):
+            best = (fmt, encoded)
+    if has_alpha and (best is None or "png" in formats):
+        encoded = _encode(img, "png", quality)
+        if best is None or len(encoded) < len(best[1]):
+            best = ("png", encoded)
+
+    if best is None or len(best[1]) >= len(data):
+        report["reason"] = "already_optimal"
+        return data, mime
+    report["action"] = "transcoded"
+    return best[1], MIME_TYPES[best[0]]
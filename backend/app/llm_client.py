@@ -2,13 +2,15 @@
 
 import os, re
 import asyncio
-from typing import Dict, Any, Literal
+import threading
+from typing import Dict, Any, List, Literal, Optional, Tuple, Union
 from dotenv import load_dotenv
 import json
-from groq import Groq
 import logging
-import google.generativeai as genai
-from bs4 import BeautifulSoup
+from tracing import span
+from llm_resilience import get_resilient_caller
+from output_validation import OffFormatOutput, StreamValidator, continuation_point, continuation_request, continuations_total, extract_html, join_continuation
+from placeholders import PlaceholderTable
 
 load_dotenv() 
 
@@ -16,30 +18,83 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize clients
-genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
-groq_client = Groq(api_key=os.getenv('GROQ_API_KEY'))
+TEMPLATE_EXTRACTION = os.getenv("TEMPLATE_EXTRACTION", "1") == "1"
+PLACEHOLDER_SUBSTITUTION = os.getenv("PLACEHOLDER_SUBSTITUTION", "1") == "1"
+# Off-format answers are re-requested this many times; cut-off documents get up to this many continuations
+FORMAT_RETRIES = int(os.getenv("LLM_FORMAT_RETRIES", "1"))
+MAX_CONTINUATIONS = int(os.getenv("LLM_MAX_CONTINUATIONS", "2"))
+
+# Provider SDKs are imported and their clients built on first use: importing this module stays
+# cheap, and a missing key only fails the calls that need it
+_client_lock = threading.Lock()
+_genai = None
+_groq_client = None
+
+def get_genai():
+    """google.generativeai, configured with GOOGLE_API_KEY."""
+    global _genai
+    if _genai is None:
+        with _client_lock:
+            if _genai is None:
+                with span("llm.client.init", provider="google"):
+                    import google.generativeai as genai
+                    genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
+                _genai = genai
+    return _genai
+
+def get_groq_client():
+    """Shared AsyncGroq client (one HTTP connection pool for all Groq calls)."""
+    global _groq_client
+    if _groq_client is None:
+        with _client_lock:
+            if _groq_client is None:
+                with span("llm.client.init", provider="groq"):
+                    from groq import AsyncGroq
+                    _groq_client = AsyncGroq(api_key=os.getenv('GROQ_API_KEY'))
+    return _groq_client
 
 class LLMProvider:
     GROQ = "groq"
     GOOGLE = "google"
 
+MODEL_MAP = {
+    'llama-3.3-70b-versatile': (LLMProvider.GROQ, 'llama-3.3-70b-versatile'),
+    'gemini-2.5-pro-preview-05-06': (LLMProvider.GOOGLE, 'gemini-2.5-pro-preview-05-06'),
+    'mixtral-8x7b-32768': (LLMProvider.GROQ, 'mixtral-8x7b-32768')
+}
+
+# Provider quotas used by admission control: concurrent calls and requests per minute.
+# Per-provider defaults, overridable with e.g. GOOGLE_MAX_CONCURRENCY / GROQ_RPM, then per model below.
+PROVIDER_LIMITS = {
+    LLMProvider.GOOGLE: {
+        'concurrency': int(os.getenv('GOOGLE_MAX_CONCURRENCY', '4')),
+        'rpm': int(os.getenv('GOOGLE_RPM', '10')),
+    },
+    LLMProvider.GROQ: {
+        'concurrency': int(os.getenv('GROQ_MAX_CONCURRENCY', '8')),
+        'rpm': int(os.getenv('GROQ_RPM', '30')),
+    },
+}
+MODEL_LIMITS: Dict[str, Dict[str, int]] = {
+    'gemini-2.5-pro-preview-05-06': {'rpm': int(os.getenv('GEMINI_PRO_RPM', '5'))},
+}
+
 def get_model_config(model_id: str) -> tuple[str, str]:
     """
     Returns (provider, model_name) for the given model_id
     """
-    model_map = {
-        'llama-3.3-70b-versatile': (LLMProvider.GROQ, 'llama-3.3-70b-versatile'),
-        'gemini-2.5-pro-preview-05-06': (LLMProvider.GOOGLE, 'gemini-2.5-pro-preview-05-06'),
-        'mixtral-8x7b-32768': (LLMProvider.GROQ, 'mixtral-8x7b-32768')
-    }
-    config = model_map.get(model_id)
+    config = MODEL_MAP.get(model_id)
     if config is None:
-         logger.error(f"Unknown model ID: {model_id}. Valid models are: {list(model_map.keys())}")
+         logger.error(f"Unknown model ID: {model_id}. Valid models are: {list(MODEL_MAP.keys())}")
          raise ValueError(f"Unsupported model ID: {model_id}")
 
     return config
 
+def get_model_limits(model_id: str) -> Dict[str, int]:
+    """Concurrency and requests-per-minute limits for a model: its provider's defaults plus any model override."""
+    provider, _ = get_model_config(model_id)
+    return {**PROVIDER_LIMITS[provider], **MODEL_LIMITS.get(model_id, {})}
+
 def truncate_css(css_text: str, max_chars: int = 15000) -> str:
     """
     Intelligently truncate CSS while preserving important styles
@@ -104,6 +159,7 @@ def extract_essential_meta(head_html: str) -> str:
     """
     Extract only essential meta tags from head to save tokens
     """
+    from bs4 import BeautifulSoup  # deferred: not needed to start the API
     soup = BeautifulSoup(head_html, 'html.parser')
     for a in soup.find_all("a"):
         a['href'] = '#'
@@ -207,6 +263,8 @@ Return ONLY the HTML code block, starting with ```html and ending with ```.
 
 def create_prompt_clone(design_context: dict) -> str:
     """Create a standardized prompt for cloning based on design context."""
+    from template_extraction import REPEAT_ATTR, TEMPLATE_ATTR  # deferred with bs4, which it is built on
+
     head_content = design_context.get('head', '').strip()
     body_content = design_context.get('body', '').strip()
     css_content = design_context.get('css', '').strip()
@@ -218,6 +276,14 @@ CSS:
 {css_content}
     """ if css_content else "No specific CSS provided, use general styling principles for a clean, modern look."
 
+    repeated_templates = design_context.get('repeated_templates', '')
+    repeated_section_prompt = f"""
+REPEATED CONTENT:
+Elements marked {TEMPLATE_ATTR}="tN" are the first of many items sharing that structure. Replicate each exemplar
+faithfully and keep its {TEMPLATE_ATTR} attribute. Keep every empty <div {REPEAT_ATTR}="..."></div> exactly where
+it is; the remaining items are filled in from the rows below after generation. Rows list the values that differ per item.
+{repeated_templates}
+    """ if repeated_templates else ""
 
     return f"""
     You are an expert front-end engineer specializing in HTML/CSS replication.
@@ -233,7 +299,7 @@ CSS:
     {body_content}
 
     {css_section_prompt}
-
+    {repeated_section_prompt}
     CRITICAL REQUIREMENTS:
     - Generate valid HTML5, fully self-contained.
     - Include relevant content from the CONTEXT sections.
@@ -271,51 +337,173 @@ def create_prompt_edit(html_content: str, instruction: str) -> str:
     """Create a prompt for editing HTML."""
     return SYSTEM_PROMPT_EDIT.format(html_content=html_content, instruction=instruction)
 
+def restore_placeholders(text: str, placeholders: PlaceholderTable) -> str:
+    """Swap placeholders in model output back to the original values and log what the model lost."""
+    with span("llm.placeholder_restore") as restore_span:
+        restored, report = placeholders.restore(text)
+        for key, value in report.items():
+            restore_span.set_attribute(key, value)
+    if report["missing"]:
+        logger.info(f"🔖 {report['missing']} of {report['substituted']} placeholders were not echoed back by the model")
+    return restored
+
 async def generate_clone_html(design_context: dict, model_id: str) -> str:
     """
     Generate cloned HTML using the specified LLM (Groq or Google).
     """
+    from template_extraction import expand_repeated_templates, extract_repeated_templates, render_data_tables
+
     provider, model_name = get_model_config(model_id)
     logger.info(f"Using {provider} provider with model {model_name}")
 
     try:
-        if provider == LLMProvider.GOOGLE:
-            return await generate_with_google(model_name, create_prompt_clone(design_context))
-        elif provider == LLMProvider.GROQ:
-            return await generate_with_groq(model_name, create_prompt_clone(design_context))
+        plan = None
+        if TEMPLATE_EXTRACTION and design_context.get('body'):
+            with span("html.template_extract", body_chars=len(design_context['body'])) as extract_span:
+                compact_body, plan = extract_repeated_templates(design_context['body'])
+                if plan:
+                    design_context = {**design_context, 'body': compact_body, 'repeated_templates': render_data_tables(plan)}
+                    extract_span.set_attribute("templates", len(plan["templates"]))
+                    extract_span.set_attribute("compact_chars", len(compact_body))
+
+        placeholders = PlaceholderTable() if PLACEHOLDER_SUBSTITUTION else None
+        with span("llm.prompt_build") as prompt_span:
+            if placeholders:
+                design_context = {
+                    **design_context,
+                    **{key: placeholders.substitute(design_context.get(key, '')) for key in ('head', 'body', 'css')},
+                }
+                prompt_span.set_attribute("placeholders", len(placeholders.values))
+                prompt_span.set_attribute("placeholder_saved_chars", placeholders.saved_chars)
+            prompt = create_prompt_clone(design_context)
+            prompt_span.set_attribute("prompt_chars", len(prompt))
+
+        generated = await call_model(model_id, prompt)
+
+        if placeholders:
+            generated = restore_placeholders(generated, placeholders)
+        if plan:
+            with span("html.template_expand", templates=len(plan["templates"])):
+                generated = expand_repeated_templates(generated, plan)
+        return generated
     except Exception as e:
         logger.error(f"Error generating HTML with {provider}: {str(e)}")
         raise
 
-async def generate_with_google(model_name: str, prompt: str) -> str:
-    """Generate HTML using Google's Gemini model"""
-    try:
-        model = genai.GenerativeModel(model_name)
-        response = model.generate_content(prompt)
+async def call_model(model_id: str, prompt: str, providers: Optional[Tuple[str, ...]] = None) -> str:
+    """
+    Send a prompt to a model through the retry/circuit-breaker layer and return the HTML document
+    from its answer; a configured fallback model may answer instead when the requested one is unavailable.
+    `providers` limits which fallbacks may be used.
+    """
+    async def attempt(candidate_id: str) -> str:
+        provider, model_name = get_model_config(candidate_id)
+        generate = generate_with_google if provider == LLMProvider.GOOGLE else generate_with_groq
+        return await generate_document(generate, model_name, prompt)
+
+    def accept(candidate_id: str) -> bool:
+        return providers is None or MODEL_MAP.get(candidate_id, (None,))[0] in providers
 
-        return response.text
+    return await get_resilient_caller().call(model_id, attempt, accept)
+
+async def generate_document(generate, model_name: str, prompt: str) -> str:
+    """
+    Stream one HTML document from a model. An off-format answer is dropped as soon as it is
+    recognised and asked for again; a document cut off by the output limit is resumed from its
+    last complete tag with a continuation request instead of being regenerated.
+    """
+    for attempt_number in range(FORMAT_RETRIES + 1):
+        validator = StreamValidator()
+        try:
+            text = await generate(model_name, [("user", prompt)], validator)
+            break
+        except OffFormatOutput as e:
+            logger.warning(f"🧹 {model_name} answered off-format ({e.reason}), attempt {attempt_number + 1}/{FORMAT_RETRIES + 1}")
+            if attempt_number == FORMAT_RETRIES:
+                raise
+    html = extract_html(text)
+
+    continuations = 0
+    while validator.truncated and continuations < MAX_CONTINUATIONS:
+        prefix, open_elements = continuation_point(html)
+        logger.info(f"✂️ {model_name} output stopped mid-document at {len(prefix)} chars (finish reason {validator.finish_reason}); requesting a continuation")
+        messages = [("user", prompt), ("assistant", prefix), ("user", continuation_request(prefix, open_elements))]
+        validator = StreamValidator(continuation=True)
+        with span("llm.continuation", model=model_name, prefix_chars=len(prefix), open_elements=len(open_elements)):
+            try:
+                more = await generate(model_name, messages, validator)
+            except OffFormatOutput:
+                continuations_total.inc(outcome="off_format")
+                break
+        html = join_continuation(prefix, extract_html(more, continuation=True))
+        continuations += 1
+        continuations_total.inc(outcome="complete" if validator.complete else "truncated")
+    return html
+
+def _as_messages(prompt: Union[str, List[Tuple[str, str]]]) -> List[Tuple[str, str]]:
+    return [("user", prompt)] if isinstance(prompt, str) else prompt
+
+def _gemini_chunk_text(chunk) -> str:
+    try:
+        return chunk.text
+    except ValueError:
+        # Chunks without text parts (safety ratings, the final finish reason) raise instead of returning ""
+        return ""
+
+async def generate_with_google(model_name: str, prompt: Union[str, List[Tuple[str, str]]], validator: Optional[StreamValidator] = None) -> str:
+    """Generate HTML using Google's Gemini model, streaming the answer through `validator`"""
+    messages = _as_messages(prompt)
+    validator = validator or StreamValidator()
+    try:
+        with span("llm.google", model=model_name, prompt_chars=sum(len(text) for _, text in messages)) as llm_span:
+            model = get_genai().GenerativeModel(model_name)
+            contents = [{"role": "model" if role == "assistant" else "user", "parts": [text]} for role, text in messages]
+            response = await model.generate_content_async(contents, stream=True)
+            async for chunk in response:
+                if chunk.candidates and chunk.candidates[0].finish_reason:
+                    reason = chunk.candidates[0].finish_reason
+                    validator.finish_reason = getattr(reason, "name", str(reason))
+                if not validator.feed(_gemini_chunk_text(chunk)):
+                    llm_span.set_attribute("stopped_early", True)
+                    break
+            validator.finish()
+            llm_span.set_attribute("output_chars", len(validator.text))
+            llm_span.set_attribute("finish_reason", validator.finish_reason)
+
+        return validator.text
     except Exception as e:
         logger.error(f"Google AI generation error: {str(e)}")
         raise
 
-async def generate_with_groq(model_name: str, prompt: str) -> str:
-    """Generate HTML using Groq's models"""
+async def generate_with_groq(model_name: str, prompt: Union[str, List[Tuple[str, str]]], validator: Optional[StreamValidator] = None) -> str:
+    """Generate HTML using Groq's models, streaming the answer through `validator`"""
+    messages = _as_messages(prompt)
+    validator = validator or StreamValidator()
     try:
-        response = await groq_client.chat.completions.create(
-            model=model_name,
-            messages=[
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-        )
-        content = response.choices[0].message.content
-        html_match = re.search(r'```html\n(.*?)\n```', content, re.DOTALL)
-        if html_match:
-            return html_match.group(1).strip()
-        else:
-            logger.warning(f"Groq response for model {model_name} did not contain an HTML code block. Returning full response. Content snippet: {content[:200]}...")
-            return content.strip()
-
+        with span("llm.groq", model=model_name, prompt_chars=sum(len(text) for _, text in messages)) as llm_span:
+            stream = await get_groq_client().chat.completions.create(
+                model=model_name,
+                messages=[{"role": role, "content": text} for role, text in messages],
+                temperature=0.7,
+                stream=True,
+            )
+            try:
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    choice = chunk.choices[0]
+                    if choice.finish_reason:
+                        validator.finish_reason = choice.finish_reason
+                    if not validator.feed(choice.delta.content or ""):
+                        llm_span.set_attribute("stopped_early", True)
+                        break
+            finally:
+                await stream.close()
+            validator.finish()
+            llm_span.set_attribute("output_chars", len(validator.text))
+            llm_span.set_attribute("finish_reason", validator.finish_reason)
+
+        return validator.text
     except Exception as e:
         logger.error(f"Groq generation error: {str(e)}")
         raise
@@ -332,15 +520,19 @@ async def edit_html_with_gemini(html_content: str, instruction: str, model_id: s
     logger.info(f"Editing HTML using Gemini model: {model_name}")
 
     try:
-        prompt = create_prompt_edit(html_content, instruction)
-        edited_html = await generate_with_google(model_name, prompt)
-
-        html_match = re.search(r'```html\n(.*?)\n```', edited_html, re.DOTALL)
-        if html_match:
-            return html_match.group(1).strip()
-        else:
-            logger.warning("Gemini response for editing did not contain an HTML code block. Returning full response.")
-            return edited_html.strip()
+        placeholders = PlaceholderTable() if PLACEHOLDER_SUBSTITUTION else None
+        with span("llm.prompt_build", prompt_kind="edit") as prompt_span:
+            if placeholders:
+                html_content = placeholders.substitute(html_content)
+                prompt_span.set_attribute("placeholders", len(placeholders.values))
+                prompt_span.set_attribute("placeholder_saved_chars", placeholders.saved_chars)
+            prompt = create_prompt_edit(html_content, instruction)
+        # Editing is Google only, fallbacks included (LLM_FALLBACK_MODELS may name a Groq model)
+        edited_html = await call_model(model_id, prompt, providers=(LLMProvider.GOOGLE,))
+        if placeholders:
+            edited_html = restore_placeholders(edited_html, placeholders)
+
+        return edited_html.strip()
 
     except Exception as e:
         logger.error(f"Error editing HTML with Gemini model {model_id}: {str(e)}")
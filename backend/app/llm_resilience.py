@@ -0,0 +1,264 @@
+# retries with jittered backoff and per-model circuit breakers (with fallback models) around LLM provider calls
+
+import asyncio
+import logging
+import math
+import os
+import random
+import re
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import metrics
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = int(os.getenv("LLM_RETRY_ATTEMPTS", "3"))
+BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_S", "1"))
+MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_S", "30"))
+# Total time one call may spend waiting between attempts; a provider asking for more is not waited on
+RETRY_BUDGET = float(os.getenv("LLM_RETRY_BUDGET_S", "60"))
+ATTEMPT_TIMEOUT = float(os.getenv("LLM_ATTEMPT_TIMEOUT_S", "300"))
+BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN_S", "60"))
+# "model=fallback[|fallback...],model=..." e.g. gemini-2.5-pro-preview-05-06=llama-3.3-70b-versatile
+FALLBACK_MODELS = os.getenv("LLM_FALLBACK_MODELS", "")
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+# Provider SDK exception names that mean "try again later" even when no status code is attached
+RETRYABLE_ERRORS = {
+    "APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError",
+    "ServiceUnavailable", "ResourceExhausted", "DeadlineExceeded", "TooManyRequests",
+    "BadGateway", "GatewayTimeout", "RemoteProtocolError", "ConnectError", "ReadTimeout",
+}
+RATE_LIMIT_HEADERS = ("retry-after", "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+attempts_total = metrics.counter("llm_attempts_total", "LLM provider attempts, by model and outcome")
+retries_total = metrics.counter("llm_retries_total", "LLM attempts that were retried, by model and reason")
+retry_wait_seconds_total = metrics.counter("llm_retry_wait_seconds_total", "Time spent backing off before retries, by model")
+fallbacks_total = metrics.counter("llm_fallbacks_total", "Calls served by a fallback model, by requested model and fallback")
+breaker_state = metrics.gauge("llm_circuit_state", "Circuit breaker state per model (0 closed, 1 half-open, 2 open)")
+breaker_opened_total = metrics.counter("llm_circuit_opened_total", "Times a model's circuit breaker opened")
+breaker_rejected_total = metrics.counter("llm_circuit_rejected_total", "Calls not sent because the model's breaker was open")
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """Seconds from a Retry-After value ("12") or a Groq reset header ("1m2.5s", "450ms")."""
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    scale = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+
+def classify(error: BaseException) -> Tuple[bool, Optional[int], Optional[float]]:
+    """(retryable, status code, seconds the provider asked us to wait) for a provider exception."""
+    response = getattr(error, "response", None)
+    code = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if code is None and isinstance(getattr(error, "code", None), int):
+        code = int(error.code)
+
+    retry_after = None
+    headers = getattr(response, "headers", None)
+    if headers is not None:
+        waits = [parse_duration(headers[name]) for name in RATE_LIMIT_HEADERS if headers.get(name)]
+        waits = [w for w in waits if w is not None]
+        retry_after = max(waits) if waits else None
+    if retry_after is None:
+        # google.api_core errors carry a RetryInfo detail rather than headers
+        match = re.search(r"retry_delay\s*\{\s*seconds:\s*(\d+)", str(error))
+        if match:
+            retry_after = float(match.group(1))
+
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True, code, retry_after
+    if code is not None:
+        return code in RETRYABLE_STATUS, code, retry_after
+    return type(error).__name__ in RETRYABLE_ERRORS, code, retry_after
+
+
+def parse_fallbacks(spec: str) -> Dict[str, List[str]]:
+    fallbacks = {}
+    for entry in spec.split(","):
+        if "=" in entry:
+            model, chain = entry.split("=", 1)
+            fallbacks[model.strip()] = [m.strip() for m in chain.split("|") if m.strip()]
+    return fallbacks
+
+
+class ProviderUnavailable(Exception):
+    """No candidate model could answer (retries exhausted or circuits open); the API maps it to 503."""
+
+    def __init__(self, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive retryable failures; while open, calls fail fast.
+    After `cooldown` seconds one probe call is let through (half-open): success closes the
+    breaker, failure opens it for another cooldown.
+    """
+
+    def __init__(self, model_id: str, failure_threshold: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.model_id = model_id
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        breaker_state.set(STATE_VALUES[CLOSED], model=model_id)
+
+    def _set_state(self, state: str) -> None:
+        if state != self.state:
+            logger.warning(f"🔌 Circuit for {self.model_id}: {self.state} -> {state}")
+        self.state = state
+        breaker_state.set(STATE_VALUES[state], model=self.model_id)
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.cooldown - time.monotonic()) if self.state == OPEN else 0.0
+
+    def allow(self) -> bool:
+        if self.state == OPEN and self.retry_after() == 0:
+            self._set_state(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+        return self.state == CLOSED
+
+    def release(self) -> None:
+        """End a half-open probe that finished without a verdict (client error, cancellation)."""
+        self._probing = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._probing = False
+        self._set_state(CLOSED)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                breaker_opened_total.inc(model=self.model_id)
+            self.opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+    def status(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.failures, "retry_after_s": round(self.retry_after(), 1)}
+
+
+class ResilientCaller:
+    """
+    Runs `attempt(model_id)` with retries and per-model circuit breakers. Retryable failures
+    (timeouts, connection errors, 429/5xx) back off exponentially with full jitter, never less
+    than the provider's own Retry-After / rate-limit reset. When a model's breaker is open or its
+    retries are exhausted, the configured fallback models (those `accept` allows) are tried in
+    order; client errors (bad request, auth) are raised straight away.
+    """
+
+    def __init__(self, max_attempts: int = MAX_ATTEMPTS, base_delay: float = BASE_DELAY, max_delay: float = MAX_DELAY,
+                 retry_budget: float = RETRY_BUDGET, attempt_timeout: float = ATTEMPT_TIMEOUT,
+                 failure_threshold: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN,
+                 fallbacks: Optional[Dict[str, List[str]]] = None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_budget = retry_budget
+        self.attempt_timeout = attempt_timeout
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.fallbacks = parse_fallbacks(FALLBACK_MODELS) if fallbacks is None else fallbacks
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def breaker(self, model_id: str) -> CircuitBreaker:
+        if model_id not in self._breakers:
+            self._breakers[model_id] = CircuitBreaker(model_id, self.failure_threshold, self.cooldown)
+        return self._breakers[model_id]
+
+    def backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, retry_after or 0.0)
+
+    async def _with_retries(self, model_id: str, attempt: Callable[[str], Awaitable[str]], breaker: CircuitBreaker) -> str:
+        waited = 0.0
+        for number in range(self.max_attempts):
+            try:
+                result = await asyncio.wait_for(attempt(model_id), timeout=self.attempt_timeout)
+            except Exception as e:
+                retryable, code, retry_after = classify(e)
+                if not retryable:
+                    attempts_total.inc(model=model_id, outcome="client_error")
+                    raise
+                attempts_total.inc(model=model_id, outcome="retryable_error")
+                breaker.record_failure()
+                delay = self.backoff(number, retry_after)
+                if number + 1 >= self.max_attempts or breaker.state == OPEN or waited + delay > self.retry_budget:
+                    raise
+                reason = str(code) if code else type(e).__name__
+                logger.warning(f"🔁 {model_id} attempt {number + 1}/{self.max_attempts} failed ({reason}: {e}); retrying in {delay:.1f}s")
+                retries_total.inc(model=model_id, reason=reason)
+                retry_wait_seconds_total.inc(delay, model=model_id)
+                waited += delay
+                await asyncio.sleep(delay)
+            else:
+                attempts_total.inc(model=model_id, outcome="ok")
+                breaker.record_success()
+                return result
+
+    async def call(self, model_id: str, attempt: Callable[[str], Awaitable[str]],
+                   accept: Optional[Callable[[str], bool]] = None) -> str:
+        candidates = [model_id] + [m for m in self.fallbacks.get(model_id, []) if m != model_id and (accept is None or accept(m))]
+        last_error: Optional[BaseException] = None
+        with span("llm.resilient_call", model=model_id) as call_span:
+            for candidate in candidates:
+                breaker = self.breaker(candidate)
+                if not breaker.allow():
+                    breaker_rejected_total.inc(model=candidate)
+                    continue
+                try:
+                    result = await self._with_retries(candidate, attempt, breaker)
+                except Exception as e:
+                    if not classify(e)[0]:
+                        raise
+                    last_error = e
+                    continue
+                finally:
+                    breaker.release()
+                if candidate != model_id:
+                    fallbacks_total.inc(model=model_id, fallback=candidate)
+                    call_span.set_attribute("fallback_model", candidate)
+                    logger.warning(f"🔀 {model_id} unavailable, served by fallback {candidate}")
+                return result
+
+        wait = min((self.breaker(m).retry_after() for m in candidates), default=0.0) or self.base_delay
+        detail = f"LLM provider unavailable for {model_id}"
+        detail += f": {type(last_error).__name__}: {last_error}" if last_error else " (circuit open)"
+        raise ProviderUnavailable(detail, retry_after=max(1, math.ceil(wait)))
+
+    def status(self) -> dict:
+        return {model_id: breaker.status() for model_id, breaker in sorted(self._breakers.items())}
+
+
+_caller: Optional[ResilientCaller] = None
+
+
+def get_resilient_caller() -> ResilientCaller:
+    global _caller
+    if _caller is None:
+        _caller = ResilientCaller()
+    return _caller
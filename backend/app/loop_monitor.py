@@ -0,0 +1,154 @@
+# event-loop lag sampler and blocking-call detector for the async endpoints
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, List, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = Path(__file__).resolve().parent
+# Harness code (load-test stubs, test fakes) is never the culprit worth reporting
+IGNORED_DIRS = (APP_DIR / "benchmarks", APP_DIR / "tests")
+
+loop_lag_seconds = metrics.histogram(
+    "event_loop_lag_seconds", "How late the event loop woke up for a fixed-interval timer",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+loop_lag_max_seconds = metrics.gauge("event_loop_lag_max_seconds", "Largest lag seen since startup")
+blocking_calls_total = metrics.counter(
+    "event_loop_blocking_calls_total", "Times the loop was blocked past the threshold, by responsible code location"
+)
+blocked_seconds_total = metrics.counter(
+    "event_loop_blocked_seconds_total", "Wall-clock time the loop spent blocked past the threshold, by code location"
+)
+
+
+def _responsible_frame(stack: List[traceback.FrameSummary]) -> Optional[traceback.FrameSummary]:
+    """Innermost frame that belongs to this app (not asyncio, stdlib or site-packages)."""
+    for frame in reversed(stack):
+        path = Path(frame.filename)
+        if APP_DIR not in path.parents or "site-packages" in path.parts or path.name == Path(__file__).name:
+            continue
+        if any(d in path.parents for d in IGNORED_DIRS):
+            continue
+        return frame
+    return stack[-1] if stack else None
+
+
+class LoopMonitor:
+    """
+    Samples event-loop lag with a timer task on the loop, and runs a watchdog thread that
+    notices when that timer stops ticking. When the loop is stuck for longer than
+    `block_threshold` the watchdog grabs the loop thread's current stack, so the log line
+    and the metric point at the code doing the blocking rather than at whoever waited.
+    """
+
+    def __init__(self, interval: float = 0.05, block_threshold: float = 0.1, stack_limit: int = 25, keep_samples: int = 10000):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.stack_limit = stack_limit
+        self.lag_samples: Deque[float] = deque(maxlen=keep_samples)
+        self.blocking_events: Deque[Dict] = deque(maxlen=100)
+        self._loop_thread_id: Optional[int] = None
+        self._last_tick = time.monotonic()
+        self._max_lag = 0.0
+        self._pending_event: Optional[Dict] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls) -> "LoopMonitor":
+        return cls(
+            interval=float(os.getenv("LOOP_LAG_INTERVAL_MS", "50")) / 1000,
+            block_threshold=float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100")) / 1000,
+        )
+
+    def start(self) -> None:
+        """Must be called from a coroutine running on the loop to be monitored."""
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._sample())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"🩺 Event-loop monitor started (interval {self.interval * 1000:.0f}ms, block threshold {self.block_threshold * 1000:.0f}ms)")
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._watchdog:
+            self._watchdog.join(timeout=1)
+
+    async def _sample(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            self._last_tick = time.monotonic()
+            self.lag_samples.append(lag * 1000)
+            loop_lag_seconds.observe(lag)
+            if lag > self._max_lag:
+                self._max_lag = lag
+                loop_lag_max_seconds.set(lag)
+            self._finish_event(lag)
+
+    def _watch(self) -> None:
+        poll = min(self.interval, self.block_threshold) / 2
+        while not self._stop.wait(poll):
+            stalled = time.monotonic() - self._last_tick - self.interval
+            if stalled > self.block_threshold and self._pending_event is None:
+                self._capture(stalled)
+
+    def _capture(self, stalled: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        stack = traceback.extract_stack(frame, limit=self.stack_limit)
+        culprit = _responsible_frame(stack)
+        location = f"{Path(culprit.filename).name}:{culprit.lineno} {culprit.name}" if culprit else "unknown"
+        self._pending_event = {
+            "location": location,
+            "detected_after_ms": round(stalled * 1000, 1),
+            "stack": traceback.format_list(stack),
+            "detected_at": time.time(),
+        }
+        logger.warning(
+            f"🐢 Event loop blocked for >{self.block_threshold * 1000:.0f}ms in {location}\n"
+            + "".join(self._pending_event["stack"])
+        )
+
+    def _finish_event(self, lag: float) -> None:
+        """Called on the first tick after a stall: record how long it really lasted."""
+        event, self._pending_event = self._pending_event, None
+        if event is None:
+            return
+        event["blocked_ms"] = round(lag * 1000, 1)
+        self.blocking_events.append(event)
+        blocking_calls_total.inc(location=event["location"])
+        blocked_seconds_total.inc(lag, location=event["location"])
+        logger.warning(f"🐢 Event loop unblocked after {event['blocked_ms']}ms ({event['location']})")
+
+    def report(self) -> Dict:
+        by_location: Dict[str, Dict[str, float]] = {}
+        for e in self.blocking_events:
+            entry = by_location.setdefault(e["location"], {"count": 0, "blocked_ms": 0.0})
+            entry["count"] += 1
+            entry["blocked_ms"] = round(entry["blocked_ms"] + e["blocked_ms"], 1)
+        return {
+            "max_lag_ms": round(self._max_lag * 1000, 1),
+            "blocking_by_location": dict(sorted(by_location.items(), key=lambda kv: kv[1]["blocked_ms"], reverse=True)),
+            "recent_events": list(self.blocking_events)[-10:],
+        }
@@ -1,34 +1,42 @@
 import asyncio, os
+from contextlib import AsyncExitStack, asynccontextmanager
+from functools import lru_cache, partial
 
 # ── On Windows, using ProactorEventLoopPolicy so subprocesses work ─────────────
 if os.name == "nt":
     asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
 
-import uvicorn
-from fastapi import FastAPI, HTTPException, status
+from fastapi import Depends, FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 import logging
 import time
 from pathlib import Path
 import hashlib
-from bs4 import BeautifulSoup
 import glob 
 import re
-
-from models import CloneRequest, ScrapeRequest, EditRequest, EditResponse, LatestScrapedResponse
-from scraper_sync import fetch_design_context_sync
-from llm_client import generate_clone_html, generate_with_google, edit_html_with_gemini
+import json
+
+from models import BatchScrapeRequest, CloneRequest, ScrapeRequest, EditRequest, EditResponse, LatestScrapedResponse
+from scraper_sync import fetch_design_context_sync, inline_images_sync
+from batch_scraper import BatchScraper
+from llm_client import generate_clone_html, edit_html_with_gemini, truncate_css
+from scrape_bundle import BundleError, bundle_path_for, read_bundle, write_bundle
+import tracing
+from tracing import span, TRACE_HEADER
+import metrics
+from loop_monitor import LoopMonitor
+from scrape_workers import POOL_SIZE, ScrapeWorkerPool
+import admission
+from llm_resilience import ProviderUnavailable, get_resilient_caller
+from asset_store import ASSET_ROUTE, AssetExternalizer, content_type_for, get_asset_store
+from speculation import SPECULATIVE_GENERATION, SPECULATIVE_MODEL, get_generation_cache
+from edit_planner import EDIT_FAST_PATH, record_llm_edit, try_local_edit
+from edit_queue import combine_instructions, get_edit_queue
+from http_encoding import HTTPEncodingMiddleware, content_etag, etag_matches, html_response, wants_html
 
 load_dotenv()
-app = FastAPI()
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -39,6 +47,16 @@ logger = logging.getLogger(__name__)
 # Ensure cloned_sites directory exists on startup
 CLONED_SITES_DIR = Path("cloned_sites")
 CLONED_SITES_DIR.mkdir(exist_ok=True)
+# Metadata of an Accept: text/html response, which carries the document itself as the body
+ARTIFACT_HEADERS = ["X-Artifact-Path", "X-Processing-Time", "X-Document-Id", "X-Document-Version"]
+
+# How generated clones reference images/CSS/fonts: remote | inline | external (see CloneRequest.asset_mode)
+CLONE_ASSET_MODE = os.getenv("CLONE_ASSET_MODE", "remote")
+# Public base URL for /assets links in clones; defaults to the URL the request came in on
+ASSET_BASE_URL = os.getenv("ASSET_BASE_URL", "")
+# Budget for the scraped CSS in the generation prompt (truncate_css keeps the most important rules)
+GENERATE_CSS_MAX_CHARS = int(os.getenv("GENERATE_CSS_MAX_CHARS", "15000"))
+STARTUP_PREWARM = os.getenv("STARTUP_PREWARM", "0") == "1"
 
 # Check for required environment variables on startup
 required_env_vars = ['GOOGLE_API_KEY', 'GROQ_API_KEY']
@@ -46,14 +64,238 @@ for var in required_env_vars:
     if not os.getenv(var):
         logger.warning(f"⚠️  Environment variable '{var}' not set. LLM functionality may be limited.")
 
+http_request_seconds = metrics.histogram("http_request_duration_seconds", "Request latency by route and status")
+
+loop_monitor: LoopMonitor | None = None
+scrape_pool: ScrapeWorkerPool | None = None
+
+def prewarm_imports() -> None:
+    """Import Playwright and bs4 and build the provider clients (and their HTTP pools) ahead of the first request."""
+    from playwright.sync_api import sync_playwright
+    import playwright.async_api  # noqa: F401  (batch scraper)
+    import llm_client
+    import compact_dom, template_extraction  # noqa: F401  (bs4)
+
+    if os.getenv("GOOGLE_API_KEY"):
+        llm_client.get_genai()
+    if os.getenv("GROQ_API_KEY"):
+        llm_client.get_groq_client()
+    # One throwaway launch pulls the Chromium binary into the page cache
+    with sync_playwright() as p:
+        p.chromium.launch(headless=True).close()
+
+async def prewarm() -> None:
+    global scrape_pool
+    started = time.perf_counter()
+    try:
+        with span("startup.prewarm"):
+            if POOL_SIZE > 0:
+                pool = ScrapeWorkerPool(POOL_SIZE)
+                await pool.start()
+                scrape_pool = pool
+            await asyncio.to_thread(prewarm_imports)
+        logger.info(f"🔥 Prewarmed in {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        logger.warning(f"🔥 Prewarm incomplete: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Nothing slow happens before the app accepts requests: provider SDKs, clients, Playwright and
+    bs4 load on first use. STARTUP_PREWARM=1 loads them (and starts the SCRAPE_WORKERS pool) in the
+    background instead; until the pool is up, scrapes run in API threads.
+    LOOP_MONITOR=1 samples event-loop lag and reports calls that block the loop.
+    """
+    global loop_monitor, scrape_pool
+    if os.getenv("LOOP_MONITOR", "0") == "1":
+        loop_monitor = LoopMonitor.from_env()
+        loop_monitor.start()
+    prewarm_task = None
+    if STARTUP_PREWARM:
+        prewarm_task = asyncio.create_task(prewarm())
+    elif POOL_SIZE > 0:
+        # SCRAPE_WORKERS=N: scrapes run in N separate worker processes instead of API threads
+        scrape_pool = ScrapeWorkerPool(POOL_SIZE)
+        await scrape_pool.start()
+    try:
+        yield
+    finally:
+        if prewarm_task is not None:
+            prewarm_task.cancel()
+            await asyncio.gather(prewarm_task, return_exceptions=True)
+        get_generation_cache().clear()
+        if scrape_pool is not None:
+            await scrape_pool.stop()
+        if loop_monitor is not None:
+            await loop_monitor.stop()
+        # Buffered spans (file or OTLP exporter) are written out before exit
+        await asyncio.to_thread(tracing.get_exporter().shutdown)
+
+app = FastAPI(lifespan=lifespan)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=[TRACE_HEADER, "ETag", *ARTIFACT_HEADERS],
+)
+app.add_middleware(HTTPEncodingMiddleware)
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Open a root span per request. A valid X-Trace-Id header continues an existing user flow,
+    otherwise a new trace is started; the id is echoed back on the response.
+    """
+    incoming_trace_id = request.headers.get(TRACE_HEADER)
+    if not tracing.is_valid_trace_id(incoming_trace_id):
+        incoming_trace_id = None
+
+    with tracing.trace(incoming_trace_id):
+        with span(f"{request.method} {request.url.path}") as root_span:
+            response = await call_next(request)
+            root_span.set_attribute("http.status_code", response.status_code)
+
+    # Labelled by route template: raw paths (trace ids, asset hashes, 404 probes) would add a series each
+    route = request.scope.get("route")
+    http_request_seconds.observe((root_span.duration_ms or 0) / 1000, path=route.path if route else "unmatched", status=response.status_code)
+
+    response.headers[TRACE_HEADER] = root_span.trace_id
+    return response
+
+def write_artifact_meta(artifact_path: Path, **meta) -> None:
+    """Store provenance (trace id, source url, model...) next to an artifact as <stem>.meta.json."""
+    meta_path = artifact_path.with_suffix(".meta.json")
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({"artifact": artifact_path.name, "trace_id": tracing.current_trace_id(), **meta}, f)
+
+def read_artifact_meta(artifact_path: Path) -> dict:
+    meta_path = artifact_path.with_suffix(".meta.json")
+    if not meta_path.exists():
+        return {}
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read artifact metadata {meta_path}: {e}")
+        return {}
+
+def save_raw_artifact(url: str, design_context: dict) -> tuple[str, Path]:
+    """
+    Write the scraped document to cloned_sites/<timestamp>_<urlhash>_raw.html with its metadata
+    sidecar, plus the full design context (CSS included) as a scrape bundle next to it.
+    """
+    url_hash = hashlib.md5(url.encode('utf-8')).hexdigest()[:8]
+    timestamp_str = time.strftime("%Y%m%d_%H%M%S", time.gmtime())
+    filename = f"{timestamp_str}_{url_hash}_raw.html"
+    html_path = CLONED_SITES_DIR / filename
+
+    full_html = f"<html><head>{design_context.get('head', '')}</head><body>{design_context.get('body', '')}</body></html>"
+    with span("artifact.write", kind="raw", bytes=len(full_html)):
+        with open(html_path, "w", encoding="utf-8") as f:
+            f.write(full_html)
+    with span("artifact.write", kind="bundle") as bundle_span:
+        bundle_path, bundle_hash = write_bundle(bundle_path_for(html_path), {**design_context, "url": url})
+        bundle_span.set_attribute("bytes", bundle_path.stat().st_size)
+    write_artifact_meta(html_path, kind="raw", url=url, bundle=bundle_path.name, bundle_sha256=bundle_hash)
+    return full_html, html_path
+
+def apply_asset_mode(html: str, mode: str, page_url: str, image_sizes: dict, asset_base: str) -> tuple[str, dict]:
+    """Inline the clone's images as data URIs, or move images/CSS/fonts into the asset store."""
+    with span("assets.apply", mode=mode, html_length=len(html)) as assets_span:
+        if mode == "inline":
+            images = []
+            html = inline_images_sync(html, page_url, image_sizes, report=images)
+            report = {"images": len(images), "bytes_before": sum(i["original_bytes"] for i in images), "bytes_after": sum(i["bytes"] for i in images)}
+        else:
+            externalizer = AssetExternalizer(get_asset_store(), asset_route=asset_base, rendered_sizes=image_sizes)
+            html = externalizer.externalize(html, page_url)
+            report = externalizer.report
+        assets_span.set_attribute("html_length_after", len(html))
+    return html, {"mode": mode, **report}
+
+def read_generation_bundle(bundle_file: Path, expected_hash: str | None) -> dict:
+    """The scrape bundle with its CSS cut to the prompt budget; truncate_css parses every rule, so both run in a thread."""
+    bundle = read_bundle(bundle_file, expected_hash)
+    bundle['css'] = truncate_css(bundle['css'], max_chars=GENERATE_CSS_MAX_CHARS) if bundle['css'] else ''
+    return bundle
+
+async def load_generation_context(raw_html_file: Path, raw_meta: dict) -> dict:
+    """The design context /api/generate sends to the LLM: from the scrape bundle, else from the raw HTML."""
+    bundle_file = bundle_path_for(raw_html_file)
+    if bundle_file.exists():
+        with span("artifact.read", kind="bundle", bytes=bundle_file.stat().st_size):
+            try:
+                bundle = await asyncio.to_thread(read_generation_bundle, bundle_file, raw_meta.get("bundle_sha256"))
+            except BundleError as e:
+                raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+        design_context_for_llm = {
+            'head': bundle['head'],
+            'body': bundle['body'],
+            'css': bundle['css'],
+            'image_sizes': bundle.get('image_sizes') or {},
+            'debug_info': bundle.get('debug_info') or {},
+        }
+    else:
+        # Artifacts from before scrape bundles: only the HTML was kept, the CSS is gone
+        with span("artifact.read", kind="raw"):
+            with open(raw_html_file, "r", encoding="utf-8") as f:
+                 raw_full_html = f.read()
+
+        with span("html.parse", html_length=len(raw_full_html)):
+            from bs4 import BeautifulSoup  # deferred: not needed to start the API
+            soup = BeautifulSoup(raw_full_html, 'html.parser')
+            # Reconstruct minimal design_context
+            design_context_for_llm = {
+                'head': str(soup.head) if soup.head else '',
+                'body': str(soup.body) if soup.body else '',
+                'css': '',
+                'debug_info': {} 
+            }
+    return design_context_for_llm
+
+def provider_unavailable(e: ProviderUnavailable) -> HTTPException:
+    """Every model that could answer is down or rate limited: 503, with when to try again."""
+    return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+
+def start_speculative_generation(html_path: Path) -> None:
+    """With SPECULATIVE_GENERATION=1, start the default model on a fresh scrape (see speculation.py)."""
+    trace_id = tracing.current_trace_id()
+
+    async def generate() -> str:
+        # Runs after the scrape response was sent, so rejoin its trace like the batch stream does
+        with tracing.trace(trace_id), span("generate.speculative", model=SPECULATIVE_MODEL):
+            design_context = await load_generation_context(html_path, read_artifact_meta(html_path))
+            return await generate_clone_html(design_context, model_id=SPECULATIVE_MODEL)
+
+    get_generation_cache().start(str(html_path), SPECULATIVE_MODEL, generate, admission.model_gate(SPECULATIVE_MODEL))
+
+async def scrape_admission(http_request: Request):
+    """Admission control for Chromium-backed endpoints; the slot is held until the response is done."""
+    async with admission.admit("scrape", http_request, admission.scrape_gate()):
+        yield
+
+async def generate_admission(request: CloneRequest, http_request: Request):
+    # Joining a speculative generation reuses the model slot that speculation already holds
+    joins = get_generation_cache().pending(request.raw_html_path, request.model)
+    http_request.state.model_admitted = not joins
+    async with admission.admit("generate", http_request, None if joins else admission.model_gate(request.model)):
+        yield
+
+async def edit_admission(request: EditRequest, http_request: Request):
+    # Edits wait in their document's queue first; the model slot is taken per batch, in apply_edits
+    async with admission.admit("edit", http_request, None):
+        yield
+
 @app.get("/")
 def read_root():
     return {"message": "Hello World"}
 
-@app.post("/api/scrape")
-async def scrape_website_endpoint(request: ScrapeRequest):
+@app.post("/api/scrape", dependencies=[Depends(scrape_admission)])
+async def scrape_website_endpoint(request: ScrapeRequest, http_request: Request):
     """
-    Scrape a website and return the raw HTML.
+    Scrape a website and return the raw HTML (as the body itself with Accept: text/html).
     """
     start_time = time.time()
     url = request.url
@@ -62,8 +304,11 @@ async def scrape_website_endpoint(request: ScrapeRequest):
 
     try:
         scrape_start = time.time()
-        # Use asyncio.to_thread for potentially blocking sync function
-        design_context = await asyncio.to_thread(fetch_design_context_sync, url)
+        if scrape_pool is not None:
+            design_context = await scrape_pool.scrape(url)
+        else:
+            # Use asyncio.to_thread for potentially blocking sync function
+            design_context = await asyncio.to_thread(fetch_design_context_sync, url)
         scrape_time = time.time() - scrape_start
 
         logger.info(f"✅ Scraping completed in {scrape_time:.2f}s")
@@ -85,26 +330,25 @@ async def scrape_website_endpoint(request: ScrapeRequest):
             logger.warning("⚠️  Very few content elements found – page might not have loaded properly")
 
         # 💾 Save raw HTML to disk
-        url_hash = hashlib.md5(url.encode('utf-8')).hexdigest()[:8]
-        timestamp_str = time.strftime("%Y%m%d_%H%M%S", time.gmtime())
-        filename = f"{timestamp_str}_{url_hash}_raw.html"
-        html_path = CLONED_SITES_DIR / filename
-
-        full_html = f"<html><head>{design_context.get('head', '')}</head><body>{design_context.get('body', '')}</body></html>"
-        with open(html_path, "w", encoding="utf-8") as f:
-            f.write(full_html)
+        full_html, html_path = await asyncio.to_thread(save_raw_artifact, url, design_context)
         logger.info(f"📁 Saved raw scraped HTML to {html_path}")
+        if SPECULATIVE_GENERATION:
+            start_speculative_generation(html_path)
 
         total_time = time.time() - start_time
         logger.info(f"🎉 Scrape completed successfully in {total_time:.2f}s")
 
+        if wants_html(http_request):
+            return html_response(full_html, {"X-Artifact-Path": str(html_path), "X-Processing-Time": f"{total_time:.2f}"})
+
         # Return relevant scrape data, including the path
         return {
             "raw_html": full_html,
             "raw_html_path": str(html_path),
             "debug_info": design_context.get('debug_info', {}),
             "processing_time": round(total_time, 2),
-            "timestamp": time.strftime('%Y-%m-%d %H:%M:%S UTC', time.gmtime())
+            "timestamp": time.strftime('%Y-%m-%d %H:%M:%S UTC', time.gmtime()),
+            "trace_id": tracing.current_trace_id()
         }
 
     except HTTPException:
@@ -113,10 +357,55 @@ async def scrape_website_endpoint(request: ScrapeRequest):
         logger.error(f"❌ Unexpected error during scraping: {str(e)}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Internal server error during scraping: {str(e)}")
 
-@app.post("/api/generate")
-async def generate_website_endpoint(request: CloneRequest):
+@app.post("/api/scrape/batch", dependencies=[Depends(scrape_admission)])
+async def scrape_batch_endpoint(request: BatchScrapeRequest):
     """
-    Generate clean HTML from raw HTML using an LLM.
+    Scrape many URLs over one shared browser and stream one NDJSON line per page as it
+    completes, followed by a summary line. A failed page yields an error line; the rest continue.
+    """
+    trace_id = tracing.current_trace_id()
+    urls = list(dict.fromkeys(request.urls))
+    logger.info(f"📡 Starting batch scrape of {len(urls)} URLs with {request.concurrency} tabs")
+
+    async def results():
+        start_time = time.time()
+        succeeded = failed = 0
+        scraper = BatchScraper(concurrency=request.concurrency)
+        # The body is streamed after the middleware's root span has closed, so rejoin its trace
+        with tracing.trace(trace_id), span("scrape.batch", urls=len(urls), concurrency=request.concurrency):
+            async for result in scraper.scrape(urls):
+                line = {"url": result["url"], "ok": result["ok"], "elapsed_ms": result["elapsed_ms"]}
+                design_context = result.get("design_context")
+                if result["ok"] and not design_context.get("body"):
+                    result = {**result, "ok": False, "error": "no body content found"}
+                    line["ok"] = False
+                if result["ok"]:
+                    succeeded += 1
+                    _, html_path = await asyncio.to_thread(save_raw_artifact, result["url"], design_context)
+                    line.update(raw_html_path=str(html_path), debug_info=design_context["debug_info"])
+                else:
+                    failed += 1
+                    line["error"] = result["error"]
+                yield json.dumps(line) + "\n"
+
+        total_time = time.time() - start_time
+        logger.info(f"🎉 Batch scrape finished: {succeeded} ok, {failed} failed in {total_time:.2f}s")
+        yield json.dumps({
+            "done": True,
+            "succeeded": succeeded,
+            "failed": failed,
+            "processing_time": round(total_time, 2),
+            "pages_per_minute": round((succeeded + failed) / total_time * 60, 2) if total_time else None,
+            "stylesheets": scraper.stylesheet_stats(),
+            "trace_id": trace_id,
+        }) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@app.post("/api/generate", dependencies=[Depends(generate_admission)])
+async def generate_website_endpoint(request: CloneRequest, http_request: Request):
+    """
+    Generate clean HTML from raw HTML using an LLM (as the body itself with Accept: text/html).
     """
     start_time = time.time()
     raw_html_path = request.raw_html_path
@@ -130,24 +419,45 @@ async def generate_website_endpoint(request: CloneRequest):
         if not raw_html_file.exists():
              raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Raw HTML file not found at {raw_html_path}")
 
-        with open(raw_html_file, "r", encoding="utf-8") as f:
-             raw_full_html = f.read()
+        # Continue the scrape's trace unless the client pinned one explicitly
+        raw_meta = read_artifact_meta(raw_html_file)
+        if TRACE_HEADER not in http_request.headers and tracing.is_valid_trace_id(raw_meta.get("trace_id")):
+            tracing.join_trace(raw_meta["trace_id"])
 
-        soup = BeautifulSoup(raw_full_html, 'html.parser')
-        # Reconstruct minimal design_context
-        design_context_for_llm = {
-            'head': str(soup.head) if soup.head else '',
-            'body': str(soup.body) if soup.body else '',
-            'css': '',
-            'debug_info': {} 
-        }
+        design_context_for_llm = await load_generation_context(raw_html_file, raw_meta)
 
         llm_start = time.time()
-        # Pass the reconstructed context and the model_id to the generation function
-        # The generate_clone_html function in llm_client.py needs to handle this structure
-        generated_html = await generate_clone_html(design_context_for_llm, model_id=model_id)
+        generated = False
+        speculative = None
+        claimed = get_generation_cache().claim(raw_html_path, model_id)
+        if claimed is not None:
+            task, speculative = claimed
+            try:
+                with span("generate.speculative.join", outcome=speculative):
+                    generated_html = await task
+                generated = True
+                logger.info(f"🔮 Speculative generation {speculative}")
+            except Exception as e:
+                logger.warning(f"🔮 Speculative generation failed, generating again: {e}")
+                speculative = None
+        if not generated:
+            async with AsyncExitStack() as stack:
+                if not http_request.state.model_admitted:
+                    # The dependency skipped the gate to join a speculation that then failed or expired
+                    await stack.enter_async_context(admission.model_gate(model_id).admit())
+                # Pass the reconstructed context and the model_id to the generation function
+                # The generate_clone_html function in llm_client.py needs to handle this structure
+                generated_html = await generate_clone_html(design_context_for_llm, model_id=model_id)
         llm_time = time.time() - llm_start
 
+        asset_mode = request.asset_mode or CLONE_ASSET_MODE
+        asset_report = None
+        if asset_mode != "remote" and generated_html:
+            asset_base = (ASSET_BASE_URL or str(http_request.base_url)).rstrip("/") + ASSET_ROUTE
+            generated_html, asset_report = await asyncio.to_thread(
+                apply_asset_mode, generated_html, asset_mode, raw_meta.get("url") or "", design_context_for_llm.get("image_sizes") or {}, asset_base
+            )
+
         # Checks
         if not generated_html or len(generated_html) < 100:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="LLM failed to generate valid HTML content or content is too short")
@@ -169,8 +479,10 @@ async def generate_website_endpoint(request: CloneRequest):
         filename = f"{timestamp_str}_{url_hash_from_raw_file}_{model_id.replace('-', '_')}_generated.html" # Include model in filename
         generated_html_path = CLONED_SITES_DIR / filename
 
-        with open(generated_html_path, "w", encoding="utf-8") as f:
-            f.write(generated_html)
+        with span("artifact.write", kind="generated", bytes=len(generated_html)):
+            with open(generated_html_path, "w", encoding="utf-8") as f:
+                f.write(generated_html)
+            write_artifact_meta(generated_html_path, kind="generated", source=raw_html_file.name, model=model_id, url=raw_meta.get("url"))
         logger.info(f"📁 Saved generated HTML to {generated_html_path}")
 
 
@@ -178,20 +490,64 @@ async def generate_website_endpoint(request: CloneRequest):
         logger.info(f"🎉 Generation completed successfully in {total_time:.2f}s")
         logger.info(f"📊 Final HTML size: {len(generated_html)} characters")
 
+        if wants_html(http_request):
+            return html_response(generated_html, {"X-Artifact-Path": str(generated_html_path), "X-Processing-Time": f"{total_time:.2f}"})
+
         # Return the generated HTML and its path
         return {
             "generated_html": generated_html,
             "generated_html_path": str(generated_html_path),
             "processing_time": round(total_time, 2),
-            "timestamp": time.strftime('%Y-%m-%d %H:%M:%S UTC', time.gmtime())
+            "timestamp": time.strftime('%Y-%m-%d %H:%M:%S UTC', time.gmtime()),
+            "trace_id": tracing.current_trace_id(),
+            "assets": asset_report,
+            "speculative": speculative,
         }
 
     except HTTPException:
         raise
+    except ProviderUnavailable as e:
+        raise provider_unavailable(e)
     except Exception as e:
         logger.error(f"❌ Unexpected error during generation: {str(e)}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Internal server error during generation: {str(e)}")
 
+@app.get(ASSET_ROUTE + "/{name}")
+def get_asset(name: str, request: Request):
+    """
+    Content-addressed clone assets. The name is the SHA-256 of the bytes, so a response can be
+    cached forever; revalidation with If-None-Match is answered with 304.
+    """
+    path = get_asset_store().path_for(name)
+    if path is None or not path.exists():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Asset not found: {name}")
+    etag = f'"{name.split(".")[0]}"'
+    headers = {"Cache-Control": "public, max-age=31536000, immutable", "ETag": etag}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return FileResponse(path, media_type=content_type_for(name), headers=headers)
+
+@lru_cache(maxsize=1024)
+def artifact_etag(path: str, mtime_ns: int, size: int) -> str:
+    """Keyed by stat, so each artifact version is hashed once."""
+    return content_etag(Path(path).read_bytes())
+
+@app.get("/api/artifacts/{name}")
+def get_artifact(name: str, request: Request):
+    """
+    A saved HTML artifact (raw, generated or edited) by file name. The ETag is a hash of the
+    content, so a client revalidating the copy it has gets 304 without the body.
+    """
+    path = CLONED_SITES_DIR / name
+    if not re.fullmatch(r"[\w.-]+\.html", name) or not path.is_file():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Artifact not found: {name}")
+    stat = path.stat()
+    etag = artifact_etag(str(path), stat.st_mtime_ns, stat.st_size)
+    headers = {"Cache-Control": "no-cache", "ETag": etag}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return FileResponse(path, media_type="text/html; charset=utf-8", headers=headers)
+
 @app.get("/api/latest-scraped", response_model=LatestScrapedResponse)
 async def get_latest_scraped_file():
     """
@@ -217,10 +573,60 @@ async def get_latest_scraped_file():
         logger.error(f"❌ Error finding latest scraped file: {str(e)}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Internal server error finding latest scraped file: {str(e)}")
 
-@app.post("/api/edit", response_model=EditResponse)
-async def edit_html_endpoint(request: EditRequest):
+async def apply_edits(model_id: str, html: str, instructions: list) -> dict:
+    """
+    One batch from the edit queue: instructions the local catalogue covers are applied in order
+    until one is not; the rest go to the model as a single combined instruction. Saves the result.
+    """
+    local_plans = []
+    remaining = list(instructions)
+    while EDIT_FAST_PATH and remaining:
+        with span("edit.local") as local_span:
+            local_edit = await asyncio.to_thread(try_local_edit, html, remaining[0])
+            local_span.set_attribute("applied", local_edit is not None)
+        if local_edit is None:
+            break
+        html = local_edit["html"]
+        local_plans.append({"plan": local_edit["plan"], "elapsed_ms": local_edit["elapsed_ms"]})
+        remaining.pop(0)
+
+    if remaining:
+        llm_start = time.time()
+        async with admission.model_gate(model_id).admit():
+            # Use the new editing function in llm_client
+            html = await edit_html_with_gemini(html, combine_instructions(remaining), model_id=model_id)
+        record_llm_edit(time.time() - llm_start)
+
+    if not html or len(html) < 100:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="LLM failed to generate valid edited HTML content or content is too short")
+
+    # Check if it starts with doctype case-insensitively and optionally whitespace
+    if not re.match(r'^\s*<!DOCTYPE', html, re.IGNORECASE):
+         logger.warning("⚠️  Edited HTML doesn't start with <!DOCTYPE")
+
+    # 💾 Save edited HTML to disk
+    timestamp_str = time.strftime("%Y%m%d_%H%M%S", time.gmtime())
+    combined = combine_instructions(instructions)
+    instruction_hash = hashlib.md5(combined.encode('utf-8')).hexdigest()[:8]
+    editor = model_id if remaining else "local"
+    filename = f"{timestamp_str}_edited_{instruction_hash}_{editor.replace('-', '_')}.html"
+    edited_html_path = CLONED_SITES_DIR / filename
+
+    with span("artifact.write", kind="edited", bytes=len(html)):
+        with open(edited_html_path, "w", encoding="utf-8") as f:
+            f.write(html)
+        write_artifact_meta(edited_html_path, kind="edited", model=editor, instruction=combined)
+    logger.info(f"📁 Saved edited HTML to {edited_html_path}")
+
+    edit_path = "llm" if not local_plans else "mixed" if remaining else "local"
+    return {"html": html, "path": str(edited_html_path), "edit_path": edit_path, "local_plans": local_plans, "llm_instructions": len(remaining)}
+
+@app.post("/api/edit", response_model=EditResponse, dependencies=[Depends(edit_admission)])
+async def edit_html_endpoint(request: EditRequest, http_request: Request):
     """
-    Edit HTML content using a specified LLM based on user instruction.
+    Edit HTML content using a specified LLM based on user instruction. Edits of the same document
+    are queued and coalesced (see edit_queue.py); the response carries the resulting version.
+    html_content can be large: the body may be sent gzip-compressed (Content-Encoding: gzip).
     """
     start_time = time.time()
     html_content_to_edit = request.html_content
@@ -234,48 +640,96 @@ async def edit_html_endpoint(request: EditRequest):
 
 
     try:
-        llm_start = time.time()
-        # Use the new editing function in llm_client
-        edited_html = await edit_html_with_gemini(html_content_to_edit, instruction, model_id=model_id)
-        llm_time = time.time() - llm_start
-
-        if not edited_html or len(edited_html) < 100:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="LLM failed to generate valid edited HTML content or content is too short")
-
-        # Check if it starts with doctype case-insensitively and optionally whitespace
-        if not re.match(r'^\s*<!DOCTYPE', edited_html, re.IGNORECASE):
-             logger.warning("⚠️  Edited HTML doesn't start with <!DOCTYPE")
-
-
-        # 💾 Save edited HTML to disk
-        timestamp_str = time.strftime("%Y%m%d_%H%M%S", time.gmtime())
-
-        # Attempt to get the base filename from the raw_html_path if available
-        instruction_hash = hashlib.md5(instruction.encode('utf-8')).hexdigest()[:8]
-        filename = f"{timestamp_str}_edited_{instruction_hash}_{model_id.replace('-', '_')}.html"
-        edited_html_path = CLONED_SITES_DIR / filename
-
-        with open(edited_html_path, "w", encoding="utf-8") as f:
-            f.write(edited_html)
-        logger.info(f"📁 Saved edited HTML to {edited_html_path}")
+        with span("edit.queue") as queue_span:
+            result = await get_edit_queue().submit(html_content_to_edit, instruction, partial(apply_edits, model_id), request.document_id)
+            queue_span.set_attribute("batch_size", len(result["instructions"]))
+            queue_span.set_attribute("version", result["version"])
 
         total_time = time.time() - start_time
-        logger.info(f"✅ HTML editing completed successfully in {total_time:.2f}s")
-        logger.info(f"📊 Edited HTML size: {len(edited_html)} characters")
+        logger.info(f"✅ HTML editing completed successfully in {total_time:.2f}s (version {result['version']}, batch of {len(result['instructions'])})")
+        logger.info(f"📊 Edited HTML size: {len(result['html'])} characters")
+
+        if wants_html(http_request):
+            return html_response(result["html"], {
+                "X-Artifact-Path": result["path"],
+                "X-Processing-Time": f"{total_time:.2f}",
+                **({"X-Document-Id": result["document_id"]} if result["document_id"] else {}),
+                "X-Document-Version": str(result["version"]),
+            })
 
         # Return the edited HTML content
         return EditResponse(
-            edited_html=edited_html,
+            edited_html=result["html"],
+            document_id=result["document_id"],
+            version=result["version"],
             processing_time=round(total_time, 2),
             timestamp=time.strftime('%Y-%m-%d %H:%M:%S UTC', time.gmtime()),
-            # debug_info=... # Include any debug info from the LLM call if available
+            trace_id=tracing.current_trace_id(),
+            debug_info={
+                "edit_path": result["edit_path"],
+                "local_plans": result["local_plans"],
+                "batch_instructions": result["instructions"],
+                "rebased": result["rebased"],
+            },
         )
 
     except HTTPException:
         raise
+    except ProviderUnavailable as e:
+        raise provider_unavailable(e)
     except Exception as e:
         logger.error(f"❌ Unexpected error during HTML editing: {str(e)}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Internal server error during HTML editing: {str(e)}")
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Prometheus scrape endpoint."""
+    return metrics.render_prometheus()
+
+@app.get("/api/metrics")
+def json_metrics():
+    """All metrics as JSON, plus the loop monitor's blocking-call report and worker pool state when enabled."""
+    return {
+        "metrics": metrics.snapshot(),
+        "loop_monitor": loop_monitor.report() if loop_monitor else None,
+        "scrape_workers": scrape_pool.status() if scrape_pool else None,
+        "speculation": get_generation_cache().status(),
+    }
+
+@app.get("/api/status")
+def service_status():
+    """Current load: admission gates (active, queued, estimated wait), LLM circuit breakers, scraper workers, speculative generations, edit queues and event-loop lag."""
+    return {
+        "admission": admission.status_report(),
+        "llm_circuits": get_resilient_caller().status(),
+        "scrape_workers": scrape_pool.status() if scrape_pool else None,
+        "speculation": get_generation_cache().status(),
+        "edit_queue": get_edit_queue().status(),
+        "max_loop_lag_ms": loop_monitor.report()["max_lag_ms"] if loop_monitor else None,
+        "timestamp": time.strftime('%Y-%m-%d %H:%M:%S UTC', time.gmtime()),
+    }
+
+@app.get("/api/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    """
+    Return every span recorded for a user flow plus a per-stage wall-clock breakdown.
+    Only available with the default file exporter.
+    """
+    if not tracing.is_valid_trace_id(trace_id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Trace id must be 32 lowercase hex characters")
+
+    spans = await asyncio.to_thread(tracing.load_trace, trace_id)
+    if not spans:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No spans recorded for trace {trace_id}")
+
+    return {
+        "trace_id": trace_id,
+        "span_count": len(spans),
+        "breakdown": tracing.summarize_spans(spans),
+        "spans": spans,
+    }
+
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
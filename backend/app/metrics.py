@@ -0,0 +1,162 @@
+# in-process metrics registry (counters, gauges, histograms) exposed as JSON and Prometheus text
+
+import bisect
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = list(key) + sorted((extra or {}).items())
+    if not pairs:
+        return ""
+    escaped = (
+        '{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> dict:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, description: str = ""):
+        super().__init__(name, description)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def total(self) -> float:
+        return sum(self._values.values())
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {_format_labels(k) or "_": v for k, v in self._values.items()}
+
+    def render(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(k)} {v}" for k, v in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str = "", buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, description)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, dict] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            series["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                _format_labels(k) or "_": {"count": s["count"], "sum": round(s["sum"], 6)}
+                for k, s in self._series.items()
+            }
+
+    def render(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, s in self._series.items():
+                cumulative = 0
+                for bound, count in zip(list(self.buckets) + ["+Inf"], s["counts"]):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(key, {'le': str(bound)})} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {s['sum']}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {s['count']}")
+        return lines
+
+
+_registry: Dict[str, Metric] = {}
+_registry_lock = threading.Lock()
+
+
+def _get_or_create(cls, name: str, description: str, **kwargs) -> Metric:
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, description, **kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"Metric {name} already registered as {metric.kind}")
+        return metric
+
+
+def counter(name: str, description: str = "") -> Counter:
+    return _get_or_create(Counter, name, description)
+
+
+def gauge(name: str, description: str = "") -> Gauge:
+    return _get_or_create(Gauge, name, description)
+
+
+def histogram(name: str, description: str = "", buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+    return _get_or_create(Histogram, name, description, buckets=buckets)
+
+
+def snapshot() -> Dict[str, dict]:
+    """Current values of every registered metric, for the JSON metrics endpoint."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return {m.name: {"type": m.kind, "values": m.snapshot()} for m in metrics}
+
+
+def render_prometheus() -> str:
+    """Prometheus text exposition format (version 0.0.4)."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines = []
+    for m in metrics:
+        if m.description:
+            lines.append(f"# HELP {m.name} {m.description}")
+        lines.append(f"# TYPE {m.name} {m.kind}")
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
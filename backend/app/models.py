@@ -1,7 +1,7 @@
 # pydantic models for request and response bodies
 
 from pydantic import BaseModel, HttpUrl, field_validator
-from typing import Literal, List, Dict, Any 
+from typing import Literal, List, Dict, Any, Optional
 import re
 
 
@@ -21,6 +21,29 @@ class ScrapeRequest(BaseModel):
         return v
 
 
+class BatchScrapeRequest(BaseModel):
+    """Request body for the batch scraping endpoint: many URLs rendered over one shared browser."""
+    urls: List[str]
+    concurrency: int = 4 # Parallel tabs across the whole batch
+
+    @field_validator('urls')
+    def validate_urls(cls, v):
+        if not v:
+            raise ValueError("At least one URL is required")
+        if len(v) > 200:
+            raise ValueError("At most 200 URLs per batch")
+        for url in v:
+            if not re.match(r"^https?://", url):
+                raise ValueError(f"URL must start with http:// or https://: {url}")
+        return v
+
+    @field_validator('concurrency')
+    def validate_concurrency(cls, v):
+        if not 1 <= v <= 16:
+            raise ValueError("concurrency must be between 1 and 16")
+        return v
+
+
 class CloneRequest(BaseModel):
     """Request body for the website cloning endpoint (now used for generation)."""
     raw_html_path: str # Expecting the path to the saved raw HTML
@@ -29,6 +52,9 @@ class CloneRequest(BaseModel):
         'gemini-2.5-pro-preview-05-06',
         'mixtral-8x7b-32768'
     ] = 'gemini-2.5-pro-preview-05-06' # Default model
+    # remote: keep the original site's URLs; inline: images as data URIs;
+    # external: images, stylesheets and fonts served from /assets/{hash}. Defaults to CLONE_ASSET_MODE.
+    asset_mode: Optional[Literal['remote', 'inline', 'external']] = None
 
 class CloneResponse(BaseModel):
     html: str  # the fully inlined, cloned HTML document
@@ -44,6 +70,7 @@ class EditRequest(BaseModel):
     """Request body for the HTML editing endpoint."""
     html_content: str # The HTML to edit (can be raw or generated)
     instruction: str # The editing instruction from the user
+    document_id: str | None = None # Edits sharing an id are queued and coalesced; without one the edit runs alone
     model: Literal[
         'gemini-2.5-pro-preview-05-06',
     ] = 'gemini-2.5-pro-preview-05-06' # Default/only model for editing
@@ -51,9 +78,12 @@ class EditRequest(BaseModel):
 class EditResponse(BaseModel):
     """Response body for the HTML editing endpoint."""
     edited_html: str # The edited HTML content
+    document_id: str | None = None # The request's document_id, if it sent one
+    version: int | None = None # Edits applied to the document so far; callers coalesced into one batch share it
     processing_time: float | None = None
     timestamp: str | None = None
     debug_info: dict | None = None # Optional debug info from LLM call
+    trace_id: str | None = None # Trace id tying this edit to the rest of the user flow
 
 class LatestScrapedResponse(BaseModel):
     """Response body for getting the latest scraped file path."""
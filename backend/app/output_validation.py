@@ -0,0 +1,172 @@
+# incremental validation of streamed LLM output: early abort on off-format answers, HTML extraction, continuation of cut-off documents
+
+import re
+from typing import List, Optional, Tuple
+
+import metrics
+
+# Prose allowed before the first tag ("Here is the HTML:") before the answer counts as off-format
+PREAMBLE_LIMIT = 1500
+# Refusals are recognised this early, before a full preamble has accumulated
+REFUSAL_WINDOW = 300
+# Commentary allowed after </html> before the stream is cut off
+TRAILING_LIMIT = 200
+# Characters of the cut-off output quoted back in a continuation request
+CONTINUATION_TAIL = 3000
+
+FENCE_OPEN = re.compile(r"```[ \t]*(?:html|HTML|xml)?[ \t]*\r?\n")
+FIRST_TAG = re.compile(r"<(?:!doctype|!--|/?[a-zA-Z][\w-]*[\s/>])", re.IGNORECASE)
+DOCUMENT_START = re.compile(r"<!doctype|<html[\s>]", re.IGNORECASE)
+DOCUMENT_END = re.compile(r"</html\s*>", re.IGNORECASE)
+REFUSAL = re.compile(r"^\s*(?:I'?m sorry|I am sorry|I can(?:no|')t|I am unable|I'?m unable|As an AI|Unfortunately)", re.IGNORECASE)
+TAG = re.compile(r"<!--.*?-->|<(/?)([a-zA-Z][\w:-]*)(?:\s[^<>]*?)?(/?)>", re.DOTALL)
+RAW_TEXT = {"script", "style", "textarea", "title"}
+VOID = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"}
+LENGTH_FINISH_REASONS = {"length", "MAX_TOKENS", "2"}
+
+outputs_aborted_total = metrics.counter("llm_output_aborted_total", "Streamed generations abandoned early as off-format, by reason")
+continuations_total = metrics.counter("llm_continuations_total", "Continuation requests issued for cut-off documents, by outcome")
+
+
+class OffFormatOutput(ValueError):
+    """The model is answering with something other than an HTML document."""
+
+    def __init__(self, reason: str, sample: str):
+        super().__init__(f"LLM output is not HTML ({reason}): {sample[:120]!r}")
+        self.reason = reason
+
+
+class StreamValidator:
+    """
+    Fed the response as it streams in. `feed()` raises OffFormatOutput as soon as the answer is
+    clearly not HTML (a refusal, or a long stretch of prose with no tag) so the stream can be
+    dropped instead of paid for in full, and returns False once the document is complete and only
+    trailing commentary is left. For continuations the output may start mid-document.
+    """
+
+    def __init__(self, continuation: bool = False):
+        self.continuation = continuation
+        self.text = ""
+        self.finish_reason: Optional[str] = None
+        self.html_start: Optional[int] = None
+        self.html_end: Optional[int] = None
+
+    def feed(self, chunk: str) -> bool:
+        """Add a chunk; returns whether more output is still wanted."""
+        scan_from = max(0, len(self.text) - 16)
+        self.text += chunk
+        if self.html_start is None:
+            match = FIRST_TAG.search(self.text, scan_from)
+            if match:
+                self.html_start = match.start()
+            elif REFUSAL.match(self.text) and len(self.text) >= REFUSAL_WINDOW:
+                self._abort("refusal")
+            elif len(self.text) > PREAMBLE_LIMIT:
+                self._abort("no_html")
+        if self.html_start is not None and self.html_end is None:
+            match = DOCUMENT_END.search(self.text, max(self.html_start, scan_from))
+            if match:
+                self.html_end = match.end()
+        return self.html_end is None or len(self.text) - self.html_end <= TRAILING_LIMIT
+
+    def finish(self) -> None:
+        """End of stream: an answer that never produced a tag is off-format however short it was."""
+        if self.html_start is None:
+            self._abort("refusal" if REFUSAL.match(self.text) else "no_html")
+
+    def _abort(self, reason: str) -> None:
+        outputs_aborted_total.inc(reason=reason)
+        raise OffFormatOutput(reason, self.text.strip())
+
+    @property
+    def complete(self) -> bool:
+        return self.html_end is not None
+
+    @property
+    def truncated(self) -> bool:
+        """
+        Stopped by the length limit before the document was closed. Without a finish reason an
+        unclosed document counts as cut off; a normal stop without </html> (a fragment) does not.
+        """
+        if self.complete:
+            return False
+        if self.finish_reason is None:
+            return self.html_start is not None
+        return str(self.finish_reason) in LENGTH_FINISH_REASONS
+
+
+def extract_html(text: str, continuation: bool = False) -> str:
+    """
+    The HTML part of a response: inside the ```html fence when there is one (closed or not, a
+    cut-off response has no closing fence), from <!DOCTYPE/<html> to </html>, without commentary.
+    """
+    fence = FENCE_OPEN.search(text)
+    if fence:
+        text = text[fence.end():]
+        close = text.find("```")
+        if close != -1:
+            text = text[:close]
+    if continuation:
+        return text.rstrip() if fence else text
+    start = DOCUMENT_START.search(text)
+    if start:
+        text = text[start.start():]
+    end = None
+    for end in DOCUMENT_END.finditer(text):
+        pass
+    if end:
+        text = text[:end.end()]
+    return text.strip()
+
+
+def continuation_point(html: str) -> Tuple[str, List[str]]:
+    """
+    Cut a truncated document back to the end of its last complete tag and list the elements
+    still open at that point, outermost first.
+    """
+    cut = html.rfind(">") + 1
+    if html.rfind("<") >= cut:
+        # Stopped inside a tag: drop the partial tag and the text node before it is kept whole
+        cut = html.rfind("<")
+    prefix = html[:cut]
+
+    stack: List[str] = []
+    raw_text_until = -1
+    for match in TAG.finditer(prefix):
+        if match.start() < raw_text_until or match.group(2) is None:
+            continue
+        closing, name, self_closing = match.group(1), match.group(2).lower(), match.group(3)
+        if closing:
+            if name in stack:
+                del stack[len(stack) - 1 - stack[::-1].index(name):]
+        elif name not in VOID and not self_closing:
+            stack.append(name)
+            if name in RAW_TEXT:
+                end = re.compile(rf"</{name}\s*>", re.IGNORECASE).search(prefix, match.end())
+                raw_text_until = end.start() if end else len(prefix)
+    return prefix, stack
+
+
+def join_continuation(prefix: str, more: str, max_overlap: int = 2000) -> str:
+    """Append a continuation, dropping any part of the tail the model repeated before resuming."""
+    if DOCUMENT_START.match(more.lstrip()) and DOCUMENT_END.search(more):
+        # The model started over and finished; its complete document wins
+        return more.strip()
+    for size in range(min(len(more), len(prefix), max_overlap), 15, -1):
+        if prefix.endswith(more[:size]):
+            more = more[size:]
+            break
+    return prefix + more
+
+
+def continuation_request(prefix: str, open_elements: List[str]) -> str:
+    tail = prefix[-CONTINUATION_TAIL:]
+    still_open = " > ".join(open_elements) or "none"
+    return (
+        "Your previous answer was cut off before the document was finished. It ends with:\n"
+        f"```html\n{tail}\n```\n"
+        f"Elements still open at that point: {still_open}.\n"
+        "Continue the document from exactly that point: output only the remaining HTML, starting with the "
+        "characters that come next, without repeating anything already written and without commentary. "
+        "Close the open elements and end with </html>."
+    )
@@ -0,0 +1,114 @@
+# reversible placeholder substitution for long attribute values (data URIs, srcsets, tracking URLs, SVG paths)
+
+import hashlib
+import logging
+import os
+import re
+from typing import Dict, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+MIN_VALUE_CHARS = int(os.getenv("PLACEHOLDER_MIN_CHARS", "80"))
+# Attributes whose wording the model needs to see to reproduce the page sensibly
+KEEP_ATTRS = {"class", "style", "id", "alt", "title", "placeholder", "value", "name", "type", "role", "lang", "for"}
+
+TOKEN_RE = re.compile(r"__PH_([0-9a-f]{8,40})__")
+TAG_RE = re.compile(r"""<[a-zA-Z][\w:-]*(?:\s+[^\s=>/]+(?:\s*=\s*(?:"[^"]*"|'[^']*'|[^\s>"']+))?)*\s*/?>""")
+ATTR_RE = re.compile(r"""(\s)([^\s=>/]+)(\s*=\s*)("([^"]*)"|'([^']*)')""")
+# data: URIs outside attributes, e.g. background-image: url(data:...) in <style> blocks and CSS
+DATA_URI_RE = re.compile(r"""data:[\w.+-]+/[\w.+-]+(?:;[\w=.+-]+)*,[^\s"')]+""")
+
+substituted_values_total = metrics.counter("placeholder_substituted_values_total", "Long values swapped for placeholders before an LLM call")
+substituted_chars_total = metrics.counter("placeholder_substituted_chars_total", "Characters removed from prompts by placeholder substitution")
+placeholder_problems_total = metrics.counter(
+    "placeholder_problems_total", "Placeholders the model dropped (missing) or emitted without a match (unknown)"
+)
+
+
+class PlaceholderTable:
+    """
+    One substitution table per LLM call. Values map to a short token derived from their
+    content hash, so the same value always gets the same placeholder (within and across
+    calls) and restore() is an exact inverse for every token the model echoes back.
+    """
+
+    def __init__(self, min_chars: int = MIN_VALUE_CHARS):
+        self.min_chars = min_chars
+        self.values: Dict[str, str] = {}  # token -> original value
+        self._tokens: Dict[str, str] = {}  # original value -> token
+
+    def _token_for(self, value: str) -> str:
+        token = self._tokens.get(value)
+        if token is not None:
+            return token
+        digest = hashlib.sha1(value.encode("utf-8")).hexdigest()
+        length = 8
+        token = f"__PH_{digest[:length]}__"
+        while token in self.values:  # hash prefix collision between two different values
+            length += 4
+            token = f"__PH_{digest[:length]}__"
+        self.values[token] = value
+        self._tokens[value] = token
+        return token
+
+    def substitute(self, text: str) -> str:
+        """Replace long attribute values and data: URIs in `text` with placeholders."""
+        if not text:
+            return text
+
+        def replace_attr(m: re.Match) -> str:
+            name = m.group(2).lower()
+            value = m.group(5) if m.group(5) is not None else m.group(6)
+            if len(value) < self.min_chars or name in KEEP_ATTRS or name.startswith("aria-") or TOKEN_RE.fullmatch(value):
+                return m.group(0)
+            quote = m.group(4)[0]
+            return f"{m.group(1)}{m.group(2)}{m.group(3)}{quote}{self._token_for(value)}{quote}"
+
+        def replace_tag(m: re.Match) -> str:
+            return ATTR_RE.sub(replace_attr, m.group(0))
+
+        def replace_data_uri(m: re.Match) -> str:
+            value = m.group(0)
+            return self._token_for(value) if len(value) >= self.min_chars else value
+
+        before = len(self.values)
+        text = TAG_RE.sub(replace_tag, text)
+        text = DATA_URI_RE.sub(replace_data_uri, text)
+        added = list(self.values.values())[before:]
+        if added:
+            substituted_values_total.inc(len(added))
+            substituted_chars_total.inc(sum(len(v) for v in added))
+        return text
+
+    def restore(self, text: str) -> Tuple[str, Dict[str, int]]:
+        """
+        Put the original values back. Returns the restored text and a report counting
+        placeholders that came back, were dropped, or were mangled into unknown tokens.
+        Unknown tokens are left in place so the caller can see them.
+        """
+        seen = set()
+        unknown = 0
+
+        def replace(m: re.Match) -> str:
+            nonlocal unknown
+            value = self.values.get(m.group(0))
+            if value is None:
+                unknown += 1
+                return m.group(0)
+            seen.add(m.group(0))
+            return value
+
+        restored = TOKEN_RE.sub(replace, text or "")
+        report = {"substituted": len(self.values), "restored": len(seen), "missing": len(self.values) - len(seen), "unknown": unknown}
+        if report["missing"]:
+            placeholder_problems_total.inc(report["missing"], kind="missing")
+        if unknown:
+            placeholder_problems_total.inc(unknown, kind="unknown")
+            logger.warning(f"🔖 Model emitted {unknown} placeholders that match no substituted value; left as-is")
+        return restored, report
+
+    @property
+    def saved_chars(self) -> int:
+        return sum(len(v) - len(t) for t, v in self.values.items())
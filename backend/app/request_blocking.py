@@ -0,0 +1,315 @@
+# compiled request-blocking rules for the Playwright route handlers (host trie + one regex per resource type)
+
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Pattern, Tuple
+from urllib.parse import urlsplit
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+RULES_DIR = Path(__file__).resolve().parent / "rules"
+DEFAULT_RULESET = RULES_DIR / "default_blocklist.txt"
+
+# "all": every subrequest goes through the Python handler (exact resource-type policies).
+# "matched": only URLs the compiled rules could block are routed; the rest never leave the browser.
+ROUTE_MODE = os.getenv("REQUEST_BLOCKING_ROUTE", "all")
+
+# Rough transfer sizes used to estimate what blocking saved; the aborted response is never seen
+ESTIMATED_BYTES = {
+    "image": 40_000, "media": 500_000, "font": 35_000, "script": 30_000, "stylesheet": 20_000,
+    "xhr": 5_000, "fetch": 5_000, "websocket": 1_000, "eventsource": 1_000, "ping": 500, "document": 50_000,
+}
+DEFAULT_ESTIMATED_BYTES = 10_000
+
+# EasyList option names that differ from Playwright's resource types
+OPTION_TYPES = {
+    "xmlhttprequest": ("xhr", "fetch"),
+    "subdocument": ("document",),
+    "object": ("other",),
+    "other": ("other",),
+}
+# Used to pre-filter type-blocked resources in "matched" route mode, where Python never sees the resource type
+TYPE_EXTENSIONS = {
+    "image": "png|jpe?g|gif|webp|avif|svg|ico|bmp",
+    "font": "woff2?|ttf|otf|eot",
+    "media": "mp4|webm|ogg|mp3|m4a|wav|mov|m3u8",
+    "script": "m?js",
+    "stylesheet": "css",
+}
+SEPARATOR = r"(?:[^\w.%-]|$)"
+
+requests_blocked_total = metrics.counter("scrape_requests_blocked_total", "Subrequests aborted by the blocking rules, by resource type and reason")
+requests_allowed_total = metrics.counter("scrape_requests_allowed_total", "Subrequests the route handler let through")
+blocked_bytes_estimate_total = metrics.counter("scrape_blocked_bytes_estimate_total", "Estimated response bytes avoided by blocking")
+
+
+class Rule:
+    __slots__ = ("host", "pattern", "types", "exception")
+
+    def __init__(self, host: Optional[str], pattern: Optional[str], types: Optional[FrozenSet[str]], exception: bool):
+        self.host = host
+        self.pattern = pattern
+        self.types = types
+        self.exception = exception
+
+
+def _wildcard_to_regex(text: str) -> str:
+    """EasyList pattern syntax: * wildcard, ^ separator, leading/trailing | anchors."""
+    start = "^" if text.startswith("|") else ""
+    end = "$" if text.endswith("|") and len(text) > 1 else ""
+    text = text.strip("|")
+    body = "".join(".*" if ch == "*" else SEPARATOR if ch == "^" else re.escape(ch) for ch in text)
+    return start + body + end
+
+
+def parse_rule(line: str) -> Optional[Rule]:
+    line = line.strip()
+    if not line or line.startswith("!") or line.startswith("[") or line.startswith("%"):
+        return None
+    exception = line.startswith("@@")
+    if exception:
+        line = line[2:]
+
+    types = None
+    if "$" in line and not (line.startswith("/") and line.endswith("/")):
+        line, options = line.rsplit("$", 1)
+        names = set()
+        for option in options.split(","):
+            option = option.strip().lower()
+            names.update(OPTION_TYPES.get(option, (option,)))
+        types = frozenset(names)
+
+    if line.startswith("/") and line.endswith("/") and len(line) > 2:
+        return Rule(None, line[1:-1], types, exception)
+    if line.startswith("||"):
+        match = re.fullmatch(r"\|\|([\w.-]+)\^?", line)
+        if match:
+            return Rule(match.group(1).lower(), None, types, exception)
+        host_part = re.match(r"\|\|([\w.-]+)", line)
+        rest = line[host_part.end():] if host_part else line[2:]
+        host = re.escape(host_part.group(1).lower()) if host_part else ""
+        return Rule(None, r"^[a-z][a-z0-9+.-]*://(?:[^/?#]*\.)?" + host + _wildcard_to_regex(rest), types, exception)
+    return Rule(None, _wildcard_to_regex(line), types, exception)
+
+
+class HostTrie:
+    """Reversed-label trie: 'ads.example.com' is stored as com -> example -> ads."""
+
+    END = ""
+
+    def __init__(self):
+        self.root: Dict[str, dict] = {}
+
+    def add(self, host: str, types: Optional[FrozenSet[str]]) -> None:
+        node = self.root
+        for label in reversed(host.split(".")):
+            node = node.setdefault(label, {})
+        existing = node.get(self.END, frozenset())
+        # None means "every type" and absorbs any typed rule for the same host
+        node[self.END] = None if types is None or existing is None else existing | types
+
+    def match(self, host: str, resource_type: str) -> bool:
+        node = self.root
+        for label in reversed(host.split(".")):
+            node = node.get(label)
+            if node is None:
+                return False
+            if self.END in node:
+                types = node[self.END]
+                if types is None or resource_type in types:
+                    return True
+        return False
+
+    def hosts(self) -> List[str]:
+        found, stack = [], [(self.root, [])]
+        while stack:
+            node, labels = stack.pop()
+            for label, child in node.items():
+                if label == self.END:
+                    found.append(".".join(reversed(labels)))
+                else:
+                    stack.append((child, labels + [label]))
+        return found
+
+
+class BlockingStats:
+    """Per-scrape counters; `summary()` goes into the scrape's debug_info."""
+
+    def __init__(self):
+        self.blocked: Dict[str, int] = {}
+        self.allowed = 0
+        self.estimated_bytes_saved = 0
+        self._lock = threading.Lock()
+
+    def record(self, resource_type: str, reason: Optional[str]) -> None:
+        with self._lock:
+            if reason is None:
+                self.allowed += 1
+                requests_allowed_total.inc()
+                return
+            self.blocked[resource_type] = self.blocked.get(resource_type, 0) + 1
+            estimate = ESTIMATED_BYTES.get(resource_type, DEFAULT_ESTIMATED_BYTES)
+            self.estimated_bytes_saved += estimate
+        requests_blocked_total.inc(resource_type=resource_type, reason=reason)
+        blocked_bytes_estimate_total.inc(estimate)
+
+    def summary(self) -> dict:
+        return {
+            "blocked": sum(self.blocked.values()),
+            "blocked_by_type": dict(self.blocked),
+            "allowed": self.allowed,
+            "estimated_bytes_saved": self.estimated_bytes_saved,
+        }
+
+
+class RequestBlocker:
+    """
+    Rules compiled once: host rules into a trie, every pattern rule that applies to a given
+    resource type into one alternation regex (built lazily per type), exceptions likewise.
+    A decision is a dict lookup for the type policy, a walk of at most len(labels) trie nodes
+    and a single regex search.
+    """
+
+    def __init__(self, rules: List[Rule], type_policies: Dict[str, str], route_mode: str = ROUTE_MODE):
+        self.type_policies = type_policies
+        self.route_mode = route_mode
+        self._hosts = HostTrie()
+        self._exception_hosts = HostTrie()
+        self._patterns: List[Rule] = []
+        self._exception_patterns: List[Rule] = []
+        for rule in rules:
+            if rule.host:
+                (self._exception_hosts if rule.exception else self._hosts).add(rule.host, rule.types)
+            else:
+                (self._exception_patterns if rule.exception else self._patterns).append(rule)
+        self._regex_cache: Dict[Tuple[bool, str], Optional[Pattern]] = {}
+        self.rule_count = len(rules)
+
+    @classmethod
+    def from_text(cls, text: str, route_mode: str = ROUTE_MODE) -> "RequestBlocker":
+        rules, policies = [], {}
+        for number, line in enumerate(text.splitlines(), start=1):
+            stripped = line.strip()
+            if stripped.startswith("%type"):
+                parts = stripped.split()
+                if len(parts) == 3 and parts[2] in ("block", "allow"):
+                    policies[parts[1]] = parts[2]
+                else:
+                    logger.warning(f"🚫 Ignoring malformed policy on line {number}: {stripped}")
+                continue
+            try:
+                rule = parse_rule(line)
+                if rule and rule.pattern:
+                    re.compile(rule.pattern)
+            except re.error as e:
+                logger.warning(f"🚫 Ignoring invalid rule on line {number}: {stripped} ({e})")
+                continue
+            if rule:
+                rules.append(rule)
+        return cls(rules, policies, route_mode)
+
+    @classmethod
+    def from_files(cls, paths: List[Path], route_mode: str = ROUTE_MODE) -> "RequestBlocker":
+        return cls.from_text("\n".join(Path(p).read_text(encoding="utf-8") for p in paths), route_mode)
+
+    def _regex(self, resource_type: str, exception: bool) -> Optional[Pattern]:
+        key = (exception, resource_type)
+        if key not in self._regex_cache:
+            rules = self._exception_patterns if exception else self._patterns
+            parts = [r.pattern for r in rules if r.types is None or resource_type in r.types]
+            self._regex_cache[key] = re.compile("|".join(f"(?:{p})" for p in parts), re.IGNORECASE) if parts else None
+        return self._regex_cache[key]
+
+    def decide(self, url: str, resource_type: str) -> Optional[str]:
+        """Reason the request should be aborted ("type", "host" or "pattern"), or None to let it through."""
+        policy = self.type_policies.get(resource_type)
+        if policy == "block":
+            return "type"
+        if policy == "allow":
+            return None
+
+        host = (urlsplit(url).hostname or "").lower()
+        if host and self._hosts.match(host, resource_type):
+            reason = "host"
+        else:
+            regex = self._regex(resource_type, exception=False)
+            if regex is None or not regex.search(url):
+                return None
+            reason = "pattern"
+
+        if host and self._exception_hosts.match(host, resource_type):
+            return None
+        exceptions = self._regex(resource_type, exception=True)
+        if exceptions is not None and exceptions.search(url):
+            return None
+        return reason
+
+    def route_pattern(self, also_types: Iterable[str] = ()):
+        """
+        URL matcher for page.route(). In "matched" mode this is a regex Playwright hands to the
+        browser, so allowed requests are never paused for a Python round trip. It covers the
+        blocked hosts, every pattern rule and the file extensions of type-blocked resources;
+        a type-blocked request without a telltale extension gets through in this mode.
+        `also_types` adds the extensions of resource types another handler wants to see (the
+        subresource cache), with the same caveat.
+        """
+        if self.route_mode != "matched":
+            return "**/*"
+        parts = []
+        hosts = self._hosts.hosts()
+        if hosts:
+            alternation = "|".join(re.escape(h) for h in sorted(hosts))
+            parts.append(rf"^[a-z][a-z0-9+.-]*://(?:[^/?#]*\.)?(?:{alternation})(?::\d+)?(?:[/?#]|$)")
+        parts.extend(r.pattern for r in self._patterns)
+        routed_types = {t for t, p in self.type_policies.items() if p == "block"} | set(also_types)
+        extensions = "|".join(TYPE_EXTENSIONS[t] for t in sorted(routed_types) if t in TYPE_EXTENSIONS)
+        if extensions:
+            parts.append(rf"\.(?:{extensions})(?:[?#]|$)")
+        if not parts:
+            return re.compile(r"(?!)")
+        return re.compile("|".join(f"(?:{p})" for p in parts), re.IGNORECASE)
+
+    def sync_handler(self, stats: BlockingStats, on_allowed: Optional[Callable] = None):
+        """Route handler; allowed requests go to `on_allowed(route, request)` when given, else continue."""
+        def route_handler(route, request):
+            reason = self.decide(request.url, request.resource_type)
+            stats.record(request.resource_type, reason)
+            if reason:
+                route.abort()
+            elif on_allowed is not None:
+                on_allowed(route, request)
+            else:
+                route.continue_()
+        return route_handler
+
+    def async_handler(self, stats: BlockingStats, on_allowed: Optional[Callable] = None):
+        async def route_handler(route, request):
+            reason = self.decide(request.url, request.resource_type)
+            stats.record(request.resource_type, reason)
+            if reason:
+                await route.abort()
+            elif on_allowed is not None:
+                await on_allowed(route, request)
+            else:
+                await route.continue_()
+        return route_handler
+
+
+_blocker: Optional[RequestBlocker] = None
+_blocker_lock = threading.Lock()
+
+
+def get_request_blocker() -> RequestBlocker:
+    """Shared blocker compiled from the default ruleset plus any files in REQUEST_BLOCKLIST (comma separated)."""
+    global _blocker
+    with _blocker_lock:
+        if _blocker is None:
+            paths = [DEFAULT_RULESET] + [Path(p.strip()) for p in os.getenv("REQUEST_BLOCKLIST", "").split(",") if p.strip()]
+            _blocker = RequestBlocker.from_files(paths)
+            logger.info(f"🚫 Compiled {_blocker.rule_count} blocking rules from {len(paths)} file(s), route mode '{_blocker.route_mode}'")
+        return _blocker
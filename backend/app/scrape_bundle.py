@@ -0,0 +1,57 @@
+# scrape bundles: head, body, CSS and debug info of a scrape in one gzipped JSON file with a content hash
+
+import gzip
+import hashlib
+import json
+from pathlib import Path
+from typing import Optional, Tuple
+
+BUNDLE_VERSION = 1
+BUNDLE_SUFFIX = ".bundle.json.gz"
+CONTENT_KEYS = ("url", "head", "body", "css", "image_sizes")
+
+
+class BundleError(ValueError):
+    pass
+
+
+def bundle_path_for(raw_html_path: Path) -> Path:
+    """cloned_sites/<timestamp>_<urlhash>_raw.html -> cloned_sites/<timestamp>_<urlhash>_raw.bundle.json.gz"""
+    raw_html_path = Path(raw_html_path)
+    return raw_html_path.with_name(raw_html_path.stem + BUNDLE_SUFFIX)
+
+
+def content_hash(bundle: dict) -> str:
+    """SHA-256 over the scraped content (not debug info), stable across key order."""
+    content = {key: bundle.get(key) for key in CONTENT_KEYS}
+    return hashlib.sha256(json.dumps(content, sort_keys=True, ensure_ascii=False, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def write_bundle(path: Path, design_context: dict) -> Tuple[Path, str]:
+    """Write the design context as a bundle; returns (path, content hash)."""
+    bundle = {key: design_context.get(key) or ("" if key != "image_sizes" else {}) for key in CONTENT_KEYS}
+    bundle["debug_info"] = design_context.get("debug_info") or {}
+    digest = content_hash(bundle)
+    payload = json.dumps({"version": BUNDLE_VERSION, "sha256": digest, **bundle}, ensure_ascii=False, separators=(",", ":"))
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    # Level 6: most of the size win of 9 at a fraction of the CPU on multi-MB documents
+    with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+        f.write(payload)
+    tmp.replace(path)
+    return path, digest
+
+
+def read_bundle(path: Path, expected_hash: Optional[str] = None) -> dict:
+    """Load a bundle and verify its hash (against `expected_hash` too when given)."""
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            bundle = json.load(f)
+    except (OSError, ValueError) as e:
+        raise BundleError(f"Unreadable scrape bundle {Path(path).name}: {e}")
+    if bundle.get("version") != BUNDLE_VERSION:
+        raise BundleError(f"Unsupported scrape bundle version {bundle.get('version')} in {Path(path).name}")
+    digest = content_hash(bundle)
+    if digest != bundle.get("sha256") or (expected_hash and digest != expected_hash):
+        raise BundleError(f"Scrape bundle {Path(path).name} does not match its hash")
+    return bundle
@@ -0,0 +1,277 @@
+# pool of scraper worker processes: Chromium, parsing and image encoding run outside the API process
+
+import asyncio
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from fastapi import HTTPException
+
+import metrics
+import tracing
+
+try:
+    import psutil  # optional: lets memory recycling count the Chromium child processes too
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+POOL_SIZE = int(os.getenv("SCRAPE_WORKERS", "0"))  # 0 = scrape in a thread of the API process
+MAX_RSS_MB = float(os.getenv("SCRAPE_WORKER_MAX_RSS_MB", "1500"))
+MAX_JOBS = int(os.getenv("SCRAPE_WORKER_MAX_JOBS", "50"))
+JOB_TIMEOUT = float(os.getenv("SCRAPE_WORKER_TIMEOUT_S", "120"))
+HEALTH_INTERVAL = float(os.getenv("SCRAPE_WORKER_HEALTH_INTERVAL_S", "15"))
+# "module:function" run in the worker; benchmarks and tests point this at stubs
+SCRAPE_TARGET = "scraper_sync:fetch_design_context_sync"
+RESULTS_DIR = Path(os.getenv("SCRAPE_WORKER_RESULTS_DIR", str(Path(tempfile.gettempdir()) / "scrape_worker_results")))
+
+worker_restarts_total = metrics.counter("scrape_worker_restarts_total", "Scraper worker processes replaced, by reason")
+worker_jobs_total = metrics.counter("scrape_worker_jobs_total", "Scrape jobs run in worker processes, by outcome")
+workers_busy = metrics.gauge("scrape_workers_busy", "Scraper worker processes currently running a job")
+worker_rss_bytes = metrics.gauge("scrape_worker_rss_bytes", "Resident memory of each worker (with its browser when psutil is installed)")
+
+
+def _rss_bytes() -> int:
+    """Current RSS of this process, plus its children (Chromium) when psutil is available."""
+    if psutil is not None:
+        me = psutil.Process()
+        total = me.memory_info().rss
+        for child in me.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _worker_main(conn, results_dir: str, target: str) -> None:
+    """
+    Worker process loop. Jobs arrive over the pipe; the (multi-MB) design context is written to a
+    JSON file and only its path travels back, so the API process never unpickles large strings.
+    """
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s - worker {os.getpid()} - %(levelname)s - %(message)s")
+    module_name, func_name = target.split(":")
+    fetch_design_context = getattr(importlib.import_module(module_name), func_name)
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        kind = message.get("kind")
+        if kind == "stop":
+            return
+        if kind == "ping":
+            conn.send({"ok": True, "rss": _rss_bytes()})
+            continue
+
+        try:
+            with tracing.trace(message.get("trace_id")):
+                design_context = fetch_design_context(message["url"], har_mode=message.get("har_mode"))
+            path = Path(results_dir) / f"{message['job_id']}.json"
+            tmp = path.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(design_context, f)
+            os.replace(tmp, path)
+            reply = {"ok": True, "path": str(path)}
+        except HTTPException as e:
+            reply = {"ok": False, "status_code": e.status_code, "error": e.detail}
+        except Exception as e:
+            reply = {"ok": False, "status_code": 500, "error": f"{type(e).__name__}: {e}"}
+        reply["rss"] = _rss_bytes()
+        conn.send(reply)
+
+
+class WorkerCrashed(Exception):
+    pass
+
+
+class Worker:
+    def __init__(self, ctx, results_dir: Path, target: str):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, str(results_dir), target), daemon=True, name="scrape-worker")
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+        self.rss = 0
+        self.started_at = time.time()
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid
+
+    def call(self, message: dict, timeout: float) -> dict:
+        """Blocking round trip; run it in a thread."""
+        try:
+            self.conn.send(message)
+            answered = self.conn.poll(timeout)
+            reply = self.conn.recv() if answered else None
+        except (EOFError, OSError) as e:
+            raise WorkerCrashed(f"worker {self.pid} exited (code {self.process.exitcode}): {e}")
+        if not answered:
+            raise TimeoutError(f"worker {self.pid} did not answer within {timeout:.0f}s")
+        self.rss = reply.get("rss", self.rss)
+        worker_rss_bytes.set(self.rss, worker=str(self.pid))
+        return reply
+
+    def stop(self, graceful: bool = True) -> None:
+        if graceful and self.process.is_alive():
+            try:
+                self.conn.send({"kind": "stop"})
+            except OSError:
+                pass
+            self.process.join(timeout=5)
+        if self.process.is_alive():
+            # Killing the worker also takes its Chromium down with it (daemonic children, closed pipes)
+            self.process.kill()
+            self.process.join(timeout=5)
+        self.conn.close()
+        worker_rss_bytes.set(0, worker=str(self.pid))
+
+
+class ScrapeWorkerPool:
+    """
+    Fixed-size pool of scraper processes. Each job borrows an idle worker; a worker that crashes,
+    times out or has its job cancelled is killed and replaced without affecting the others, and
+    one that grows past `max_rss_mb` or has served `max_jobs` scrapes is retired after its job. Idle workers are
+    pinged every `health_interval` seconds and replaced when they stop answering.
+    """
+
+    def __init__(self, size: int = POOL_SIZE, max_rss_mb: float = MAX_RSS_MB, max_jobs: int = MAX_JOBS,
+                 job_timeout: float = JOB_TIMEOUT, health_interval: float = HEALTH_INTERVAL, results_dir: Path = RESULTS_DIR,
+                 target: str = SCRAPE_TARGET):
+        self.size = size
+        self.max_rss = max_rss_mb * 1024 * 1024
+        self.max_jobs = max_jobs
+        self.job_timeout = job_timeout
+        self.health_interval = health_interval
+        self.results_dir = Path(results_dir)
+        self.target = target
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: Optional[asyncio.Queue] = None
+        self._workers: List[Worker] = []
+        self._health_task: Optional[asyncio.Task] = None
+        self._replacing: Set[asyncio.Task] = set()
+        self._busy = 0
+
+    async def start(self) -> None:
+        self.results_dir.mkdir(parents=True, exist_ok=True)
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            worker = await asyncio.to_thread(Worker, self._ctx, self.results_dir, self.target)
+            self._workers.append(worker)
+            self._idle.put_nowait(worker)
+        self._health_task = asyncio.create_task(self._health_loop())
+        logger.info(f"🏭 Started {self.size} scraper worker processes (max RSS {self.max_rss / 2**20:.0f} MB, max {self.max_jobs} jobs each)")
+
+    async def stop(self) -> None:
+        if self._health_task:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+        await asyncio.gather(*self._replacing, return_exceptions=True)
+        await asyncio.gather(*(asyncio.to_thread(w.stop) for w in self._workers))
+        self._workers.clear()
+
+    async def _replace(self, worker: Worker, reason: str) -> Worker:
+        worker_restarts_total.inc(reason=reason)
+        logger.warning(f"🏭 Replacing scraper worker {worker.pid} ({reason}, {worker.jobs} jobs, {worker.rss / 2**20:.0f} MB)")
+        await asyncio.to_thread(worker.stop, reason == "recycle")
+        replacement = await asyncio.to_thread(Worker, self._ctx, self.results_dir, self.target)
+        self._workers = [replacement if w is worker else w for w in self._workers]
+        return replacement
+
+    async def _replace_into_pool(self, worker: Worker, reason: str) -> None:
+        self._idle.put_nowait(await self._replace(worker, reason))
+
+    async def scrape(self, url: str, har_mode: Optional[str] = None) -> dict:
+        """Run one scrape in a worker and return its design context; raises HTTPException on failure."""
+        job_id = uuid.uuid4().hex
+        message = {"kind": "scrape", "job_id": job_id, "url": url, "har_mode": har_mode, "trace_id": tracing.current_trace_id()}
+        worker: Optional[Worker] = None
+        try:
+            worker = await self._idle.get()
+            self._busy += 1
+            workers_busy.set(self._busy)
+            try:
+                reply = await asyncio.to_thread(worker.call, message, self.job_timeout)
+            finally:
+                self._busy -= 1
+                workers_busy.set(self._busy)
+        except asyncio.CancelledError:
+            if worker is not None:
+                # The thread is still waiting on this worker's pipe, so the next job on it could read
+                # this job's reply. Replaced in the background; the cancelled caller does not wait.
+                worker_jobs_total.inc(outcome="cancelled")
+                task = asyncio.create_task(self._replace_into_pool(worker, "cancelled"))
+                self._replacing.add(task)
+                task.add_done_callback(self._replacing.discard)
+                worker = None
+            raise
+        except TimeoutError as e:
+            worker_jobs_total.inc(outcome="timeout")
+            worker = await self._replace(worker, "timeout")
+            raise HTTPException(status_code=504, detail=f"Scrape timed out: {e}")
+        except WorkerCrashed as e:
+            worker_jobs_total.inc(outcome="crash")
+            worker = await self._replace(worker, "crash")
+            raise HTTPException(status_code=502, detail=f"Scraper worker crashed: {e}")
+        else:
+            worker.jobs += 1
+            if worker.rss > self.max_rss or worker.jobs >= self.max_jobs:
+                worker = await self._replace(worker, "recycle")
+        finally:
+            if worker is not None:
+                self._idle.put_nowait(worker)
+
+        if not reply["ok"]:
+            worker_jobs_total.inc(outcome="error")
+            raise HTTPException(status_code=reply.get("status_code", 500), detail=reply["error"])
+        worker_jobs_total.inc(outcome="ok")
+        return await asyncio.to_thread(_load_result, Path(reply["path"]))
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_interval)
+            # Only idle workers are checked; a busy one is proven alive by its job finishing
+            for _ in range(self._idle.qsize()):
+                worker = self._idle.get_nowait()
+                try:
+                    await asyncio.to_thread(worker.call, {"kind": "ping"}, 5.0)
+                    if worker.rss > self.max_rss:
+                        worker = await self._replace(worker, "recycle")
+                except (TimeoutError, WorkerCrashed):
+                    worker = await self._replace(worker, "health_check")
+                self._idle.put_nowait(worker)
+
+    def status(self) -> dict:
+        return {
+            "size": self.size,
+            "busy": self._busy,
+            "workers": [
+                {"pid": w.pid, "alive": w.process.is_alive(), "jobs": w.jobs, "rss_mb": round(w.rss / 2**20, 1), "uptime_s": round(time.time() - w.started_at)}
+                for w in self._workers
+            ],
+        }
+
+
+def _load_result(path: Path) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        path.unlink(missing_ok=True)
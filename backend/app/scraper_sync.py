@@ -1,17 +1,23 @@
 import re
 import httpx
-from bs4 import BeautifulSoup
-from playwright.sync_api import sync_playwright
 from fastapi import HTTPException
+from typing import Dict, List, Optional
 from urllib.parse import urlparse, urljoin
 
 from utils import to_data_uri, resolve_url
+from tracing import span
+from image_optimizer import RENDERED_SIZES_JS, optimize_image
+from style_snapshot import STYLE_MODE, snapshot_sync
+from request_blocking import BlockingStats, get_request_blocker
+from subresource_cache import CACHEABLE_TYPES, CacheStats, get_subresource_cache
+from har_archive import FAST_REPLAY_SETTLE_MS, HAR_MODE, HarReplayer, har_path_for, record_options
 
 PLAYWRIGHT_USER_AGENT = (
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36"
 )
 
 def resolve_urls_in_html(html: str, base_url: str) -> str:
+    from bs4 import BeautifulSoup  # deferred: not needed to start the API
     soup = BeautifulSoup(html, "html.parser")
 
     # Tags with `src` or `href` to fix
@@ -30,104 +36,130 @@ def is_valid_url(url: str) -> bool:
     parsed = urlparse(url)
     return parsed.scheme in ("http", "https") and bool(parsed.netloc)
 
-def extract_dom_structure(soup):
+def extract_dom_structure(soup) -> "CompactDOM":
     """
-    Extract the complete DOM structure with all nested elements
+    Snapshot of the complete DOM as a CompactDOM (flat arrays, built iteratively);
+    .to_dict() gives the nested dict form
     """
-    def element_to_dict(element):
-        if element.name is None:  # Text node
-            text = element.strip()
-            return {"type": "text", "content": text} if text else None
-        
-        result = {
-            "type": "element",
-            "tag": element.name,
-            "attributes": dict(element.attrs) if element.attrs else {},
-            "children": []
-        }
-        
-        for child in element.children:
-            child_dict = element_to_dict(child)
-            if child_dict:
-                result["children"].append(child_dict)
-        
-        return result
-    
-    return element_to_dict(soup)
-
-def fetch_with_playwright_sync(url: str, timeout: float = 30000) -> dict:
-    print(f"🚀 Starting Playwright scrape for: {url}")
+    from compact_dom import CompactDOM  # deferred with bs4, which it is built on
+
+    return CompactDOM.from_soup(soup)
+
+def fetch_with_playwright_sync(url: str, timeout: float = 30000, har_mode: Optional[str] = None, har_path: Optional[str] = None) -> dict:
+    """
+    har_mode "record" saves every response of this scrape to a HAR archive (har_path, default
+    har/<host>_<hash>.har); "replay" serves the page from that archive without any network.
+    Defaults to SCRAPE_HAR_MODE.
+    """
+    har_mode = har_mode or HAR_MODE
+    har_file = har_path or har_path_for(url)
+    print(f"🚀 Starting Playwright scrape for: {url}" + (f" (HAR {har_mode}: {har_file})" if har_mode != "off" else ""))
 
     try:
+        from playwright.sync_api import sync_playwright  # deferred: Playwright is the slowest import of the app
         with sync_playwright() as p:
-            browser = p.chromium.launch(
-                headless=True,
-                args=[
-                    '--no-sandbox',
-                    '--disable-setuid-sandbox',
-                    '--disable-dev-shm-usage',
-                    '--disable-web-security',
-                    '--disable-features=VizDisplayCompositor'
-                ]
-            )
-            context = browser.new_context(
-                user_agent=PLAYWRIGHT_USER_AGENT,
-                viewport={'width': 1920, 'height': 1080}
-            )
-            page = context.new_page()
-
-            # Route handler to block unnecessary resources
-            def route_handler(route, request):
-                if request.resource_type in ["image", "font", "media"]:
-                    route.abort()
-                    return
-
-                if any(domain in request.url for domain in ["githubgithubassets.com", "analytics", "tracking"]):
-                    route.abort()
-                    return
-
-                route.continue_()
-
-            page.route("**/*", route_handler)
+            with span("playwright.launch"):
+                browser = p.chromium.launch(
+                    headless=True,
+                    args=[
+                        '--no-sandbox',
+                        '--disable-setuid-sandbox',
+                        '--disable-dev-shm-usage',
+                        '--disable-web-security',
+                        '--disable-features=VizDisplayCompositor'
+                    ]
+                )
+                context = browser.new_context(
+                    user_agent=PLAYWRIGHT_USER_AGENT,
+                    viewport={'width': 1920, 'height': 1080},
+                    **(record_options(har_file) if har_mode == "record" else {})
+                )
+                page = context.new_page()
+
+            # Block trackers, ads and resources the clone never uses (rules/default_blocklist.txt),
+            # and serve the allowed JS/CSS/fonts from the on-disk cache when an earlier scrape fetched them
+            # In HAR replay the archive answers every request instead
+            blocker = get_request_blocker()
+            blocking_stats = BlockingStats()
+            # Recording bypasses the cache so the archive holds what the network really returned
+            cache = get_subresource_cache() if har_mode == "off" else None
+            cache_stats = CacheStats()
+            replayer = HarReplayer(har_file) if har_mode == "replay" else None
+            if replayer:
+                page.route("**/*", replayer.sync_handler(page))
+            elif cache:
+                serve_cached = lambda route, request: cache.handle_sync(route, request, cache_stats)
+                page.route(blocker.route_pattern(also_types=CACHEABLE_TYPES), blocker.sync_handler(blocking_stats, on_allowed=serve_cached))
+            else:
+                page.route(blocker.route_pattern(), blocker.sync_handler(blocking_stats))
 
             print("📡 Navigating to URL...")
-            page.goto(url, wait_until="networkidle", timeout=timeout)
+            with span("playwright.goto"):
+                page.goto(url, wait_until="networkidle", timeout=timeout)
 
             print("⏳ Waiting for dynamic content...")
-            page.wait_for_timeout(8000)
+            with span("playwright.settle"):
+                page.wait_for_timeout(FAST_REPLAY_SETTLE_MS if replayer and replayer.timing == "fast" else 8000)
+
+            snapshot = None
+            if STYLE_MODE != "stylesheets":
+                # Must run before page.content(): it adds the cs-N classes the snapshot CSS targets
+                print("🎨 Snapshotting computed styles...")
+                with span("css.snapshot") as snapshot_span:
+                    snapshot = snapshot_sync(page)
+                    snapshot_span.set_attribute("classes", snapshot["stats"]["classes"])
+                    snapshot_span.set_attribute("css_length", snapshot["stats"]["css_length"])
 
             print("📄 Extracting page content...")
-            full_html = page.content()
-
-            soup = BeautifulSoup(full_html, 'html.parser')
-            head_html = str(soup.find('head')) or ""
-            body_element = soup.find('body')
-            body_html = str(body_element) if body_element else ""
-
-            print("🎨 Extracting CSS...")
-            styles = page.eval_on_selector_all(
-                "style, link[rel='stylesheet']",
-                """
-                async (elements) => {
-                    const cssTexts = [];
-                    for (const el of elements) {
-                        if (el.tagName === 'STYLE') {
-                            cssTexts.push(el.innerHTML);
-                        } else if (el.tagName === 'LINK' && el.href) {
-                            try {
-                                const res = await fetch(el.href);
-                                if (res.ok) {
-                                    const text = await res.text();
-                                    cssTexts.push(text);
+            with span("playwright.content"):
+                full_html = page.content()
+
+            with span("html.parse", html_length=len(full_html)):
+                from bs4 import BeautifulSoup
+                soup = BeautifulSoup(full_html, 'html.parser')
+                head_html = str(soup.find('head')) or ""
+                body_element = soup.find('body')
+                body_html = str(body_element) if body_element else ""
+
+            critical_css = ""
+            if STYLE_MODE != "computed":
+                print("🎨 Extracting CSS...")
+                with span("css.extract") as css_span:
+                    styles = page.eval_on_selector_all(
+                        "style, link[rel='stylesheet']",
+                        """
+                        async (elements) => {
+                            const cssTexts = [];
+                            for (const el of elements) {
+                                if (el.tagName === 'STYLE') {
+                                    cssTexts.push(el.innerHTML);
+                                } else if (el.tagName === 'LINK' && el.href) {
+                                    try {
+                                        const res = await fetch(el.href);
+                                        if (res.ok) {
+                                            const text = await res.text();
+                                            cssTexts.push(text);
+                                        }
+                                    } catch (_) {}
                                 }
-                            } catch (_) {}
+                            }
+                            return cssTexts;
                         }
-                    }
-                    return cssTexts;
-                }
-                """
-            )
-            critical_css = "\n".join(styles)
+                        """
+                    )
+                    critical_css = "\n".join(styles)
+                    css_span.set_attribute("css_length", len(critical_css))
+            if snapshot is not None:
+                critical_css = snapshot["css"] + ("\n" + critical_css if critical_css else "")
+
+            with span("images.layout"):
+                image_sizes = page.evaluate(RENDERED_SIZES_JS)
+
+            blocked = blocking_stats.summary()
+            print(f"🚫 Blocked {blocked['blocked']} subrequests (~{blocked['estimated_bytes_saved'] // 1024} KB avoided)")
+            if cache:
+                cached = cache_stats.summary()
+                print(f"📦 Subresource cache: {cached['hits']} hits, {cached['misses']} misses, {cached['bytes_served'] // 1024} KB served locally")
 
             context.close()
             browser.close()
@@ -136,11 +168,16 @@ def fetch_with_playwright_sync(url: str, timeout: float = 30000) -> dict:
                 "head": head_html,
                 "body": body_html,
                 "critical_css": critical_css,
+                "image_sizes": image_sizes,
                 "debug_info": {
                     "full_html_length": len(full_html),
                     "head_length": len(head_html),
                     "body_length": len(body_html),
                     "css_length": len(critical_css),
+                    "style_snapshot": snapshot["stats"] if snapshot else None,
+                    "request_blocking": blocking_stats.summary(),
+                    "subresource_cache": cache_stats.summary(),
+                    "har": {"mode": har_mode, "path": str(har_file), **(replayer.summary() if replayer else {})} if har_mode != "off" else None,
                 }
             }
 
@@ -148,16 +185,22 @@ def fetch_with_playwright_sync(url: str, timeout: float = 30000) -> dict:
         print(f"❌ Playwright Sync Error: {e}")
         raise HTTPException(status_code=400, detail=f"Playwright Sync Error: {e}")
 
-def inline_images_sync(html: str, base_url: str) -> str:
+def inline_images_sync(html: str, base_url: str, rendered_sizes: Optional[Dict[str, List[int]]] = None,
+                       report: Optional[List[dict]] = None) -> str:
     """
-    For each <img src="…"> in `html`, fetch and replace with Base64 data URI.
+    For each <img src="…"> in `html`, fetch, optimize (image_optimizer) and replace with a Base64 data URI.
+    `rendered_sizes` maps image URLs to their rendered [width, height] (the scrape's "image_sizes");
+    per-image savings are appended to `report` when given.
     """
     print("🖼️  Starting image inlining...")
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(html, "html.parser")
     img_tags = soup.find_all("img", src=True)
     print(f"Found {len(img_tags)} images to process")
 
     headers = {"User-Agent": PLAYWRIGHT_USER_AGENT}
+    rendered_sizes = rendered_sizes or {}
+    bytes_in = bytes_out = 0
 
     for i, tag in enumerate(img_tags):
         raw_src = tag["src"]
@@ -169,32 +212,49 @@ def inline_images_sync(html: str, base_url: str) -> str:
 
         try:
             print(f"Processing image {i+1}/{len(img_tags)}: {abs_url[:100]}...")
-            resp = httpx.get(abs_url, timeout=15.0, follow_redirects=True, headers=headers)
-            resp.raise_for_status()
+            with span("image.fetch", url=abs_url[:200]):
+                resp = httpx.get(abs_url, timeout=15.0, follow_redirects=True, headers=headers)
+                resp.raise_for_status()
             content_type = resp.headers.get("Content-Type", "application/octet-stream")
-            data_uri = to_data_uri(content_type, resp.content)
+            rendered = rendered_sizes.get(abs_url) or rendered_sizes.get(raw_src)
+            with span("image.optimize", bytes=len(resp.content)) as optimize_span:
+                content_type, data, image_report = optimize_image(resp.content, content_type, tuple(rendered) if rendered else None)
+                optimize_span.set_attribute("action", image_report["action"])
+                optimize_span.set_attribute("saved_bytes", image_report["saved_bytes"])
+            with span("image.base64", bytes=len(data)):
+                data_uri = to_data_uri(content_type, data)
             tag["src"] = data_uri
-            print(f"✅ Successfully inlined image {i+1}")
+            if image_report["action"] in ("transcoded", "placeholder"):
+                # The original srcset candidates would be fetched from the network instead of the inlined image
+                tag.attrs.pop("srcset", None)
+            bytes_in += image_report["original_bytes"]
+            bytes_out += image_report["bytes"]
+            if report is not None:
+                report.append({"url": abs_url, **image_report})
+            print(f"✅ Successfully inlined image {i+1} ({image_report['action']}, {image_report['original_bytes'] // 1024} KB -> {image_report['bytes'] // 1024} KB)")
         except Exception as e:
             print(f"❌ Skipping image {abs_url} due to error: {e}")
 
-    print("🖼️  Image inlining completed!")
+    print(f"🖼️  Image inlining completed! {bytes_in // 1024} KB fetched, {bytes_out // 1024} KB inlined")
     return str(soup)
 
-def fetch_design_context_sync(url: str) -> dict:
+def fetch_design_context_sync(url: str, har_mode: Optional[str] = None, har_path: Optional[str] = None) -> dict:
     if not is_valid_url(url):
         raise HTTPException(status_code=400, detail=f"Invalid URL: {url}")
 
-    data = fetch_with_playwright_sync(url)
+    with span("playwright.scrape", url=url):
+        data = fetch_with_playwright_sync(url, har_mode=har_mode, har_path=har_path)
 
     # Ensure all relative URLs in <head> and <body> are made absolute
-    resolved_head = resolve_urls_in_html(data["head"], url)
-    resolved_body = resolve_urls_in_html(data["body"], url)
+    with span("html.resolve_urls"):
+        resolved_head = resolve_urls_in_html(data["head"], url)
+        resolved_body = resolve_urls_in_html(data["body"], url)
 
     return {
         "head": resolved_head,
         "body": resolved_body,
         "css": data["critical_css"],
+        "image_sizes": data.get("image_sizes", {}),
         "debug_info": data["debug_info"],
         "url": url
     }
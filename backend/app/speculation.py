@@ -0,0 +1,141 @@
+# speculative generation: start the default model as soon as a scrape is saved, so /api/generate finds it running or done
+
+import asyncio
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import metrics
+from admission import AdmissionGate
+from models import CloneRequest
+
+logger = logging.getLogger(__name__)
+
+SPECULATIVE_GENERATION = os.getenv("SPECULATIVE_GENERATION", "0") == "1"
+SPECULATIVE_MODEL = os.getenv("SPECULATIVE_MODEL", CloneRequest.model_fields["model"].default)
+# Wall-clock budget of one speculative generation; it is cancelled past this
+BUDGET_S = float(os.getenv("SPECULATIVE_BUDGET_S", "240"))
+# A result nobody claimed within this long is dropped (and a still-running task cancelled)
+TTL_S = float(os.getenv("SPECULATIVE_TTL_S", "600"))
+MAX_INFLIGHT = int(os.getenv("SPECULATIVE_MAX_INFLIGHT", "1"))
+
+speculations_total = metrics.counter("speculative_generations_total", "Speculative generations by outcome: started, skipped, used, joined, wasted, failed")
+saved_seconds = metrics.histogram("speculative_generation_saved_seconds", "Generation time already spent when /api/generate claimed a speculation",
+                                  buckets=(1, 5, 10, 30, 60, 120, 300))
+
+
+class Speculation:
+    def __init__(self, key: Tuple[str, str], task: "asyncio.Task[str]"):
+        self.key = key
+        self.task = task
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+        self.expiry: Optional[asyncio.TimerHandle] = None
+
+
+class GenerationCache:
+    """
+    Generations keyed by (raw artifact, model), each claimed at most once. A speculative task
+    holds a slot in the model's admission gate while it runs, so a request that joins it must not
+    take a second one (see `pending`). Only started while the gate has a free slot and nobody is
+    queued: speculation never makes a real request wait.
+    """
+
+    def __init__(self, budget_s: float = BUDGET_S, ttl_s: float = TTL_S, max_inflight: int = MAX_INFLIGHT):
+        self.budget_s = budget_s
+        self.ttl_s = ttl_s
+        self.max_inflight = max_inflight
+        self._entries: Dict[Tuple[str, str], Speculation] = {}
+
+    @staticmethod
+    def key_for(raw_html_path: str, model_id: str) -> Tuple[str, str]:
+        return str(Path(raw_html_path).resolve()), model_id
+
+    def inflight(self) -> int:
+        return sum(1 for e in self._entries.values() if not e.task.done())
+
+    def start(self, raw_html_path: str, model_id: str, generate: Callable[[], Awaitable[str]], gate: AdmissionGate) -> bool:
+        """Start generating in the background; returns whether a speculation was started."""
+        key = self.key_for(raw_html_path, model_id)
+        busy = gate.active >= gate.max_concurrent or gate.queued > 0
+        if key in self._entries or busy or self.inflight() >= self.max_inflight:
+            speculations_total.inc(outcome="skipped")
+            return False
+        entry = Speculation(key, asyncio.create_task(self._run(generate, gate)))
+        entry.task.add_done_callback(lambda task: self._finished(entry, task))
+        entry.expiry = asyncio.get_running_loop().call_later(self.ttl_s, self._expire, key)
+        self._entries[key] = entry
+        speculations_total.inc(outcome="started")
+        logger.info(f"🔮 Speculatively generating {Path(raw_html_path).name} with {model_id}")
+        return True
+
+    async def _run(self, generate: Callable[[], Awaitable[str]], gate: AdmissionGate) -> str:
+        async with gate.admit():
+            return await asyncio.wait_for(generate(), timeout=self.budget_s)
+
+    def _finished(self, entry: Speculation, task: "asyncio.Task[str]") -> None:
+        entry.finished = time.monotonic()
+        if task.cancelled() or task.exception() is None:
+            return
+        # Dropped right away, so the follow-up request generates (and is admitted) normally
+        logger.warning(f"🔮 Speculative generation of {Path(entry.key[0]).name} failed: {task.exception()!r}")
+        if self._entries.get(entry.key) is entry:
+            self._drop(entry.key, "failed")
+
+    def pending(self, raw_html_path: str, model_id: str) -> bool:
+        """A claimable speculation exists for this artifact and model."""
+        return self.key_for(raw_html_path, model_id) in self._entries
+
+    def claim(self, raw_html_path: str, model_id: str) -> Optional[Tuple["asyncio.Task[str]", str]]:
+        """
+        Take the speculation for this artifact and model: (task, "used" if already done else
+        "joined"), or None. Speculations for the same artifact with another model are cancelled.
+        """
+        key = self.key_for(raw_html_path, model_id)
+        for other in [k for k in self._entries if k[0] == key[0] and k != key]:
+            self._drop(other, "wasted")
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        entry.expiry.cancel()
+        outcome = "used" if entry.task.done() else "joined"
+        speculations_total.inc(outcome=outcome)
+        saved_seconds.observe((entry.finished or time.monotonic()) - entry.started)
+        return entry.task, outcome
+
+    def _drop(self, key: Tuple[str, str], outcome: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        entry.expiry.cancel()
+        entry.task.cancel()
+        speculations_total.inc(outcome=outcome)
+
+    def _expire(self, key: Tuple[str, str]) -> None:
+        logger.info(f"🔮 Speculative generation of {Path(key[0]).name} expired unclaimed")
+        self._drop(key, "wasted")
+
+    def clear(self) -> None:
+        for key in list(self._entries):
+            self._drop(key, "wasted")
+
+    def status(self) -> dict:
+        return {
+            "enabled": SPECULATIVE_GENERATION,
+            "model": SPECULATIVE_MODEL,
+            "entries": len(self._entries),
+            "inflight": self.inflight(),
+            "max_inflight": self.max_inflight,
+        }
+
+
+_cache: Optional[GenerationCache] = None
+
+
+def get_generation_cache() -> GenerationCache:
+    global _cache
+    if _cache is None:
+        _cache = GenerationCache()
+    return _cache
@@ -0,0 +1,127 @@
+# computed-style snapshot: one page.evaluate collects non-default styles of visible elements, interned into generated classes
+
+import os
+from typing import Dict, List
+
+import metrics
+
+# stylesheets: the page's CSS as written; computed: only the snapshot; both: snapshot followed by the stylesheets
+STYLE_MODE = os.getenv("SCRAPE_STYLE_MODE", "stylesheets")
+MAX_ELEMENTS = int(os.getenv("STYLE_SNAPSHOT_MAX_ELEMENTS", "6000"))
+CLASS_PREFIX = "cs-"
+
+# Properties worth replicating; width/height are left out because computed values are always
+# resolved pixels and would pin every box to the 1920px viewport the scrape ran at
+PROPERTIES = [
+    "display", "position", "top", "right", "bottom", "left", "z-index", "float", "box-sizing",
+    "flex-direction", "flex-wrap", "justify-content", "align-items", "align-self", "align-content",
+    "flex-grow", "flex-shrink", "flex-basis", "order", "gap",
+    "grid-template-columns", "grid-template-rows", "grid-column", "grid-row",
+    "margin-top", "margin-right", "margin-bottom", "margin-left",
+    "padding-top", "padding-right", "padding-bottom", "padding-left",
+    "max-width", "min-height", "overflow-x", "overflow-y",
+    "border-top", "border-right", "border-bottom", "border-left", "border-radius", "box-shadow",
+    "background-color", "background-image", "background-size", "background-position", "background-repeat",
+    "color", "font-family", "font-size", "font-weight", "font-style", "line-height", "letter-spacing",
+    "text-align", "text-decoration-line", "text-transform", "white-space", "list-style-type",
+    "opacity", "object-fit", "transform", "cursor", "visibility",
+]
+# Compared with the parent's value instead of the tag default: if it matches, the clone inherits it anyway
+INHERITED = [
+    "color", "font-family", "font-size", "font-weight", "font-style", "line-height", "letter-spacing",
+    "text-align", "text-transform", "white-space", "list-style-type", "cursor", "visibility",
+]
+
+STYLE_SNAPSHOT_JS = """
+({properties, inherited, maxElements, prefix}) => {
+    const SKIP = new Set(['HEAD', 'SCRIPT', 'STYLE', 'NOSCRIPT', 'TEMPLATE', 'LINK', 'META', 'IFRAME']);
+    const inheritedSet = new Set(inherited);
+    // Tag defaults come from an empty same-origin frame, so only the page's own styling differs
+    const frame = document.createElement('iframe');
+    frame.style.cssText = 'position:absolute;width:0;height:0;border:0;visibility:hidden';
+    document.documentElement.appendChild(frame);
+    const frameDoc = frame.contentDocument;
+    const defaults = new Map();
+    const defaultsFor = (el) => {
+        const key = el.namespaceURI + el.tagName;
+        if (!defaults.has(key)) {
+            const probe = frameDoc.createElementNS(el.namespaceURI, el.tagName);
+            frameDoc.body.appendChild(probe);
+            const cs = frame.contentWindow.getComputedStyle(probe);
+            defaults.set(key, Object.fromEntries(properties.map(p => [p, cs.getPropertyValue(p)])));
+            probe.remove();
+        }
+        return defaults.get(key);
+    };
+    const round = (v) => v.replace(/(\\d+\\.\\d{2})\\d+/g, '$1');
+
+    const styles = [];
+    const index = new Map();
+    let elements = 0, truncated = false;
+    const visit = (el, parentValues) => {
+        if (SKIP.has(el.tagName) || el === frame) return;
+        if (elements >= maxElements) { truncated = true; return; }
+        const cs = getComputedStyle(el);
+        if (cs.display === 'none' || (el !== document.documentElement && el.getClientRects().length === 0 && cs.display !== 'contents')) return;
+        elements++;
+
+        const base = defaultsFor(el);
+        const values = {}, diff = {};
+        for (const p of properties) {
+            const v = round(cs.getPropertyValue(p));
+            values[p] = v;
+            const reference = inheritedSet.has(p) && parentValues ? parentValues[p] : base[p];
+            if (v !== reference && v !== '') diff[p] = v;
+        }
+        const key = JSON.stringify(diff);
+        if (key !== '{}') {
+            if (!index.has(key)) { index.set(key, styles.length); styles.push(diff); }
+            el.classList.add(prefix + index.get(key));
+        }
+        // SVG internals are drawn by attributes, not worth a class each
+        if (el.namespaceURI === 'http://www.w3.org/2000/svg') return;
+        for (const child of el.children) visit(child, values);
+    };
+    visit(document.documentElement, null);
+    frame.remove();
+    return {styles, elements, truncated};
+}
+"""
+
+snapshot_bytes_total = metrics.counter("style_snapshot_bytes_total", "Bytes of CSS produced by computed-style snapshots")
+snapshot_classes = metrics.histogram("style_snapshot_classes", "Interned style classes per snapshot", buckets=(10, 50, 100, 250, 500, 1000, 2500, 5000))
+
+
+def render_style_table(styles: List[Dict[str, str]], prefix: str = CLASS_PREFIX) -> str:
+    """One rule per interned style, properties in PROPERTIES order so output is stable across runs."""
+    order = {p: i for i, p in enumerate(PROPERTIES)}
+    rules = []
+    for i, style in enumerate(styles):
+        body = ";".join(f"{p}:{style[p]}" for p in sorted(style, key=lambda p: order.get(p, len(order))))
+        rules.append(f".{prefix}{i}{{{body}}}")
+    return "\n".join(rules)
+
+
+def _arguments(max_elements: int) -> dict:
+    return {"properties": PROPERTIES, "inherited": INHERITED, "maxElements": max_elements, "prefix": CLASS_PREFIX}
+
+
+def _result(raw: dict) -> dict:
+    css = render_style_table(raw["styles"])
+    snapshot_bytes_total.inc(len(css))
+    snapshot_classes.observe(len(raw["styles"]))
+    stats = {"elements": raw["elements"], "classes": len(raw["styles"]), "css_length": len(css), "truncated": raw["truncated"]}
+    return {"css": css, "stats": stats}
+
+
+def snapshot_sync(page, max_elements: int = MAX_ELEMENTS) -> dict:
+    """
+    Run on the settled page before page.content(): it tags elements with their cs-N class, so the
+    captured HTML and the returned {"css", "stats"} match. Media queries and :hover/:focus states
+    are not captured; mode "both" keeps the stylesheets for those.
+    """
+    return _result(page.evaluate(STYLE_SNAPSHOT_JS, _arguments(max_elements)))
+
+
+async def snapshot_async(page, max_elements: int = MAX_ELEMENTS) -> dict:
+    return _result(await page.evaluate(STYLE_SNAPSHOT_JS, _arguments(max_elements)))
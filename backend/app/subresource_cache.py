@@ -0,0 +1,230 @@
+# persistent on-disk cache of scraped subresources (JS, CSS, fonts), served to Playwright with route.fulfill
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = Path(os.getenv("SUBRESOURCE_CACHE_DIR", str(Path(__file__).resolve().parent / ".cache" / "subresources")))
+# "headers": honour Cache-Control/Expires; "force": cache every successful GET of a cacheable type for FORCE_TTL
+POLICY = os.getenv("SUBRESOURCE_CACHE_POLICY", "headers")
+FORCE_TTL = float(os.getenv("SUBRESOURCE_CACHE_TTL", str(24 * 3600)))
+MAX_BYTES = int(float(os.getenv("SUBRESOURCE_CACHE_MAX_MB", "500")) * 1024 * 1024)
+CACHEABLE_TYPES = {"script", "stylesheet", "font", "image", "media"}
+MAX_ENTRY_BYTES = 20 * 1024 * 1024
+
+# The body handed to route.fulfill is already decoded, so these would describe the wrong bytes
+DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive", "set-cookie"}
+
+cache_requests_total = metrics.counter("subresource_cache_requests_total", "Cache lookups for routed subresources, by result (hit/miss)")
+cache_bytes_served_total = metrics.counter("subresource_cache_bytes_served_total", "Response bytes served from the local subresource cache")
+cache_stored_bytes_total = metrics.counter("subresource_cache_stored_bytes_total", "Response bytes written to the subresource cache")
+
+
+def freshness_lifetime(headers: Dict[str, str], policy: str = POLICY, now: Optional[float] = None) -> Optional[float]:
+    """Seconds a response may be reused, or None when it must not be cached."""
+    cache_control = headers.get("cache-control", "").lower()
+    if "no-store" in cache_control:
+        return None
+    if policy == "force":
+        return FORCE_TTL
+    if "private" in cache_control or "no-cache" in cache_control:
+        return None
+    for directive in ("s-maxage", "max-age"):
+        match = re.search(rf"{directive}\s*=\s*(\d+)", cache_control)
+        if match:
+            return float(match.group(1)) or None
+    if "immutable" in cache_control:
+        return 365 * 24 * 3600.0
+    expires = headers.get("expires")
+    if expires:
+        from email.utils import parsedate_to_datetime
+
+        try:
+            remaining = parsedate_to_datetime(expires).timestamp() - (now or time.time())
+        except (TypeError, ValueError):
+            return None
+        return remaining if remaining > 0 else None
+    return None
+
+
+class CacheStats:
+    """Per-scrape hit/miss counters; `summary()` goes into the scrape's debug_info."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.bytes_served = 0
+        self._lock = threading.Lock()
+
+    def record(self, hit: bool, size: int = 0) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+                self.bytes_served += size
+            else:
+                self.misses += 1
+        cache_requests_total.inc(result="hit" if hit else "miss")
+        if hit:
+            cache_bytes_served_total.inc(size)
+
+    def summary(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stored": self.stored,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "bytes_served": self.bytes_served,
+        }
+
+
+class SubresourceCache:
+    """
+    URL-keyed response store: <sha256>.json holds status, headers and expiry, <sha256>.body the
+    decoded bytes. Entries are written atomically, so concurrent scrapes (threads or worker
+    processes) only ever read complete files. The oldest entries are evicted past `max_bytes`.
+    """
+
+    def __init__(self, directory: Path = CACHE_DIR, policy: str = POLICY, max_bytes: int = MAX_BYTES):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.policy = policy
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = sum(p.stat().st_size for p in self.directory.glob("*.body"))
+
+    def _paths(self, url: str):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.directory / f"{key}.json", self.directory / f"{key}.body"
+
+    def lookup(self, url: str) -> Optional[dict]:
+        meta_path, body_path = self._paths(url)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            if meta["url"] != url or meta["expires_at"] < time.time():
+                return None
+            body = body_path.read_bytes()
+        except (OSError, ValueError, KeyError):
+            return None
+        return {"status": meta["status"], "headers": meta["headers"], "body": body}
+
+    def store(self, url: str, status: int, headers: Dict[str, str], body: bytes) -> bool:
+        if status != 200 or len(body) > MAX_ENTRY_BYTES:
+            return False
+        lifetime = freshness_lifetime({k.lower(): v for k, v in headers.items()}, self.policy)
+        if lifetime is None:
+            return False
+        meta = {
+            "url": url,
+            "status": status,
+            "headers": {k: v for k, v in headers.items() if k.lower() not in DROP_HEADERS},
+            "stored_at": time.time(),
+            "expires_at": time.time() + lifetime,
+            "size": len(body),
+        }
+        meta_path, body_path = self._paths(url)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            body_tmp, meta_tmp = Path(str(body_path) + suffix), Path(str(meta_path) + suffix)
+            body_tmp.write_bytes(body)
+            meta_tmp.write_text(json.dumps(meta), encoding="utf-8")
+            os.replace(body_tmp, body_path)
+            os.replace(meta_tmp, meta_path)
+        except OSError as e:
+            logger.warning(f"📦 Could not cache {url}: {e}")
+            return False
+        cache_stored_bytes_total.inc(len(body))
+        with self._lock:
+            self._total_bytes += len(body)
+            over = self._total_bytes > self.max_bytes
+        if over:
+            self.evict()
+        return True
+
+    def evict(self) -> None:
+        """Drop least recently written entries until the cache is back under 90% of max_bytes."""
+        bodies = sorted(self.directory.glob("*.body"), key=lambda p: p.stat().st_mtime)
+        total = sum(p.stat().st_size for p in bodies)
+        target = self.max_bytes * 0.9
+        for body_path in bodies:
+            if total <= target:
+                break
+            size = body_path.stat().st_size
+            for path in (body_path, body_path.with_suffix(".json")):
+                path.unlink(missing_ok=True)
+            total -= size
+        with self._lock:
+            self._total_bytes = total
+
+    # --- Playwright route integration ---
+
+    def _cacheable(self, request) -> bool:
+        return request.method == "GET" and request.resource_type in CACHEABLE_TYPES
+
+    def handle_sync(self, route, request, stats: CacheStats) -> None:
+        if not self._cacheable(request):
+            route.continue_()
+            return
+        entry = self.lookup(request.url)
+        stats.record(entry is not None, len(entry["body"]) if entry else 0)
+        if entry:
+            route.fulfill(status=entry["status"], headers=entry["headers"], body=entry["body"])
+            return
+        try:
+            response = route.fetch()
+            body = response.body()
+        except Exception as e:
+            logger.warning(f"📦 Cache fetch failed for {request.url}, letting the browser retry: {e}")
+            route.continue_()
+            return
+        if self.store(request.url, response.status, response.headers, body):
+            stats.stored += 1
+        route.fulfill(response=response, body=body)
+
+    async def handle_async(self, route, request, stats: CacheStats) -> None:
+        if not self._cacheable(request):
+            await route.continue_()
+            return
+        entry = await asyncio.to_thread(self.lookup, request.url)
+        stats.record(entry is not None, len(entry["body"]) if entry else 0)
+        if entry:
+            await route.fulfill(status=entry["status"], headers=entry["headers"], body=entry["body"])
+            return
+        try:
+            response = await route.fetch()
+            body = await response.body()
+        except Exception as e:
+            logger.warning(f"📦 Cache fetch failed for {request.url}, letting the browser retry: {e}")
+            await route.continue_()
+            return
+        if await asyncio.to_thread(self.store, request.url, response.status, response.headers, body):
+            stats.stored += 1
+        await route.fulfill(response=response, body=body)
+
+
+_cache: Optional[SubresourceCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_subresource_cache() -> Optional[SubresourceCache]:
+    """Shared cache, or None when SUBRESOURCE_CACHE=0."""
+    global _cache
+    if os.getenv("SUBRESOURCE_CACHE", "1") != "1":
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = SubresourceCache()
+            logger.info(f"📦 Subresource cache at {_cache.directory} (policy '{_cache.policy}', {_cache._total_bytes // 1024} KB on disk)")
+        return _cache
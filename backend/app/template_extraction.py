@@ -0,0 +1,323 @@
+# repeated-subtree templating: send the LLM one exemplar per repeated structure, expand the rest locally
+
+import copy
+import json
+import logging
+import os
+import re
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from bs4 import BeautifulSoup, NavigableString, Tag
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_ATTR = "data-clone-template"
+REPEAT_ATTR = "data-clone-repeat"
+SKIP_TAGS = {"script", "style", "template", "noscript"}
+
+MIN_REPEATS = int(os.getenv("TEMPLATE_MIN_REPEATS", "3"))
+MIN_NODES = int(os.getenv("TEMPLATE_MIN_NODES", "4"))
+MIN_SAVINGS = float(os.getenv("TEMPLATE_MIN_SAVINGS", "0.05"))
+MAX_TABLE_ROWS = int(os.getenv("TEMPLATE_MAX_TABLE_ROWS", "50"))
+MAX_TABLE_VALUE_CHARS = 80
+LONG_VALUE_CHARS = 12  # values at least this long may also be substituted inside larger strings
+
+
+def _is_text(node) -> bool:
+    return type(node) is NavigableString and bool(node.strip())
+
+
+def _element_children(tag: Tag) -> List[Tag]:
+    return [c for c in tag.children if isinstance(c, Tag)]
+
+
+def _signatures(root: Tag, min_repeats: int, min_nodes: int) -> Tuple[Dict[int, int], Dict[int, int], set]:
+    """
+    Structural signature id and subtree size for every element under `root`, keyed by id(tag),
+    plus the ids of elements that contain a qualifying repetition somewhere below them.
+    Computed with an explicit post-order stack so deeply nested pages cannot hit the recursion limit.
+    Two subtrees share a signature when tags, classes, attribute names and child layout match.
+    """
+    interned: Dict[tuple, int] = {}
+    sig: Dict[int, int] = {}
+    size: Dict[int, int] = {}
+    has_repeats: set = set()
+    stack: List[Tuple[Tag, bool]] = [(root, False)]
+    while stack:
+        tag, children_done = stack.pop()
+        if not children_done:
+            stack.append((tag, True))
+            if tag.name not in SKIP_TAGS:
+                stack.extend((c, False) for c in tag.children if isinstance(c, Tag))
+            continue
+        child_sigs = []
+        subtree = 1
+        if tag.name not in SKIP_TAGS:
+            for c in tag.children:
+                if isinstance(c, Tag):
+                    child_sigs.append(sig[id(c)])
+                    subtree += size[id(c)]
+                elif _is_text(c):
+                    child_sigs.append(-1)
+                    subtree += 1
+        classes = tag.get("class") or []
+        key = (
+            tag.name,
+            tuple(sorted(classes)) if isinstance(classes, list) else (classes,),
+            tuple(sorted(a for a in tag.attrs if a != "class")),
+            tuple(child_sigs),
+        )
+        sig[id(tag)] = interned.setdefault(key, len(interned))
+        size[id(tag)] = subtree
+
+        counts: Dict[int, int] = {}
+        for c in (_element_children(tag) if tag.name not in SKIP_TAGS else []):
+            if id(c) in has_repeats:
+                has_repeats.add(id(tag))
+            if size[id(c)] >= min_nodes:
+                counts[sig[id(c)]] = counts.get(sig[id(c)], 0) + 1
+        if any(n >= min_repeats for n in counts.values()):
+            has_repeats.add(id(tag))
+    return sig, size, has_repeats
+
+
+def _slot_values(instance: Tag) -> List[str]:
+    """Text and attribute values of a subtree in a fixed order that is identical for same-signature subtrees."""
+    values = []
+    for node in [instance, *instance.descendants]:
+        if isinstance(node, Tag):
+            for name in sorted(a for a in node.attrs if a != "class"):
+                value = node.attrs[name]
+                values.append(" ".join(value) if isinstance(value, list) else str(value))
+        elif _is_text(node) and node.parent is not None and node.parent.name not in SKIP_TAGS:
+            values.append(node.strip())
+    return values
+
+
+def _slot_labels(instance: Tag) -> List[str]:
+    labels = []
+    for node in [instance, *instance.descendants]:
+        if isinstance(node, Tag):
+            labels.extend(f"{node.name}@{name}" for name in sorted(a for a in node.attrs if a != "class"))
+        elif _is_text(node) and node.parent is not None and node.parent.name not in SKIP_TAGS:
+            labels.append(f"{node.parent.name} text")
+    return labels
+
+
+def extract_repeated_templates(
+    body_html: str,
+    min_repeats: int = MIN_REPEATS,
+    min_nodes: int = MIN_NODES,
+    min_savings: float = MIN_SAVINGS,
+) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    Replace runs of structurally identical sibling subtrees by one exemplar (marked with
+    data-clone-template) plus empty placeholder elements (data-clone-repeat). Returns the
+    compacted body and a plan for expand_repeated_templates, or (body_html, None) when the
+    page has no worthwhile repetition.
+    """
+    soup = BeautifulSoup(body_html, "html.parser")
+    sig, size, has_repeats = _signatures(soup, min_repeats, min_nodes)
+
+    templates: Dict[int, Dict[str, Any]] = {}
+    queue = deque([soup])
+    while queue:
+        parent = queue.popleft()
+        children = _element_children(parent)
+        counts: Dict[int, int] = {}
+        for c in children:
+            counts[sig[id(c)]] = counts.get(sig[id(c)], 0) + 1
+
+        run: List[Tag] = []
+        run_sig: Optional[int] = None
+
+        def close_run():
+            if run_sig is not None and run:
+                _register_run(templates, run_sig, list(run))
+            run.clear()
+
+        for c in children:
+            s = sig[id(c)]
+            # Template the innermost repetition: a run of sections that each hold a run of cards
+            # is better served by one card exemplar than by one whole-section exemplar
+            repeated = (
+                counts[s] >= min_repeats and size[id(c)] >= min_nodes
+                and c.name not in SKIP_TAGS and id(c) not in has_repeats
+            )
+            if not repeated:
+                close_run()
+                run_sig = None
+                if c.name not in SKIP_TAGS:
+                    queue.append(c)
+                continue
+            if s != run_sig:
+                close_run()
+                run_sig = s
+            run.append(c)
+        close_run()
+
+    if not templates:
+        return body_html, None
+
+    plan: Dict[str, Any] = {"templates": {}, "original_chars": len(body_html)}
+    for n, t in enumerate(templates.values(), start=1):
+        tid = f"t{n}"
+        exemplar: Tag = t["runs"][0][0]
+        exemplar_values = _slot_values(exemplar)
+        rows, instance_html, runs = [], [], []
+        for r, members in enumerate(t["runs"]):
+            rest = members[1:] if r == 0 else members
+            if not rest:
+                continue
+            run_id = f"{tid}-r{len(runs)}"
+            row_ids = []
+            for inst in rest:
+                row_ids.append(len(rows))
+                rows.append(_slot_values(inst))
+                instance_html.append(str(inst))
+            placeholder = soup.new_tag("div", attrs={REPEAT_ATTR: run_id})
+            rest[0].insert_before(placeholder)
+            for inst in rest:
+                inst.decompose()
+            runs.append({"id": run_id, "rows": row_ids})
+
+        columns = [i for i in range(len(exemplar_values)) if any(row[i] != exemplar_values[i] for row in rows)]
+        labels = _slot_labels(exemplar)
+        exemplar[TEMPLATE_ATTR] = tid
+        plan["templates"][tid] = {
+            "exemplar_values": exemplar_values,
+            "columns": columns,
+            "column_labels": [labels[i] for i in columns],
+            "rows": rows,
+            "runs": runs,
+            "instance_html": instance_html,
+        }
+
+    compact = str(soup)
+    plan["compact_chars"] = len(compact)
+    # The data tables go into the prompt too, so they count against the savings
+    prompt_chars = len(compact) + len(render_data_tables(plan))
+    savings = 1 - prompt_chars / max(1, len(body_html))
+    if savings < min_savings:
+        return body_html, None
+    logger.info(
+        f"🧩 Templated {sum(len(t['rows']) for t in plan['templates'].values())} repeated subtrees "
+        f"in {len(plan['templates'])} templates: body {len(body_html)} -> {prompt_chars} prompt chars ({savings:.0%} smaller)"
+    )
+    return compact, plan
+
+
+def _register_run(templates: Dict[int, Dict[str, Any]], sig_id: int, members: List[Tag]) -> None:
+    templates.setdefault(sig_id, {"runs": []})["runs"].append(members)
+
+
+def render_data_tables(plan: Dict[str, Any], max_rows: int = MAX_TABLE_ROWS) -> str:
+    """Compact JSON-lines description of the repeated items for the prompt (reference only)."""
+    def clip(v: str) -> str:
+        return v if len(v) <= MAX_TABLE_VALUE_CHARS else v[:MAX_TABLE_VALUE_CHARS] + "…"
+
+    lines = []
+    for tid, t in plan["templates"].items():
+        lines.append(json.dumps({"template": tid, "items": len(t["rows"]) + 1, "columns": t["column_labels"]}, ensure_ascii=False))
+        for row in t["rows"][:max_rows]:
+            lines.append(json.dumps([clip(row[i]) for i in t["columns"]], ensure_ascii=False))
+        if len(t["rows"]) > max_rows:
+            lines.append(f"... {len(t['rows']) - max_rows} more rows")
+    return "\n".join(lines)
+
+
+def _fill_row(exemplar: Tag, exemplar_values: List[str], row: List[str], columns: List[int]) -> Tag:
+    """
+    Deep-copy the generated exemplar and swap the exemplar's values for this row's values. Slots
+    are matched by position, not by value: the n-th slot holding value v (walked in _slot_values
+    order) takes the row's value at the n-th exemplar position of v, so two columns that happen
+    to share a value in the exemplar (price and list price both "$10") stay distinct.
+    """
+    changed = set(columns)
+    positions: Dict[str, List[int]] = {}
+    for i, value in enumerate(exemplar_values):
+        positions.setdefault(value, []).append(i)
+    # Values that never change need no substitution, but still count towards the occurrences
+    mapped = {v for v, idx in positions.items() if any(i in changed for i in idx)}
+    seen: Dict[str, int] = {}
+
+    def take(value: str) -> str:
+        idx = positions[value]
+        n = seen.get(value, 0)
+        seen[value] = n + 1
+        return row[idx[min(n, len(idx) - 1)]]
+
+    clone = copy.copy(exemplar)
+    if TEMPLATE_ATTR in clone.attrs:
+        del clone[TEMPLATE_ATTR]
+    long_keys = sorted((k for k in mapped if len(k) >= LONG_VALUE_CHARS), key=len, reverse=True)
+    long_pattern = re.compile("|".join(map(re.escape, long_keys))) if long_keys else None
+
+    def substitute(value: str) -> str:
+        stripped = value.strip()
+        if stripped in positions:
+            replacement = take(stripped)
+            return value.replace(stripped, replacement, 1) if stripped in mapped else value
+        if long_pattern is not None:
+            return long_pattern.sub(lambda m: take(m.group(0)), value)
+        return value
+
+    for node in [clone, *clone.descendants]:
+        if isinstance(node, Tag):
+            for name in sorted(a for a in node.attrs if a != "class"):
+                if isinstance(node.attrs[name], str):
+                    node.attrs[name] = substitute(node.attrs[name])
+        elif _is_text(node) and node.parent is not None and node.parent.name not in SKIP_TAGS:
+            new = substitute(str(node))
+            if new != node:
+                node.replace_with(new)
+    return clone
+
+
+def _split_code_fence(text: str) -> Tuple[str, str, str]:
+    match = re.search(r"```html\s*\n(.*?)(\n```|$)", text, re.DOTALL)
+    if not match:
+        return "", text, ""
+    return text[:match.start(1)], match.group(1), text[match.end(1):]
+
+
+def expand_repeated_templates(generated_html: str, plan: Dict[str, Any]) -> str:
+    """
+    Rebuild every repeated item from the model's rendering of its exemplar. Placeholders the
+    model dropped are re-inserted after the exemplar; if the exemplar itself is missing the
+    original scraped markup is used for the rows.
+    """
+    prefix, html, suffix = _split_code_fence(generated_html)
+    soup = BeautifulSoup(html, "html.parser")
+    missing = 0
+
+    for tid, t in plan["templates"].items():
+        exemplar = soup.find(attrs={TEMPLATE_ATTR: tid})
+        anchor = exemplar
+        for run in t["runs"]:
+            if exemplar is not None:
+                items = [_fill_row(exemplar, t["exemplar_values"], t["rows"][r], t["columns"]) for r in run["rows"]]
+            else:
+                items = [_element_children(BeautifulSoup(t["instance_html"][r], "html.parser"))[0] for r in run["rows"]]
+
+            placeholder = soup.find(attrs={REPEAT_ATTR: run["id"]})
+            if placeholder is None:
+                missing += 1
+                if anchor is None:
+                    continue
+                target = anchor
+            else:
+                target = placeholder
+            for item in items:
+                target.insert_after(item)
+                target = item
+            anchor = target
+            if placeholder is not None:
+                placeholder.decompose()
+        if exemplar is not None:
+            del exemplar[TEMPLATE_ATTR]
+
+    if missing:
+        logger.warning(f"🧩 {missing} repeat placeholders were dropped by the model; rows were appended after their exemplar")
+    return prefix + str(soup) + suffix
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from admission import AdmissionGate, ClientLimiter, TokenBucket
+
+
+def test_token_bucket_reserves_only_within_max_wait():
+    bucket = TokenBucket(rate=1.0, burst=2)
+    assert bucket.take() == 0 and bucket.take() == 0
+    wait = bucket.take()
+    assert 0 < wait <= 1.0
+    assert bucket.available() < 1  # nothing was reserved
+    assert bucket.take(max_wait=5) > 0
+    assert bucket.available() < 0  # reserved ahead of time
+
+
+def test_gate_rejects_with_retry_after_when_queue_is_full():
+    async def flow():
+        gate = AdmissionGate("test", max_concurrent=1, max_queue=1, queue_timeout=5)
+        release = asyncio.Event()
+
+        async def hold():
+            async with gate.admit():
+                await release.wait()
+
+        running = asyncio.create_task(hold())
+        queued = asyncio.create_task(hold())
+        await asyncio.sleep(0.01)
+        assert gate.active == 1 and gate.queued == 1
+
+        with pytest.raises(HTTPException) as rejected:
+            async with gate.admit():
+                pass
+        assert rejected.value.status_code == 429
+        assert int(rejected.value.headers["Retry-After"]) >= 1
+
+        release.set()
+        await asyncio.gather(running, queued)
+        assert gate.active == 0 and gate.queued == 0
+
+    asyncio.run(flow())
+
+
+def test_gate_times_out_queued_requests():
+    async def flow():
+        gate = AdmissionGate("test", max_concurrent=1, max_queue=4, queue_timeout=0.05)
+        async with gate.admit():
+            with pytest.raises(HTTPException) as rejected:
+                async with gate.admit():
+                    pass
+        assert "queue_timeout" in rejected.value.detail
+        assert gate.queued == 0
+
+    asyncio.run(flow())
+
+
+def test_client_limiter_is_per_client():
+    limiter = ClientLimiter("scrape", per_minute=60, burst=2)
+    limiter.check("a")
+    limiter.check("a")
+    with pytest.raises(HTTPException) as limited:
+        limiter.check("a")
+    assert limited.value.status_code == 429 and "Retry-After" in limited.value.headers
+    limiter.check("b")
@@ -0,0 +1,82 @@
+import base64
+
+import httpx
+import pytest
+
+import asset_store
+from asset_store import AssetExternalizer, AssetStore, check_fetchable, content_type_for, decode_data_uri
+
+FONT = b"wOF2" + bytes(range(256)) * 4
+LOGO = b"\x89PNG\r\n\x1a\n" + b"\x00" * 600
+
+
+def test_identical_bytes_are_stored_once(tmp_path):
+    store = AssetStore(tmp_path)
+    first = store.put(FONT, "font/woff2")
+    assert first.endswith(".woff2") and store.put(FONT, "font/woff2") == first
+    assert store.path_for(first).read_bytes() == FONT
+    assert store.stats()["assets"] == 1
+    assert content_type_for(first) == "font/woff2"
+    assert store.path_for("../etc/passwd") is None
+
+
+def test_data_uris_move_to_the_store(tmp_path):
+    logo_uri = "data:image/png;base64," + base64.b64encode(LOGO).decode()
+    font_uri = "data:font/woff2;base64," + base64.b64encode(FONT).decode()
+    html = (
+        f'<html><head><style>@font-face {{ src: url("{font_uri}") }}</style></head>'
+        f'<body><img src="{logo_uri}"><img src="{logo_uri}"><img src="data:image/gif;base64,R0lGODlhAQABAAAAACw="></body></html>'
+    )
+    externalizer = AssetExternalizer(AssetStore(tmp_path), asset_route="http://api/assets", optimize_images=False)
+    out = externalizer.externalize(html, "https://example.com/")
+
+    assert len(out) < len(html) / 2
+    assert out.count("http://api/assets/") == 3
+    assert "data:image/gif" in out  # tiny icons stay inline
+    assert AssetStore(tmp_path).stats()["assets"] == 2
+    assert decode_data_uri("data:text/plain,a%20b") == ("text/plain", b"a b")
+
+
+@pytest.mark.parametrize("url", [
+    "file:///etc/passwd", "ftp://example.com/logo.png", "http://127.0.0.1:8000/admin", "http://10.0.0.5/logo.png",
+    "http://169.254.169.254/latest/meta-data/", "http://[::1]/", "http://[::ffff:127.0.0.1]/", "http://localhost/",
+])
+def test_internal_and_non_http_urls_are_refused(url):
+    with pytest.raises(ValueError):
+        check_fetchable(url)
+    check_fetchable("https://93.184.216.34/logo.png")
+
+
+def test_fetch_stops_at_the_size_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(asset_store, "MAX_ASSET_BYTES", 1000)
+    sent = []
+
+    def stream():
+        for _ in range(100):
+            sent.append(1)
+            yield b"x" * 100
+
+    def handler(request):
+        if request.url.path == "/big":
+            return httpx.Response(200, headers={"Content-Type": "image/png"}, content=stream())
+        return httpx.Response(200, headers={"Content-Type": "image/png"}, content=LOGO)
+
+    externalizer = AssetExternalizer(AssetStore(tmp_path), optimize_images=False)
+    with httpx.Client(transport=httpx.MockTransport(handler)) as client:
+        assert externalizer._fetch(client, "https://cdn.test/big") is None
+        assert len(sent) <= 11  # abandoned just past the limit, not read to the end
+        assert externalizer._fetch(client, "https://cdn.test/logo.png") == ("image/png", LOGO)
+
+
+def test_redirect_to_an_internal_host_is_not_followed(tmp_path):
+    seen = []
+
+    def handler(request):
+        seen.append(request.url.host)
+        return httpx.Response(302, headers={"Location": "http://127.0.0.1:8000/secret"})
+
+    externalizer = AssetExternalizer(AssetStore(tmp_path), optimize_images=False)
+    with httpx.Client(transport=httpx.MockTransport(handler), follow_redirects=True,
+                      event_hooks={"request": [asset_store._check_request]}) as client:
+        assert externalizer._fetch(client, "https://93.184.216.34/logo.png") is None
+    assert seen == ["93.184.216.34"]
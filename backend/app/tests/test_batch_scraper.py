@@ -0,0 +1,129 @@
+import asyncio
+import json
+import sys
+import types
+
+from fastapi.testclient import TestClient
+
+PAGES = {
+    "https://shop.test/slow": 0.2,
+    "https://shop.test/fast": 0.0,
+    "https://shop.test/broken": 0.05,
+}
+STYLESHEET = "https://shop.test/site.css"
+
+
+class FakeResponse:
+    ok = True
+
+    async def text(self):
+        return "body { color: navy; }"
+
+
+class FakeRequestContext:
+    def __init__(self):
+        self.fetched = []
+
+    async def get(self, href):
+        self.fetched.append(href)
+        await asyncio.sleep(0.01)
+        return FakeResponse()
+
+
+class FakePage:
+    def __init__(self):
+        self.url = None
+
+    async def route(self, pattern, handler):
+        pass
+
+    async def goto(self, url, wait_until=None, timeout=None):
+        self.url = url
+        await asyncio.sleep(PAGES[url])
+        if url.endswith("/broken"):
+            raise RuntimeError("net::ERR_CONNECTION_RESET")
+
+    async def wait_for_timeout(self, ms):
+        pass
+
+    async def content(self):
+        return f"<html><head><title>{self.url}</title></head><body><main><h1>{self.url}</h1></main></body></html>"
+
+    async def eval_on_selector_all(self, selector, script):
+        return [{"href": STYLESHEET}, {"inline": "h1 { margin: 0; }"}]
+
+    async def evaluate(self, script, *args):
+        return {}
+
+    async def close(self):
+        pass
+
+
+class FakeContext:
+    def __init__(self):
+        self.request = FakeRequestContext()
+
+    async def new_page(self):
+        return FakePage()
+
+    async def close(self):
+        pass
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.contexts = []
+
+    async def new_context(self, **kwargs):
+        self.contexts.append(FakeContext())
+        return self.contexts[-1]
+
+    async def close(self):
+        pass
+
+
+class FakePlaywright:
+    def __init__(self):
+        self.chromium = types.SimpleNamespace(launch=self.launch)
+        self.browser = FakeBrowser()
+
+    async def launch(self, **kwargs):
+        return self.browser
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def test_batch_streams_in_completion_order_and_survives_failures(monkeypatch, tmp_path):
+    playwright = FakePlaywright()
+    async_api = types.ModuleType("playwright.async_api")
+    async_api.async_playwright = lambda: playwright
+    monkeypatch.setitem(sys.modules, "playwright", types.ModuleType("playwright"))
+    monkeypatch.setitem(sys.modules, "playwright.async_api", async_api)
+    monkeypatch.setenv("SUBRESOURCE_CACHE", "0")
+
+    import main
+    monkeypatch.setattr(main, "CLONED_SITES_DIR", tmp_path)
+
+    with TestClient(main.app) as client:
+        response = client.post("/api/scrape/batch", json={"urls": list(PAGES), "concurrency": 3})
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+
+    assert [line.get("url") for line in lines[:-1]] == [
+        "https://shop.test/fast", "https://shop.test/broken", "https://shop.test/slow",
+    ]
+    fast, broken, slow = lines[:-1]
+    assert fast["ok"] and slow["ok"] and not broken["ok"]
+    assert "ERR_CONNECTION_RESET" in broken["error"]
+    assert (tmp_path / fast["raw_html_path"].split("/")[-1]).exists()
+    assert slow["debug_info"]["css_length"] == len("body { color: navy; }\nh1 { margin: 0; }")
+
+    # One site, one context: the shared stylesheet is fetched once and served from the session after
+    assert playwright.browser.contexts[0].request.fetched == [STYLESHEET]
+    summary = lines[-1]
+    assert summary["done"] and summary["succeeded"] == 2 and summary["failed"] == 1
+    assert summary["stylesheets"] == {"sites": 1, "stylesheet_fetches": 1, "stylesheet_hits": 1}
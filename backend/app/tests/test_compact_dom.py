@@ -0,0 +1,48 @@
+import pytest
+
+from compact_dom import CompactDOM
+
+HTML = (
+    "<!DOCTYPE html><html><body><!-- nav -->"
+    "<ul class='menu main' id='nav'><li><a href='/a'>A &amp; B</a></li><li><a href='https://x.com/b'>B</a></li></ul>"
+    "<div class='card'><p>Hello <b>world</b></p><img src='/i.png' alt=''></div>"
+    "<script>if (a < b) {}</script></body></html>"
+)
+
+
+def test_nested_dict_form_matches_soup():
+    dom = CompactDOM.from_html(HTML)
+    tree = dom.to_dict()
+    assert tree["tag"] == "[document]"
+    body = tree["children"][0]["children"][0]
+    assert [c["tag"] for c in body["children"]] == ["ul", "div", "script"]
+    assert body["children"][0]["attributes"] == {"class": "menu main", "id": "nav"}
+    assert dom.text_content() == "A & BBHello worldif (a < b) {}"
+
+
+def test_serialization_round_trips():
+    dom = CompactDOM.from_html(HTML)
+    assert CompactDOM.from_html(dom.to_html()).to_html() == dom.to_html()
+    assert "A &amp; B" in dom.to_html() and "if (a < b)" in dom.to_html()
+    loaded = CompactDOM.from_bytes(dom.to_bytes())
+    assert loaded.to_html() == dom.to_html()
+    assert loaded.select("ul > li a") == dom.select("ul > li a")
+    with pytest.raises(ValueError):
+        CompactDOM.from_bytes(b"XXXX" + dom.to_bytes()[4:])
+
+
+def test_selectors():
+    dom = CompactDOM.from_html(HTML)
+    assert [dom.get(i, "href") for i in dom.select("#nav a")] == ["/a", "https://x.com/b"]
+    assert [dom.get(i, "href") for i in dom.select("a[href^=https]")] == ["https://x.com/b"]
+    assert [dom.tag_name(i) for i in dom.select("ul.menu, div > p b, img[alt]")] == ["ul", "b", "img"]
+    assert dom.select("body > a") == [] and dom.select("section") == []
+    assert dom.get(dom.select_one(".main.menu"), "id") == "nav"
+
+
+def test_deep_nesting_does_not_recurse():
+    depth = 20000
+    dom = CompactDOM.from_html("<div>" * depth + "x" + "</div>" * depth)
+    assert len(dom) == depth + 2
+    assert dom.text_content() == "x"
+    assert len(dom.to_html()) == len("<div></div>") * depth + 1
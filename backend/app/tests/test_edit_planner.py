@@ -0,0 +1,52 @@
+import pytest
+
+from edit_planner import EDIT_STYLE_ATTR, apply_plan, plan_edit, try_local_edit
+
+HTML = (
+    "<!DOCTYPE html><html><head><title>Old</title></head><body>"
+    "<nav>menu</nav><h1>Hello</h1><p>Sign up today</p><button>Sign up</button>"
+    "<img src='a.png'><img src='b.png'><footer>f</footer></body></html>"
+)
+
+
+@pytest.mark.parametrize("instruction, expected", [
+    ("Change the background color to #ff0000.", {"selector": "body", "property": "background-color", "value": "#ff0000"}),
+    ("please make the buttons red", {"property": "color", "value": "red", "plural": True}),
+    ("set the font size of paragraphs to 18", {"selector": "p", "property": "font-size", "value": "18px"}),
+    ("change the colour of the links to rgb(10, 20, 30)", {"selector": "a", "value": "rgb(10, 20, 30)"}),
+    ("hide the footer", {"kind": "hide", "selector": "footer", "plural": False}),
+    ('Change "Sign up" to "Join now"', {"kind": "replace_text", "old": "Sign up", "new": "Join now"}),
+])
+def test_catalogue(instruction, expected):
+    plan = plan_edit(instruction)
+    assert plan is not None and {k: plan[k] for k in expected} == expected
+
+
+def test_open_ended_instructions_go_to_the_llm():
+    assert plan_edit("make the website look more modern") is None
+    assert plan_edit("make the title bigger") is None
+
+
+def test_css_edits_accumulate_in_one_style_block():
+    html = apply_plan(HTML, plan_edit("make the buttons red"))
+    html = apply_plan(html, plan_edit("change the navbar background to #222"))
+    assert html.count(f"<style {EDIT_STYLE_ATTR}>") == 1
+    assert "nav { background-color: #222 !important; }" in html
+    assert html.index(EDIT_STYLE_ATTR) < html.index("</head>")
+
+
+def test_dom_edits_and_ambiguous_targets():
+    edited = try_local_edit(HTML, 'Change "Sign up" to "Join now"')["html"]
+    assert "Sign up" not in edited and edited.count("Join now") == 2
+    assert try_local_edit(HTML, 'change the page title to "New"')["html"].count("<title>New</title>") == 1
+    assert "<img" not in try_local_edit(HTML, "remove all the images")["html"]
+    # Singular target with two matches, selector without matches, text that is not there: LLM
+    assert try_local_edit(HTML, "remove the image") is None
+    assert try_local_edit(HTML, "hide `.cookie-banner`") is None
+    assert try_local_edit(HTML, 'replace "Pricing" with "Plans"') is None
+    # Body-level targets are never hidden or removed locally, whatever selects them
+    for instruction in ("remove the text", "delete the page", "get rid of the site", "hide the text",
+                        "hide the website", "remove `body`", "hide `html`"):
+        assert plan_edit(instruction) is None, instruction
+        assert try_local_edit(HTML, instruction) is None, instruction
+    assert apply_plan(HTML.replace("<body>", '<body class="page">'), {"kind": "remove", "selector": ".page", "plural": False}) is None
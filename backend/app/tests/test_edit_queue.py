@@ -0,0 +1,62 @@
+import asyncio
+
+from edit_queue import EditQueue, combine_instructions
+
+
+def test_edits_piling_up_are_coalesced_into_one_call():
+    async def flow():
+        queue = EditQueue(batch_max=8)
+        calls = []
+        release = asyncio.Event()
+
+        async def apply(html, instructions):
+            calls.append((html, list(instructions)))
+            if len(calls) == 1:
+                await release.wait()
+            return {"html": html + "".join(f"+{i}" for i in instructions)}
+
+        first = asyncio.create_task(queue.submit("doc", "a", apply, document_id="page"))
+        await asyncio.sleep(0.01)
+        # Sent against the stale copy while "a" is in flight; both land in the next batch
+        rest = [asyncio.create_task(queue.submit("doc", i, apply, document_id="page")) for i in ("b", "c")]
+        await asyncio.sleep(0.01)
+        release.set()
+        a, b, c = await first, *await asyncio.gather(*rest)
+
+        assert calls == [("doc", ["a"]), ("doc+a", ["b", "c"])]
+        assert a["version"] == 1 and a["html"] == "doc+a" and not a["rebased"]
+        assert b == c and b["version"] == 2 and b["html"] == "doc+a+b+c" and b["rebased"]
+        assert a["document_id"] == "page"
+        # Without an id the same html runs alone: no merging with "page", nothing rebased, nothing kept
+        d = await queue.submit("doc", "d", apply)
+        assert d["document_id"] is None and d["version"] == 1 and d["html"] == "doc+d" and not d["rebased"]
+        assert calls[-1] == ("doc", ["d"])
+        assert queue.status()["documents"] == 1
+
+    asyncio.run(flow())
+
+
+def test_failed_batch_fails_its_callers_only():
+    async def flow():
+        queue = EditQueue(batch_max=1)
+
+        async def apply(html, instructions):
+            if instructions == ["boom"]:
+                raise RuntimeError("provider down")
+            return {"html": html + "!"}
+
+        results = await asyncio.gather(queue.submit("x", "boom", apply, document_id="d"),
+                                       queue.submit("x", "ok", apply, document_id="d"), return_exceptions=True)
+        assert isinstance(results[0], RuntimeError)
+        assert results[1]["html"] == "x!" and results[1]["version"] == 1
+        # Different html under the same id starts over from that html
+        assert (await queue.submit("y", "ok", apply, document_id="d"))["html"] == "y!"
+        assert queue.status()["documents"] == 1
+
+    asyncio.run(flow())
+
+
+def test_combine_instructions():
+    assert combine_instructions(["make it blue"]) == "make it blue"
+    combined = combine_instructions(["make it blue ", "hide the footer"])
+    assert "1. make it blue\n2. hide the footer" in combined
@@ -0,0 +1,65 @@
+import base64
+import json
+import types
+
+from har_archive import HarReplayer, har_path_for
+
+
+def entry(url: str, status: int, body: bytes, time_ms: float = 120.0) -> dict:
+    return {
+        "request": {"method": "GET", "url": url},
+        "response": {
+            "status": status,
+            "headers": [{"name": "Content-Type", "value": "text/html"}, {"name": "Content-Encoding", "value": "br"}],
+            "content": {"text": base64.b64encode(body).decode(), "encoding": "base64"},
+        },
+        "time": time_ms,
+    }
+
+
+class FakeRoute:
+    def __init__(self):
+        self.result = None
+
+    def fulfill(self, status, headers, body):
+        self.result = (status, headers, body)
+
+    def abort(self):
+        self.result = "aborted"
+
+
+class FakePage:
+    def __init__(self):
+        self.waited = []
+
+    def wait_for_timeout(self, ms):
+        self.waited.append(ms)
+
+
+def test_replay_serves_recorded_responses_in_order(tmp_path):
+    url = "https://shop.example/"
+    har = tmp_path / "page.har"
+    har.write_text(json.dumps({"log": {"entries": [entry(url, 200, b"<p>first</p>"), entry(url, 200, b"<p>second</p>")]}}))
+    page = FakePage()
+    handler = HarReplayer(har, timing="original").sync_handler(page)
+
+    routes = [FakeRoute() for _ in range(4)]
+    for route, target in zip(routes, [url, url, url, "https://tracker.example/x.js"]):
+        handler(route, types.SimpleNamespace(method="GET", url=target))
+
+    assert [r.result[2] for r in routes[:3]] == [b"<p>first</p>", b"<p>second</p>", b"<p>second</p>"]
+    assert routes[0].result[1] == {"Content-Type": "text/html"}
+    assert routes[3].result == "aborted"
+    assert page.waited == [120.0, 120.0, 120.0]
+
+
+def test_fast_timing_and_archive_paths(tmp_path):
+    har = tmp_path / "page.har"
+    har.write_text(json.dumps({"log": {"entries": [entry("https://a.example/", 200, b"ok", 900)]}}))
+    page = FakePage()
+    replayer = HarReplayer(har, timing="fast")
+    replayer.sync_handler(page)(FakeRoute(), types.SimpleNamespace(method="GET", url="https://a.example/"))
+
+    assert page.waited == [] and replayer.summary()["served"] == 1
+    assert har_path_for("https://a.example/x?y=1").name.startswith("a.example_")
+    assert har_path_for("https://a.example/x") != har_path_for("https://a.example/y")
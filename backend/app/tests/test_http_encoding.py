@@ -0,0 +1,84 @@
+import gzip
+import zlib
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from http_encoding import HTTPEncodingMiddleware, brotli, choose_encoding, content_etag, etag_matches, request_encodings
+
+app = FastAPI()
+app.add_middleware(HTTPEncodingMiddleware, min_bytes=100, max_request_bytes=10_000)
+
+
+@app.post("/echo")
+async def echo(request: Request):
+    body = await request.body()
+    return {"length": len(body), "content_length": request.headers["content-length"], "text": body.decode()[:20]}
+
+
+@app.get("/big")
+def big():
+    return {"html": "<div>clone</div>" * 500}
+
+
+@app.get("/stream")
+def stream():
+    return StreamingResponse((f'{{"line": {i}}}\n' for i in range(3)), media_type="application/x-ndjson")
+
+
+client = TestClient(app)
+
+
+def test_choose_encoding():
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("identity") is None
+    assert choose_encoding("gzip;q=0, *;q=0.5") == ("br" if brotli else None)
+    assert choose_encoding("br;q=0.2, gzip;q=0.8") == "gzip"
+
+
+def test_responses_are_compressed_when_worth_it():
+    r = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip" and "Accept-Encoding" in r.headers["vary"]
+    assert int(r.headers["content-length"]) < 8000 / 10 and len(r.json()["html"]) == 8000
+
+    small = client.post("/echo", content=b"hi", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+    streamed = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert streamed.headers["content-encoding"] == "gzip"
+    assert streamed.text.splitlines() == ['{"line": 0}', '{"line": 1}', '{"line": 2}']
+
+
+def test_gzip_request_bodies():
+    payload = ('{"html_content": "' + "x" * 5000 + '"}').encode()
+    r = client.post("/echo", content=gzip.compress(payload), headers={"Content-Encoding": "gzip"})
+    assert r.status_code == 200 and r.json()["length"] == len(payload) == int(r.json()["content_length"])
+
+    bomb = client.post("/echo", content=gzip.compress(b"0" * 50_000), headers={"Content-Encoding": "gzip"})
+    assert bomb.status_code == 413
+    assert client.post("/echo", content=b"not gzip", headers={"Content-Encoding": "gzip"}).status_code == 400
+    assert client.post("/echo", content=zlib.compress(payload), headers={"Content-Encoding": "deflate"}).status_code == 415
+
+
+@pytest.mark.skipif(brotli is None or "br" not in request_encodings(), reason="needs brotli >= 1.1")
+def test_brotli_request_bodies_are_bounded():
+    payload = ('{"html_content": "' + "x" * 5000 + '"}').encode()
+    r = client.post("/echo", content=brotli.compress(payload), headers={"Content-Encoding": "br"})
+    assert r.status_code == 200 and r.json()["length"] == len(payload)
+
+    # 16 MB of zeros compresses to a few dozen bytes; it must be refused without being expanded
+    bomb = brotli.compress(b"0" * (16 * 1024 * 1024), quality=1)
+    assert len(bomb) < 10_000
+    assert client.post("/echo", content=bomb, headers={"Content-Encoding": "br"}).status_code == 413
+    assert client.post("/echo", content=bomb[:len(bomb) // 2], headers={"Content-Encoding": "br"}).status_code in (400, 413)
+    assert client.post("/echo", content=b"not brotli", headers={"Content-Encoding": "br"}).status_code == 400
+
+
+def test_etags():
+    etag = content_etag("<html></html>")
+    assert etag == content_etag(b"<html></html>") and etag.startswith('"')
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag) and not etag_matches('"other"', etag)
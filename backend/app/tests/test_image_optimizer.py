@@ -0,0 +1,81 @@
+import io
+import json
+import shutil
+import subprocess
+
+import pytest
+
+from image_optimizer import RENDERED_SIZES_JS, minify_svg, optimize_image
+
+SVG = b"""<?xml version="1.0" encoding="UTF-8"?>
+<!-- Generator: Sketch -->
+<svg xmlns="http://www.w3.org/2000/svg" xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape" viewBox="0 0 10 10">
+    <metadata>lots of editor data</metadata>
+    <title>logo</title>
+    <rect   x="1" y="1"   width="8" height="8" fill="#f00"/>
+</svg>
+"""
+
+
+def test_svg_is_only_minified():
+    mime, data, report = optimize_image(SVG, "image/svg+xml")
+    assert mime == "image/svg+xml" and report["action"] == "minified"
+    assert data == minify_svg(SVG)
+    assert b"<rect x=\"1\" y=\"1\" width=\"8\" height=\"8\" fill=\"#f00\"/>" in data
+    assert b"metadata" not in data and b"inkscape" not in data and b"<?xml" not in data
+    assert report["saved_bytes"] == len(SVG) - len(data)
+
+
+def test_oversized_image_becomes_placeholder():
+    mime, data, report = optimize_image(b"\x00" * 5000, "application/octet-stream", rendered=(300, 200), placeholder_bytes=1000)
+    assert mime == "image/svg+xml" and report["action"] == "placeholder"
+    assert b'width="300" height="200"' in data and len(data) < 300
+
+
+def test_raster_is_downscaled_to_rendered_box_and_reencoded():
+    Image = pytest.importorskip("PIL.Image")
+    img = Image.radial_gradient("L").resize((1600, 1200)).convert("RGB")
+    buf = io.BytesIO()
+    img.save(buf, "PNG")
+    original = buf.getvalue()
+
+    mime, data, report = optimize_image(original, "image/png", rendered=(200, 150), target_dpr=2, formats=["webp", "jpeg"])
+    assert report["action"] == "transcoded" and mime in ("image/webp", "image/jpeg")
+    assert tuple(report["size"]) == (400, 300)
+    assert len(data) < len(original) / 10
+    assert Image.open(io.BytesIO(data)).size == (400, 300)
+
+
+# Just enough DOM for RENDERED_SIZES_JS: images blocked by the scrape never load (naturalWidth 0)
+FAKE_DOM = """
+const img = (src, box, {loaded = false, attrs = {}, style = {}, classes = []} = {}) => ({
+    currentSrc: src, complete: true, naturalWidth: loaded ? 1600 : 0, style,
+    getBoundingClientRect: () => ({width: box[0], height: box[1]}),
+    getAttribute: (name) => attrs[name] ?? null,
+    matches: (selector) => classes.some((c) => selector === '.' + c),
+});
+const document = {
+    styleSheets: [
+        {cssRules: [{cssRules: [{selectorText: '.hero', style: {width: '640px', height: '360px'}}]}]},
+        {get cssRules() { throw new Error('SecurityError'); }},
+    ],
+    images: [
+        img('https://x.test/alt-text.jpg', [100, 18]),
+        img('https://x.test/loaded.jpg', [320, 180], {loaded: true}),
+        img('https://x.test/attrs.jpg', [300, 200], {attrs: {width: '300', height: '200'}}),
+        img('https://x.test/width-only.jpg', [100, 18], {style: {width: '100%', height: 'auto'}}),
+        img('https://x.test/hero.jpg', [640, 360], {classes: ['hero']}),
+    ],
+};
+"""
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="needs node to run the page script")
+def test_rendered_sizes_skip_unloaded_images_without_an_explicit_size():
+    script = FAKE_DOM + f"console.log(JSON.stringify(({RENDERED_SIZES_JS.strip()})()));"
+    sizes = json.loads(subprocess.run(["node", "-e", script], capture_output=True, text=True, check=True).stdout)
+    assert sizes == {
+        "https://x.test/loaded.jpg": [320, 180],
+        "https://x.test/attrs.jpg": [300, 200],
+        "https://x.test/hero.jpg": [640, 360],
+    }
@@ -0,0 +1,18 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+
+def test_provider_sdks_playwright_and_bs4_load_on_first_use():
+    code = (
+        "import json, sys, main, html_editor, scraper_async; "
+        "print(json.dumps([m for m in ('playwright', 'groq', 'google.generativeai', 'bs4') if m in sys.modules]))"
+    )
+    proc = subprocess.run([sys.executable, "-c", code], cwd=APP_DIR, capture_output=True, text=True, timeout=120,
+                          env={**os.environ, "GOOGLE_API_KEY": "", "GROQ_API_KEY": ""})
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    assert json.loads(proc.stdout.strip().splitlines()[-1]) == []
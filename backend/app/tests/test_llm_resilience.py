@@ -0,0 +1,82 @@
+import asyncio
+import types
+
+import pytest
+
+from llm_resilience import CircuitBreaker, ProviderUnavailable, ResilientCaller, classify, parse_duration
+
+
+class ProviderError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = types.SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+def test_classify_reads_status_and_rate_limit_headers():
+    assert classify(ProviderError(429, {"retry-after": "7"})) == (True, 429, 7.0)
+    assert classify(ProviderError(503, {"x-ratelimit-reset-requests": "1m2.5s"}))[2] == 62.5
+    assert classify(ProviderError(400))[0] is False
+    assert classify(asyncio.TimeoutError())[0] is True
+    assert parse_duration("450ms") == 0.45
+
+
+def test_retries_then_succeeds():
+    calls = []
+
+    async def attempt(model_id):
+        calls.append(model_id)
+        if len(calls) < 3:
+            raise ProviderError(503)
+        return "ok"
+
+    caller = ResilientCaller(max_attempts=3, base_delay=0, fallbacks={})
+    assert asyncio.run(caller.call("m", attempt)) == "ok"
+    assert calls == ["m", "m", "m"]
+    assert caller.breaker("m").state == "closed"
+
+
+def test_client_errors_are_not_retried():
+    calls = []
+
+    async def attempt(model_id):
+        calls.append(model_id)
+        raise ProviderError(400)
+
+    caller = ResilientCaller(max_attempts=3, base_delay=0, fallbacks={"m": ["backup"]})
+    with pytest.raises(ProviderError):
+        asyncio.run(caller.call("m", attempt))
+    assert calls == ["m"]
+
+
+def test_open_breaker_fails_fast_or_falls_back():
+    async def attempt(model_id):
+        if model_id == "m":
+            raise ProviderError(503)
+        return f"from {model_id}"
+
+    caller = ResilientCaller(max_attempts=2, base_delay=0, failure_threshold=2, cooldown=60, fallbacks={"m": ["backup"]})
+    assert asyncio.run(caller.call("m", attempt)) == "from backup"
+    assert caller.breaker("m").state == "open"
+
+    alone = ResilientCaller(max_attempts=2, base_delay=0, failure_threshold=2, cooldown=60, fallbacks={})
+    with pytest.raises(ProviderUnavailable):
+        asyncio.run(alone.call("m", attempt))
+    with pytest.raises(ProviderUnavailable) as rejected:
+        asyncio.run(alone.call("m", attempt))
+    assert "circuit open" in rejected.value.detail and rejected.value.retry_after > 1
+
+    # Fallbacks the caller does not accept are never tried
+    picky = ResilientCaller(max_attempts=1, base_delay=0, failure_threshold=5, fallbacks={"m": ["backup"]})
+    with pytest.raises(ProviderUnavailable):
+        asyncio.run(picky.call("m", attempt, accept=lambda candidate: candidate != "backup"))
+
+
+def test_half_open_probe_closes_breaker():
+    breaker = CircuitBreaker("m", failure_threshold=1, cooldown=0)
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.allow() and breaker.state == "half_open"
+    assert not breaker.allow()  # only one probe at a time
+    breaker.record_success()
+    assert breaker.state == "closed"
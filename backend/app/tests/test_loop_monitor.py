@@ -0,0 +1,38 @@
+import asyncio
+import time
+
+import metrics
+from loop_monitor import LoopMonitor
+
+
+def test_blocking_call_is_detected_and_counted():
+    monitor = LoopMonitor(interval=0.01, block_threshold=0.05)
+
+    async def scenario():
+        monitor.start()
+        await asyncio.sleep(0.05)
+        time.sleep(0.3)  # blocks the loop, as a synchronous SDK call would
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+
+    before = metrics.counter("event_loop_blocking_calls_total").total()
+    asyncio.run(scenario())
+
+    report = monitor.report()
+    assert len(monitor.blocking_events) == 1
+    assert monitor.blocking_events[0]["blocked_ms"] >= 250
+    assert report["max_lag_ms"] >= 250
+    assert metrics.counter("event_loop_blocking_calls_total").total() == before + 1
+
+
+def test_prometheus_rendering_includes_labels_and_buckets():
+    c = metrics.counter("test_render_total", "for tests")
+    c.inc(kind="a")
+    h = metrics.histogram("test_render_seconds", buckets=(0.1, 1.0))
+    h.observe(0.5)
+
+    text = metrics.render_prometheus()
+    assert 'test_render_total{kind="a"} 1.0' in text
+    assert 'test_render_seconds_bucket{le="0.1"} 0' in text
+    assert 'test_render_seconds_bucket{le="1.0"} 1' in text
+    assert "test_render_seconds_count 1" in text
@@ -0,0 +1,64 @@
+import pytest
+
+from output_validation import (
+    OffFormatOutput, StreamValidator, continuation_point, extract_html, join_continuation,
+)
+
+DOC = "<!DOCTYPE html>\n<html><head><title>t</title></head><body><ul><li>a</li><li>b</li></ul></body></html>"
+
+
+def feed_all(validator, text, size=40):
+    for i in range(0, len(text), size):
+        if not validator.feed(text[i:i + size]):
+            return False
+    return True
+
+
+def test_prose_is_aborted_before_the_stream_ends():
+    validator = StreamValidator()
+    prose = "This page is a marketing site with a hero section and a pricing table. " * 100
+    with pytest.raises(OffFormatOutput) as aborted:
+        feed_all(validator, prose)
+    assert aborted.value.reason == "no_html"
+    assert len(validator.text) < len(prose) / 2
+
+    with pytest.raises(OffFormatOutput) as refused:
+        feed_all(StreamValidator(), "I'm sorry, but I can't help with replicating this website. " * 10)
+    assert refused.value.reason == "refusal"
+
+
+def test_fenced_document_with_commentary():
+    validator = StreamValidator()
+    answer = "Here is the page:\n```html\n" + DOC + "\n```\nThe layout uses flexbox." + " More notes." * 50
+    assert feed_all(validator, answer) is False  # trailing commentary is not waited for
+    assert validator.complete and not validator.truncated
+    assert extract_html(validator.text) == DOC
+
+
+def test_truncated_document_is_continued_from_last_complete_tag():
+    cut = "```html\n" + DOC[:DOC.index("<li>b") + 3]
+    validator = StreamValidator()
+    feed_all(validator, cut)
+    assert validator.truncated  # no finish reason reported
+    validator.finish_reason = "MAX_TOKENS"
+    assert validator.truncated
+
+    prefix, open_elements = continuation_point(extract_html(cut))
+    assert prefix.endswith("<li>a</li>")
+    assert open_elements == ["html", "body", "ul"]
+
+    more = "```html\n</head><body><ul><li>a</li><li>b</li></ul></body></html>\n```"
+    assert join_continuation(prefix, extract_html(more, continuation=True)) == DOC
+
+
+def test_normal_stop_without_closing_tag_is_not_continued():
+    for reason in ("STOP", "stop"):
+        validator = StreamValidator()
+        feed_all(validator, '<div class="hero"><h1>Edited</h1></div>')
+        validator.finish_reason = reason
+        assert not validator.complete and not validator.truncated
+
+
+def test_open_elements_ignore_void_and_raw_text():
+    _, open_elements = continuation_point('<html><head><meta charset="utf-8"><style>a > b { }</style></head><body><div><br><img src="x"><p>text')
+    assert open_elements == ["html", "body", "div", "p"]
@@ -0,0 +1,33 @@
+from placeholders import PlaceholderTable
+
+DATA_URI = "data:image/png;base64," + "iVBORw0KGgo" * 20
+SRCSET = ", ".join(f"https://cdn.example.com/img/hero-{w}.jpg {w}w" for w in (320, 640, 1280, 1920))
+HTML = (
+    f'<div class="hero" style="background:url({DATA_URI})">'
+    f'<img src="{DATA_URI}" srcset="{SRCSET}" alt="A fairly long alternative text that should stay readable for the model">'
+    f'<a href="/short">Shop</a></div>'
+)
+
+
+def test_substitute_and_restore_round_trip():
+    table = PlaceholderTable(min_chars=40)
+    compact = table.substitute(HTML)
+
+    assert DATA_URI not in compact and SRCSET not in compact
+    assert 'href="/short"' in compact and "A fairly long alternative text" in compact
+    assert len(table.values) == 2  # the repeated data URI shares one token
+    restored, report = table.restore(compact)
+    assert restored == HTML
+    assert report == {"substituted": 2, "restored": 2, "missing": 0, "unknown": 0}
+
+
+def test_restore_reports_dropped_and_mangled_placeholders():
+    table = PlaceholderTable(min_chars=40)
+    compact = table.substitute(HTML)
+    data_token = next(t for t, v in table.values.items() if v == DATA_URI)
+
+    output = f'<img src="{data_token}"><img src="__PH_deadbeef__">'
+    restored, report = table.restore(output)
+
+    assert DATA_URI in restored and "__PH_deadbeef__" in restored
+    assert report["missing"] == 1 and report["unknown"] == 1
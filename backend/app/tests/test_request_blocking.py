@@ -0,0 +1,54 @@
+from request_blocking import BlockingStats, RequestBlocker, get_request_blocker
+
+RULES = """
+! comment
+%type image block
+||tracker.example^
+||cdn.example^$script
+/collect?*&tid=
+@@||ok.tracker.example^
+"""
+
+
+def test_host_pattern_type_and_exception_rules():
+    blocker = RequestBlocker.from_text(RULES)
+
+    assert blocker.decide("https://site.test/logo.png", "image") == "type"
+    assert blocker.decide("https://a.b.tracker.example/p.js", "script") == "host"
+    assert blocker.decide("https://ok.tracker.example/p.js", "script") is None
+    assert blocker.decide("https://cdn.example/app.js", "script") == "host"
+    assert blocker.decide("https://cdn.example/app.css", "stylesheet") is None
+    assert blocker.decide("https://site.test/collect?v=1&tid=UA-1", "xhr") == "pattern"
+    assert blocker.decide("https://nottracker.example/x", "script") is None
+
+
+def test_matched_route_pattern_only_covers_blockable_urls():
+    pattern = RequestBlocker.from_text(RULES, route_mode="matched").route_pattern()
+
+    assert pattern.search("https://www.tracker.example/x")
+    assert pattern.search("https://site.test/img/hero.webp?w=100")
+    assert not pattern.search("https://site.test/styles.css")
+    assert "(?P<" not in pattern.pattern  # handed to the browser as a JavaScript regex
+
+    # With the subresource cache on, cacheable-looking URLs are routed too, but documents and XHR still are not
+    cached = RequestBlocker.from_text(RULES, route_mode="matched").route_pattern(also_types=["stylesheet", "script", "font"])
+    assert cached.search("https://site.test/styles.css") and cached.search("https://site.test/app.mjs?v=2")
+    assert cached.search("https://www.tracker.example/x")
+    assert not cached.search("https://site.test/") and not cached.search("https://site.test/api/items")
+    assert RequestBlocker.from_text(RULES).route_pattern(also_types=["stylesheet"]) == "**/*"
+
+
+def test_default_ruleset_and_stats():
+    blocker = get_request_blocker()
+    stats = BlockingStats()
+    for url, kind in [
+        ("https://www.google-analytics.com/analytics.js", "script"),
+        ("https://example.com/api/tracking/event", "fetch"),
+        ("https://example.com/main.css", "stylesheet"),
+        ("https://github.githubassets.com/assets/app.css", "stylesheet"),
+    ]:
+        stats.record(kind, blocker.decide(url, kind))
+
+    summary = stats.summary()
+    assert summary["blocked"] == 2 and summary["allowed"] == 2
+    assert summary["estimated_bytes_saved"] > 0
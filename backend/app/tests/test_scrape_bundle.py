@@ -0,0 +1,38 @@
+import gzip
+
+import pytest
+
+from scrape_bundle import BundleError, bundle_path_for, read_bundle, write_bundle
+
+CONTEXT = {
+    "url": "https://example.com",
+    "head": "<head><title>Example</title></head>",
+    "body": "<body>" + "<div class='card'>hello</div>" * 500 + "</body>",
+    "css": ".card { color: red; }\n" * 300,
+    "debug_info": {"css_length": 6600},
+}
+
+
+def test_bundle_round_trip_is_compact_and_hashed(tmp_path):
+    path = bundle_path_for(tmp_path / "20250101_000000_abcd1234_raw.html")
+    assert path.name == "20250101_000000_abcd1234_raw.bundle.json.gz"
+
+    written, digest = write_bundle(path, CONTEXT)
+    assert written.stat().st_size < (len(CONTEXT["body"]) + len(CONTEXT["css"])) / 10
+
+    bundle = read_bundle(path, expected_hash=digest)
+    assert bundle["css"] == CONTEXT["css"] and bundle["body"] == CONTEXT["body"]
+    assert bundle["debug_info"] == CONTEXT["debug_info"] and bundle["image_sizes"] == {}
+
+    with pytest.raises(BundleError):
+        read_bundle(path, expected_hash="0" * 64)
+
+
+def test_tampered_bundle_is_rejected(tmp_path):
+    path, _ = write_bundle(tmp_path / "x_raw.bundle.json.gz", CONTEXT)
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        text = f.read()
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write(text.replace("color: red", "color: blue"))
+    with pytest.raises(BundleError):
+        read_bundle(path)
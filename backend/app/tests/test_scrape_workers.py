@@ -0,0 +1,73 @@
+import asyncio
+import os
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from scrape_workers import ScrapeWorkerPool
+
+
+def fake_scrape(url: str, har_mode=None) -> dict:
+    """Runs inside the worker process."""
+    if url.endswith("/crash"):
+        os._exit(3)
+    if url.endswith("/hang"):
+        time.sleep(60)
+    if url.endswith("/slow"):
+        time.sleep(1)
+    if url.endswith("/bad"):
+        raise HTTPException(status_code=400, detail="Invalid URL")
+    return {"url": url, "body": "<body>" + "x" * 200_000 + "</body>", "pid": os.getpid()}
+
+
+def test_pool_contains_crashes_and_timeouts(tmp_path):
+    async def flow():
+        pool = ScrapeWorkerPool(
+            size=2, max_jobs=2, job_timeout=3, health_interval=60, results_dir=tmp_path,
+            target=f"{__name__}:fake_scrape",
+        )
+        await pool.start()
+        try:
+            first = await pool.scrape("https://ok.example/1")
+            assert len(first["body"]) > 200_000 and not list(tmp_path.iterdir())
+
+            with pytest.raises(HTTPException) as crashed:
+                await pool.scrape("https://ok.example/crash")
+            assert crashed.value.status_code == 502
+            with pytest.raises(HTTPException) as bad:
+                await pool.scrape("https://ok.example/bad")
+            assert bad.value.status_code == 400
+            with pytest.raises(HTTPException) as hung:
+                await pool.scrape("https://ok.example/hang")
+            assert hung.value.status_code == 504
+
+            results = await asyncio.gather(*(pool.scrape(f"https://ok.example/{i}") for i in range(4)))
+            assert all(r["url"].startswith("https://ok.example/") for r in results)
+            status = pool.status()
+            assert status["size"] == 2 and all(w["alive"] for w in status["workers"])
+        finally:
+            await pool.stop()
+
+    asyncio.run(flow())
+
+
+def test_cancelled_job_does_not_leave_its_reply_for_the_next(tmp_path):
+    async def flow():
+        pool = ScrapeWorkerPool(size=1, job_timeout=10, health_interval=60, results_dir=tmp_path, target=f"{__name__}:fake_scrape")
+        await pool.start()
+        try:
+            before = pool.status()["workers"][0]["pid"]
+            slow = asyncio.create_task(pool.scrape("https://ok.example/slow"))
+            await asyncio.sleep(0.3)
+            slow.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await slow
+            # The cancelled worker is replaced, so its late reply cannot answer this job
+            result = await pool.scrape("https://ok.example/next")
+            assert result["url"] == "https://ok.example/next" and result["pid"] != before
+            assert pool.status()["busy"] == 0 and len(pool.status()["workers"]) == 1
+        finally:
+            await pool.stop()
+
+    asyncio.run(flow())
@@ -0,0 +1,97 @@
+import asyncio
+
+from admission import AdmissionGate
+from speculation import GenerationCache
+
+
+def test_speculation_is_joined_then_used_once():
+    async def flow():
+        cache = GenerationCache(budget_s=5, ttl_s=5, max_inflight=1)
+        gate = AdmissionGate("llm:test", max_concurrent=2, max_queue=4)
+        release = asyncio.Event()
+
+        async def generate():
+            await release.wait()
+            return "<html></html>"
+
+        assert cache.start("a_raw.html", "m", generate, gate)
+        assert not cache.start("b_raw.html", "m", generate, gate)  # over max_inflight
+        await asyncio.sleep(0.01)
+        assert gate.active == 1 and cache.pending("a_raw.html", "m")
+
+        task, outcome = cache.claim("a_raw.html", "m")
+        assert outcome == "joined" and not cache.pending("a_raw.html", "m")
+        release.set()
+        assert await task == "<html></html>"
+        assert gate.active == 0
+        assert cache.claim("a_raw.html", "m") is None
+
+    asyncio.run(flow())
+
+
+def test_failed_expired_and_mismatched_speculations_are_dropped():
+    async def flow():
+        cache = GenerationCache(budget_s=5, ttl_s=0.05, max_inflight=3)
+        gate = AdmissionGate("llm:test", max_concurrent=3, max_queue=4)
+
+        async def fail():
+            raise RuntimeError("provider down")
+
+        async def hang():
+            await asyncio.sleep(60)
+
+        cache.start("fail_raw.html", "m", fail, gate)
+        cache.start("page_raw.html", "other-model", hang, gate)
+        await asyncio.sleep(0.01)
+        assert not cache.pending("fail_raw.html", "m")
+        assert cache.claim("page_raw.html", "m") is None
+        assert cache.status()["entries"] == 0
+
+        cache.start("late_raw.html", "m", hang, gate)
+        await asyncio.sleep(0.1)
+        assert not cache.pending("late_raw.html", "m") and gate.active == 0
+
+        busy = AdmissionGate("llm:busy", max_concurrent=1, max_queue=4)
+        busy.active = 1
+        assert not cache.start("busy_raw.html", "m", hang, busy)
+
+    asyncio.run(flow())
+
+
+def test_generate_takes_a_model_slot_when_the_joined_speculation_fails(monkeypatch, tmp_path):
+    import admission
+    import httpx
+    import main
+    from speculation import get_generation_cache
+
+    monkeypatch.setattr(main, "CLONED_SITES_DIR", tmp_path)
+    _, raw_path = main.save_raw_artifact("https://example.com/", {"head": "<title>x</title>", "body": "<main>hi</main>", "css": ""})
+    model = main.CloneRequest.model_fields["model"].default
+    gate = admission.model_gate(model)
+    seen_active = []
+
+    async def regenerate(design_context, model_id):
+        seen_active.append(gate.active)
+        return "<!DOCTYPE html><html><body>" + "<p>regenerated</p>" * 10 + "</body></html>"
+
+    monkeypatch.setattr(main, "generate_clone_html", regenerate)
+
+    async def flow():
+        release = asyncio.Event()
+
+        async def fail():
+            await release.wait()
+            raise RuntimeError("provider down")
+
+        assert get_generation_cache().start(str(raw_path), model, fail, gate)
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            pending = asyncio.ensure_future(client.post("/api/generate", json={"raw_html_path": str(raw_path)}))
+            await asyncio.sleep(0.05)
+            release.set()
+            response = await pending
+        assert response.status_code == 200 and response.json()["speculative"] is None
+        # The speculation's slot was released when it failed; the fallback holds one of its own
+        assert seen_active == [1] and gate.active == 0
+
+    asyncio.run(flow())
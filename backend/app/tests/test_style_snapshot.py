@@ -0,0 +1,18 @@
+from style_snapshot import _result, render_style_table
+
+
+def test_style_table_is_stable_and_in_property_order():
+    styles = [
+        {"color": "rgb(0, 0, 0)", "display": "flex", "padding-top": "8px"},
+        {"font-size": "14px"},
+    ]
+    css = render_style_table(styles)
+    assert css == ".cs-0{display:flex;padding-top:8px;color:rgb(0, 0, 0)}\n.cs-1{font-size:14px}"
+    assert render_style_table([dict(reversed(list(styles[0].items())))]) == css.split("\n")[0]
+
+
+def test_result_reports_snapshot_stats():
+    raw = {"styles": [{"display": "grid"}, {"opacity": "0.5"}], "elements": 42, "truncated": False}
+    result = _result(raw)
+    assert result["css"].startswith(".cs-0{display:grid}")
+    assert result["stats"] == {"elements": 42, "classes": 2, "css_length": len(result["css"]), "truncated": False}
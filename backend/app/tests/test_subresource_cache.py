@@ -0,0 +1,55 @@
+import types
+
+from subresource_cache import CacheStats, SubresourceCache, freshness_lifetime
+
+
+class FakeRoute:
+    def __init__(self, body: bytes, headers: dict):
+        self.calls = []
+        self._response = types.SimpleNamespace(status=200, headers=headers, body=lambda: body)
+
+    def fetch(self):
+        self.calls.append("fetch")
+        return self._response
+
+    def fulfill(self, **kwargs):
+        self.calls.append(("fulfill", kwargs.get("body")))
+
+    def continue_(self):
+        self.calls.append("continue")
+
+
+def request(url: str, resource_type: str = "script"):
+    return types.SimpleNamespace(url=url, method="GET", resource_type=resource_type)
+
+
+def test_freshness_lifetime():
+    assert freshness_lifetime({"cache-control": "public, max-age=600"}) == 600
+    assert freshness_lifetime({"cache-control": "no-store"}, policy="force") is None
+    assert freshness_lifetime({"cache-control": "private, max-age=600"}) is None
+    assert freshness_lifetime({}, policy="force") > 0
+    assert freshness_lifetime({}) is None
+
+
+def test_second_scrape_is_served_from_disk(tmp_path):
+    cache = SubresourceCache(tmp_path, policy="headers")
+    url = "https://cdn.example/app.js"
+    headers = {"content-type": "application/javascript", "cache-control": "max-age=3600", "content-encoding": "gzip"}
+
+    first, first_stats = FakeRoute(b"console.log(1)", headers), CacheStats()
+    cache.handle_sync(first, request(url), first_stats)
+    second, second_stats = FakeRoute(b"never fetched", headers), CacheStats()
+    cache.handle_sync(second, request(url), second_stats)
+
+    assert first.calls == ["fetch", ("fulfill", b"console.log(1)")]
+    assert first_stats.summary()["stored"] == 1
+    assert second.calls == [("fulfill", b"console.log(1)")]
+    assert second_stats.summary() == {"hits": 1, "misses": 0, "stored": 0, "hit_ratio": 1.0, "bytes_served": 14}
+    assert "content-encoding" not in cache.lookup(url)["headers"]
+
+
+def test_uncacheable_requests_pass_through(tmp_path):
+    cache = SubresourceCache(tmp_path)
+    route = FakeRoute(b"{}", {"cache-control": "max-age=60"})
+    cache.handle_sync(route, request("https://api.example/data", "fetch"), CacheStats())
+    assert route.calls == ["continue"]
@@ -0,0 +1,58 @@
+from bs4 import BeautifulSoup
+
+from template_extraction import REPEAT_ATTR, TEMPLATE_ATTR, expand_repeated_templates, extract_repeated_templates
+
+
+def card(i: int) -> str:
+    return (
+        f'<div class="card" data-id="p{i}"><a href="/item/{i}"><img src="/img/{i}.png" alt="Item {i}"></a>'
+        f'<h3>Product number {i}</h3><span class="price">${i}.99</span></div>'
+    )
+
+
+PAGE = (
+    '<header><h1>Shop</h1></header>'
+    + "".join(f'<section class="grid"><h2>Row {s}</h2>{"".join(card(s * 10 + i) for i in range(8))}</section>' for s in range(3))
+)
+
+
+def test_innermost_repetition_is_templated():
+    compact, plan = extract_repeated_templates(PAGE)
+
+    assert plan is not None and list(plan["templates"]) == ["t1"]
+    soup = BeautifulSoup(compact, "html.parser")
+    assert len(soup.select(".card")) == 1
+    assert soup.select_one(".card")[TEMPLATE_ATTR] == "t1"
+    assert len(soup.find_all(attrs={REPEAT_ATTR: True})) == 3
+    assert len(soup.find_all("section")) == 3
+
+
+def test_expand_restores_every_item():
+    compact, plan = extract_repeated_templates(PAGE)
+    generated = f"```html\n<!DOCTYPE html><html><body>{compact}</body></html>\n```"
+
+    expanded = expand_repeated_templates(generated, plan)
+
+    assert expanded.startswith("```html\n") and expanded.endswith("\n```")
+    original = [str(c) for c in BeautifulSoup(PAGE, "html.parser").select(".card")]
+    restored = [str(c) for c in BeautifulSoup(expanded, "html.parser").select(".card")]
+    assert restored == original
+
+
+def test_pages_without_repetition_are_untouched():
+    html = "<main><h1>Hello</h1><p>One paragraph</p></main>"
+    assert extract_repeated_templates(html) == (html, None)
+
+
+def test_columns_sharing_an_exemplar_value_stay_distinct():
+    def offer(price: int, was: int) -> str:
+        return (f'<li class="offer"><h4>Deal</h4><span class="price">${price}</span>'
+                f'<s class="was">${was}</s><a href="/deal">Buy</a></li>')
+
+    page = "<ul>" + offer(10, 10) + "".join(offer(p, p + 5) for p in (20, 30, 40, 50)) + "</ul>"
+    compact, plan = extract_repeated_templates(page, min_savings=0)
+    assert plan is not None
+
+    expanded = BeautifulSoup(expand_repeated_templates(compact, plan), "html.parser")
+    pairs = [(o.select_one(".price").text, o.select_one(".was").text) for o in expanded.select(".offer")]
+    assert pairs == [("$10", "$10"), ("$20", "$25"), ("$30", "$35"), ("$40", "$45"), ("$50", "$55")]
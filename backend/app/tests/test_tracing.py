@@ -0,0 +1,100 @@
+import asyncio
+import os
+import time
+
+import tracing
+from tracing import InMemoryExporter, span
+
+
+def test_spans_nest_and_share_trace_id():
+    exporter = InMemoryExporter()
+    previous = tracing.set_exporter(exporter)
+    try:
+        with tracing.trace() as trace_id:
+            with span("outer") as outer:
+                with span("inner", stage="llm"):
+                    pass
+    finally:
+        tracing.set_exporter(previous)
+
+    inner, outer_dict = exporter.spans
+    assert inner["trace_id"] == outer_dict["trace_id"] == trace_id
+    assert inner["parent_id"] == outer.span_id
+    assert inner["attributes"] == {"stage": "llm"}
+
+
+def test_trace_id_crosses_to_thread():
+    exporter = InMemoryExporter()
+    previous = tracing.set_exporter(exporter)
+
+    def work():
+        with span("in_thread"):
+            return tracing.current_trace_id()
+
+    async def flow():
+        with span("request"):
+            return await asyncio.to_thread(work)
+
+    try:
+        thread_trace_id = asyncio.run(flow())
+    finally:
+        tracing.set_exporter(previous)
+
+    assert {s["trace_id"] for s in exporter.spans} == {thread_trace_id}
+
+
+def test_join_trace_moves_open_spans():
+    exporter = InMemoryExporter()
+    previous = tracing.set_exporter(exporter)
+    existing = tracing.new_trace_id()
+    try:
+        with span("request"):
+            tracing.join_trace(existing)
+            with span("child"):
+                pass
+    finally:
+        tracing.set_exporter(previous)
+
+    assert [s["trace_id"] for s in exporter.spans] == [existing, existing]
+
+
+def test_errors_are_recorded(tmp_path):
+    exporter = tracing.JsonFileExporter(tmp_path)
+    previous = tracing.set_exporter(exporter)
+    try:
+        with tracing.trace() as trace_id:
+            try:
+                with span("boom"):
+                    raise ValueError("bad")
+            except ValueError:
+                pass
+    finally:
+        tracing.set_exporter(previous)
+
+    spans = tracing.load_trace(trace_id, tmp_path)
+    assert spans[0]["status"] == "error"
+    assert "bad" in spans[0]["error"]
+    assert tracing.summarize_spans(spans)["boom"]["count"] == 1
+
+
+def test_file_exporter_buffers_and_keeps_only_recent_traces(tmp_path):
+    stale = tmp_path / ("0" * 32 + ".jsonl")
+    stale.write_text("{}\n")
+    os.utime(stale, (time.time() - 7200, time.time() - 7200))
+    exporter = tracing.JsonFileExporter(tmp_path, max_files=2, max_age_s=3600, flush_interval=60)
+    previous = tracing.set_exporter(exporter)
+    try:
+        trace_ids = []
+        for _ in range(3):
+            with tracing.trace() as trace_id, span("request"):
+                trace_ids.append(trace_id)
+            time.sleep(0.01)
+        # Nothing is written on the request path; the first flush also prunes
+        assert list(tmp_path.iterdir()) == [stale]
+        assert tracing.load_trace(trace_ids[-1], tmp_path)[0]["name"] == "request"
+    finally:
+        tracing.set_exporter(previous)
+        exporter.shutdown()
+
+    assert not stale.exists()
+    assert len(list(tmp_path.glob("*.jsonl"))) == 2
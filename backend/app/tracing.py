@@ -0,0 +1,362 @@
+# lightweight span tracing that ties scrape -> generate -> edit into one user flow
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACE_HEADER = "X-Trace-Id"
+TRACES_DIR = Path(os.getenv("TRACES_DIR", "traces"))
+# The file exporter keeps only the newest TRACES_MAX_FILES traces, none older than TRACES_MAX_AGE_S
+TRACES_MAX_FILES = int(os.getenv("TRACES_MAX_FILES", "1000"))
+TRACES_MAX_AGE_S = float(os.getenv("TRACES_MAX_AGE_S", str(7 * 24 * 3600)))
+PRUNE_INTERVAL_S = 60.0
+
+_current_trace_id: ContextVar[Optional[str]] = ContextVar("current_trace_id", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+def new_trace_id() -> str:
+    """32 hex chars, the same shape OTLP expects for trace ids."""
+    return uuid.uuid4().hex
+
+
+def is_valid_trace_id(trace_id: Optional[str]) -> bool:
+    return bool(trace_id) and len(trace_id) == 32 and all(c in "0123456789abcdef" for c in trace_id)
+
+
+def new_span_id() -> str:
+    """16 hex chars, the same shape OTLP expects for span ids."""
+    return os.urandom(8).hex()
+
+
+class Span:
+    """A single timed unit of work inside a trace."""
+
+    def __init__(self, name: str, trace_id: str, parent: Optional["Span"] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = new_span_id()
+        self.parent = parent
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self.start_time = time.time()
+        self._start_perf = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+
+    @property
+    def parent_id(self) -> Optional[str]:
+        return self.parent.span_id if self.parent else None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_error(self, error: BaseException) -> None:
+        self.status = "error"
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self) -> None:
+        if self.duration_ms is None:
+            self.duration_ms = (time.perf_counter() - self._start_perf) * 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration_ms": round(self.duration_ms or 0.0, 3),
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+# --- Exporters ---
+
+class SpanExporter:
+    """Base class for span sinks. Subclasses receive finished spans as dicts."""
+
+    def export(self, span: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        pass
+
+
+class NoopExporter(SpanExporter):
+    def export(self, span: Dict[str, Any]) -> None:
+        pass
+
+
+class InMemoryExporter(SpanExporter):
+    """Keeps spans in a list; used by benchmarks and tests to read stage timings."""
+
+    def __init__(self):
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Dict[str, Any]) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans.clear()
+
+
+class BufferedExporter(SpanExporter):
+    """Buffers spans and writes them out from a background thread, so export() never does I/O."""
+
+    def __init__(self, flush_interval: float, thread_name: str):
+        self.flush_interval = flush_interval
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=thread_name, daemon=True)
+        self._thread.start()
+
+    def export(self, span: Dict[str, Any]) -> None:
+        with self._lock:
+            self._buffer.append(span)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if batch:
+            self._write(batch)
+
+    def _write(self, spans: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        self.flush()
+
+
+class JsonFileExporter(BufferedExporter):
+    """
+    Appends spans as JSON lines to <traces_dir>/<trace_id>.jsonl, once per flush_interval. Only the
+    newest max_files traces, none older than max_age_s, are kept.
+    """
+
+    def __init__(self, traces_dir: Path = TRACES_DIR, max_files: int = TRACES_MAX_FILES, max_age_s: float = TRACES_MAX_AGE_S,
+                 flush_interval: float = 1.0):
+        self.traces_dir = Path(traces_dir)
+        self.traces_dir.mkdir(parents=True, exist_ok=True)
+        self.max_files = max_files
+        self.max_age_s = max_age_s
+        self._write_lock = threading.Lock()
+        self._pruned_at: Optional[float] = None
+        super().__init__(flush_interval, "trace-file-exporter")
+
+    def _write(self, spans: List[Dict[str, Any]]) -> None:
+        by_trace: Dict[str, List[str]] = {}
+        for s in spans:
+            by_trace.setdefault(s["trace_id"], []).append(json.dumps(s, default=str))
+        with self._write_lock:
+            for trace_id, lines in by_trace.items():
+                with open(self.traces_dir / f"{trace_id}.jsonl", "a", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+            if self._pruned_at is None or time.monotonic() - self._pruned_at >= PRUNE_INTERVAL_S:
+                self._prune()
+
+    def _prune(self) -> None:
+        self._pruned_at = time.monotonic()
+        cutoff = time.time() - self.max_age_s
+        traces = []
+        for path in self.traces_dir.glob("*.jsonl"):
+            try:
+                traces.append((path.stat().st_mtime, path))
+            except OSError:
+                continue
+        traces.sort(reverse=True)
+        for i, (mtime, path) in enumerate(traces):
+            if i >= self.max_files or mtime < cutoff:
+                path.unlink(missing_ok=True)
+
+
+class OTLPHttpExporter(BufferedExporter):
+    """
+    Sends spans to an OTLP/HTTP collector (JSON encoding), e.g. http://localhost:4318/v1/traces.
+    Spans are buffered and flushed in batches so the request path never waits on the network.
+    """
+
+    def __init__(self, endpoint: str, service_name: str = "website-cloner-backend", batch_size: int = 64, flush_interval: float = 2.0):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.batch_size = batch_size
+        super().__init__(flush_interval, "otlp-exporter")
+
+    def _write(self, spans: List[Dict[str, Any]]) -> None:
+        for i in range(0, len(spans), self.batch_size):
+            self._send(spans[i:i + self.batch_size])
+
+    def _send(self, spans: List[Dict[str, Any]]) -> None:
+        import httpx
+
+        try:
+            httpx.post(self.endpoint, json=self.to_otlp(spans), timeout=5.0)
+        except Exception as e:
+            logger.warning(f"OTLP export of {len(spans)} spans failed: {e}")
+
+    def to_otlp(self, spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+        def attr(key, value):
+            if isinstance(value, bool):
+                return {"key": key, "value": {"boolValue": value}}
+            if isinstance(value, int):
+                return {"key": key, "value": {"intValue": str(value)}}
+            if isinstance(value, float):
+                return {"key": key, "value": {"doubleValue": value}}
+            return {"key": key, "value": {"stringValue": str(value)}}
+
+        otlp_spans = []
+        for s in spans:
+            start_ns = int(s["start_time"] * 1e9)
+            otlp_spans.append({
+                "traceId": s["trace_id"],
+                "spanId": s["span_id"],
+                "parentSpanId": s["parent_id"] or "",
+                "name": s["name"],
+                "kind": 1,
+                "startTimeUnixNano": str(start_ns),
+                "endTimeUnixNano": str(start_ns + int(s["duration_ms"] * 1e6)),
+                "attributes": [attr(k, v) for k, v in s["attributes"].items()],
+                "status": {"code": 2, "message": s["error"]} if s["status"] == "error" else {"code": 1},
+            })
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [attr("service.name", self.service_name)]},
+                "scopeSpans": [{"scope": {"name": "tracing"}, "spans": otlp_spans}],
+            }]
+        }
+
+
+def _exporter_from_env() -> SpanExporter:
+    kind = os.getenv("TRACING_EXPORTER", "file").lower()
+    if kind == "none":
+        return NoopExporter()
+    if kind == "otlp":
+        return OTLPHttpExporter(os.getenv("OTLP_ENDPOINT", "http://localhost:4318/v1/traces"))
+    return JsonFileExporter()
+
+
+_exporter: Optional[SpanExporter] = None
+_exporter_lock = threading.Lock()
+
+
+def get_exporter() -> SpanExporter:
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = _exporter_from_env()
+    return _exporter
+
+
+def set_exporter(exporter: SpanExporter) -> SpanExporter:
+    """Install a span sink (file, OTLP, in-memory or custom) and return the previous one, flushed."""
+    global _exporter
+    with _exporter_lock:
+        previous, _exporter = _exporter, exporter
+    if isinstance(previous, BufferedExporter):
+        previous.flush()
+    return previous
+
+
+# --- Span API ---
+
+def current_trace_id() -> Optional[str]:
+    return _current_trace_id.get()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def trace(trace_id: Optional[str] = None):
+    """Run the enclosed block inside the given trace (or a fresh one). Yields the trace id."""
+    trace_id = trace_id or new_trace_id()
+    token = _current_trace_id.set(trace_id)
+    try:
+        yield trace_id
+    finally:
+        _current_trace_id.reset(token)
+
+
+def join_trace(trace_id: str) -> None:
+    """
+    Move the current context (and every open span above it) onto an existing trace.
+    Used when the trace id is only known after the request started, e.g. read from an artifact.
+    """
+    _current_trace_id.set(trace_id)
+    s = _current_span.get()
+    while s is not None:
+        s.trace_id = trace_id
+        s = s.parent
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time the enclosed block as a child of the current span and export it when done."""
+    trace_id = _current_trace_id.get()
+    trace_token = None
+    if trace_id is None:
+        trace_id = new_trace_id()
+        trace_token = _current_trace_id.set(trace_id)
+
+    s = Span(name, trace_id, parent=_current_span.get(), attributes=attributes)
+    span_token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.set_error(e)
+        raise
+    finally:
+        s.end()
+        _current_span.reset(span_token)
+        if trace_token is not None:
+            _current_trace_id.reset(trace_token)
+        try:
+            get_exporter().export(s.to_dict())
+        except Exception as e:
+            logger.warning(f"Failed to export span {name}: {e}")
+
+
+# --- Reading traces back ---
+
+def load_trace(trace_id: str, traces_dir: Path = TRACES_DIR) -> List[Dict[str, Any]]:
+    """Load the spans written by JsonFileExporter for one trace, ordered by start time."""
+    if isinstance(_exporter, JsonFileExporter):
+        _exporter.flush()  # spans of a flow that just finished may still be buffered
+    path = Path(traces_dir) / f"{trace_id}.jsonl"
+    if not path.exists():
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        spans = [json.loads(line) for line in f if line.strip()]
+    return sorted(spans, key=lambda s: s["start_time"])
+
+
+def summarize_spans(spans: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Total wall-clock time and call count per span name."""
+    summary: Dict[str, Dict[str, float]] = {}
+    for s in spans:
+        entry = summary.setdefault(s["name"], {"count": 0, "total_ms": 0.0})
+        entry["count"] += 1
+        entry["total_ms"] = round(entry["total_ms"] + s["duration_ms"], 3)
+    return dict(sorted(summary.items(), key=lambda kv: kv[1]["total_ms"], reverse=True))
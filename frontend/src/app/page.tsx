@@ -57,6 +57,8 @@ export default function LandingPage() {
 
   // --- State to hold the path of the latest scraped HTML ---
   const [latestScrapedHtmlPath, setLatestScrapedHtmlPath] = useState<string | null>(null);
+  // Sent with every /api/edit of this clone, so the backend can queue and coalesce its edits
+  const [documentId, setDocumentId] = useState<string | null>(null);
 
   const features = [
     {
@@ -152,6 +154,7 @@ export default function LandingPage() {
     setLoading(true)
     setProcessingStep('scraping')
     setLatestScrapedHtmlPath(null)
+    setDocumentId(crypto.randomUUID())
 
     try {
       console.log("Attempting to scrape:", url)
@@ -225,6 +228,7 @@ export default function LandingPage() {
               body: JSON.stringify({
                   html_content: currentHtml,
                   instruction: userMessage,
+                  document_id: documentId ?? undefined,
                   model: 'gemini-2.5-pro-preview-05-06'
               })
           });